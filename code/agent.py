@@ -2,8 +2,17 @@ from datetime import datetime
 
 from communication_handler import CommunicationHandler
 from path_planner import PathPlanner
-#from robot import Robot
 from mock_robot import MockRobot
+from metrics import get_metrics
+from duration_estimator import DurationEstimator
+from cell_map import CellMap
+from cell_coordinator import CellCoordinator
+from leader_election import LeaderElection
+from fleet_positioner import FleetPositioner
+from route_navigator import get_edge_direction
+from startup_profile import StartupProfile
+from event_log import get_event_log
+import threading
 import time
 
 class Agent:
@@ -11,12 +20,20 @@ class Agent:
     The class serves as the Agent of the AGV which brings all modules together and coordinates communication, path planning and
     task execution
     """
+    DURATION_SAMPLE_BATCH = 20
+    PENDING_REQUEST_TIMEOUT = 30
 
-    def __init__(self, location, is_coordinator, pos, edges, use_mock_robot, robot_facing_direction, durations, use_best_path):
+    def __init__(self, location, is_coordinator, pos, edges, use_mock_robot, robot_facing_direction, durations, use_best_path, recording=None, vision=None, calibration=None, edge_weights=None, cells=None, comm_handler_factory=None, election=None, role="executor", startup_profile=None, line_control=None, repositioning=None, overlap_motion=False):
         """
         Initializes all the Modules like the PathPlanner, Robot or MockRobot and the Communication handler. The Agent class
         also subscribes to multiple events related to the AGV communication.
+        When the map is partitioned into cells, the agent only communicates and plans within its own cell.
+        With leader election enabled the coordinator is elected among the agents of the cell instead of being fixed.
+        An agent with the role coordinator only plans and has no robot. The vision and SDK modules are only imported
+        when a real robot is used. With repositioning enabled the coordinator parks idle agents near the expected pickups.
         """
+        self.startup_profile = startup_profile or StartupProfile()
+        self.role = role
         self.is_coordinator = is_coordinator
         self.location = location
         self.robot_facing_direction = robot_facing_direction
@@ -25,28 +42,81 @@ class Agent:
         self.PICKUP_DURATION = durations["PICKUP_DURATION"]
         self.DROPOFF_DURATION = durations["DROPOFF_DURATION"]
         self.TURN_DURATION = durations["TURN_DURATION"]
-        self.scheduled_tasks = []
-        self.next_agent = None
-        self.next_agent_start_time = None
+        self.task_queue = []
+        self.early_triggers = set()
+        self.queue_condition = threading.Condition()
+        self.current_entry = None
+        self.hop_start = None
+        self.planned_locations = {}
         self.use_best_path = use_best_path
-        if use_mock_robot:
+        self.metrics = get_metrics()
+        self.events = get_event_log()
+        self.duration_estimator = None
+        self.duration_samples = []
+        self.request_counter = 0
+        self.pending_requests = {}
+        self.unaccepted_requests = []
+        self.active_schedules = {}
+        self.lock = threading.Lock()
+        if calibration is not None and calibration["enabled"]:
+            self.duration_estimator = DurationEstimator(durations, calibration["alpha"], calibration["window"], calibration["statistic"])
+        if role == "coordinator":
+            self.robot = None
+        elif use_mock_robot or role == "simulator":
             self.robot = MockRobot(self.log, edges, pos, location, robot_facing_direction)
         else:
-            self.robot = Robot(self.log, edges, pos, location, robot_facing_direction)
+            from robot import Robot
+            self.robot = Robot(self.log, edges, pos, location, robot_facing_direction, recording, vision,
+                               line_control=line_control, overlap_motion=overlap_motion)
+        self.startup_profile.mark("robot")
         self.clock = 0
-        self.count_clock = True
-        self.comm_handler = CommunicationHandler(self.handle_discover_peer)
+        self.running = True
+        self.cell_map = None
+        self.fleet_positioner = None
+        planner_edges = edges
+        multicast_ip = None
+        if cells is not None:
+            self.cell_map = CellMap(edges, cells["cells"])
+            planner_edges = self.cell_map.get_cell_edges(cells["cell_id"])
+            multicast_ip = self.cell_map.get_multicast_ip(cells["cell_id"])
+        self.comm_handler = (comm_handler_factory or CommunicationHandler)(self.handle_discover_peer, multicast_ip)
         self.comm_handler.subscribe("LOCATION_REQUEST", self.send_location_info)
         self.comm_handler.subscribe("LOCATION_RESPONSE", self.handle_location_info)
         self.comm_handler.subscribe("TASK_REQUEST", self.handle_task_request)
         self.comm_handler.subscribe("TASK_DISTRIBUTION", self.handle_task_distribution)
-        self.comm_handler.subscribe("EXECUTE_TASK", self.handle_task_completion)
+        self.comm_handler.subscribe("EXECUTE_TASK", self.handle_execute_task)
         self.comm_handler.subscribe("MESSAGE", self.handle_message)
         self.comm_handler.subscribe("ECHO", self.handle_echo)
+        self.comm_handler.subscribe("DURATION_SAMPLES", self.handle_duration_samples)
+        self.comm_handler.subscribe("TASK_COMPLETED", self.handle_task_completed)
+        self.comm_handler.subscribe("CANCEL_TASK", self.handle_cancel_task)
+        self.comm_handler.subscribe("TASK_CANCELLED", self.handle_task_cancelled)
+        self.comm_handler.subscribe("TASK_ACCEPTED", self.handle_task_accepted)
+        if self.robot is not None:
+            self.all_locations[self.comm_handler.ip] = {"node": self.location, "facing_direction": self.robot_facing_direction}
         self.comm_handler.start()
-        self.all_locations[self.comm_handler.ip] = {"node": self.location, "facing_direction": self.robot_facing_direction}
-        self.path_planner = PathPlanner(edges, pos, durations)
-        self.log(f"Agent initialized and is coordinator={is_coordinator}")
+        if self.robot is not None:
+            threading.Thread(target=self.run_task_queue).start()
+        self.startup_profile.mark("communication")
+        self.path_planner = PathPlanner(planner_edges, pos, durations, self.duration_estimator, edge_weights)
+        self.startup_profile.mark("planner")
+        self.cell_id = cells["cell_id"] if cells is not None else None
+        self.cell_coordinator = None
+        if self.cell_map is not None and is_coordinator:
+            self.cell_coordinator = CellCoordinator(self, self.cell_map, self.cell_id)
+        self.election = None
+        if election is not None and election["enabled"]:
+            self.is_coordinator = False
+            self.election = LeaderElection(self.comm_handler, election["priority"], self.handle_leader_change,
+                                           election["lease_duration"], election["heartbeat_interval"], is_coordinator)
+            self.election.start()
+        if repositioning is not None and repositioning["enabled"]:
+            self.fleet_positioner = FleetPositioner(self, repositioning["interval"], repositioning["window"],
+                                                    repositioning["min_requests"], repositioning["cancel_timeout"])
+            self.fleet_positioner.start()
+        self.startup_profile.mark("coordination")
+        self.log(f"Agent initialized as {role} and is coordinator={is_coordinator}")
+        self.log(self.startup_profile.get_report())
 
     
     def get_peers(self):
@@ -64,14 +134,16 @@ class Agent:
     def handle_discover_peer(self, ip):
         """
         When a agent is discovered a a request is sent to get the location of the other peer.
-        Additionally the own location is passed.
+        Additionally the own location is passed, an agent without robot has no location.
         """
-        self.comm_handler.send(ip, "LOCATION_REQUEST", self.all_locations[self.comm_handler.ip])
+        self.comm_handler.send(ip, "LOCATION_REQUEST", self.all_locations.get(self.comm_handler.ip))
     
     def send_location_info(self, type, message, ip):
         """
         Upon a location request by a peer, the agent answers with its own location.
         """
+        if self.robot is None:
+            return
         self.comm_handler.send(ip, "LOCATION_RESPONSE", self.all_locations[self.comm_handler.ip])
     
     def handle_location_info(self, type, location_and_facing_direction, ip):
@@ -84,75 +156,369 @@ class Agent:
     def handle_task_request(self, type, task, ip):
         """
         Handles a request my the WMS and passes information to the path_planer to split the task in
-        multiple subtask to distribute it between robots.
+        multiple subtask to distribute it between robots. In a cell only the coordinator handles requests and
+        transports crossing the cell boundary are handed over to the CellCoordinator. Moves of the FleetPositioner in
+        flight are cancelled before the request is planned. Standbys buffer the requests by the task_id of the WMS.
+        Requests without one are buffered as unaccepted until the coordinator replicates them with the id it assigned.
+        """
+        task_id = task.get("task_id")
+        if self.fleet_positioner is not None:
+            self.fleet_positioner.record_request(task)
+        if self.election is not None and not self.is_coordinator:
+            with self.lock:
+                if task_id is None:
+                    now = time.time()
+                    self.unaccepted_requests = [request for request in self.unaccepted_requests
+                                                if now - request["received"] < self.PENDING_REQUEST_TIMEOUT]
+                    self.unaccepted_requests.append({"task": task, "ip": ip, "received": now})
+                else:
+                    self.pending_requests[task_id] = {"task": task, "ip": ip, "received": time.time()}
+            return None
+        if task_id is None:
+            task_id = self.accept_request(task, ip)
+        if self.cell_map is not None:
+            if self.cell_coordinator is None:
+                return None
+            if not self.cell_coordinator.is_local(task):
+                return self.cell_coordinator.handle_task_request(dict(task, task_id=task_id))
+        if self.fleet_positioner is not None and self.fleet_positioner.defer_request(task, task_id):
+            return None
+        return self.plan_request(task, task_id)
+
+    def plan_request(self, task, task_id):
+        """
+        Plans a transport request and distributes the selected option
+        """
+        try:
+            selected_option = self.plan_task(task["start_node"], task["end_node"])
+        except Exception as e:
+            self.metrics.increment("agent.planning_errors")
+            self.log(f"Could not plan task {task_id}: {e}")
+            return None
+        self.distribute_task(selected_option, task_id)
+        return selected_option
+
+    def accept_request(self, task, ip):
+        """
+        Assigns an id to a request without a task_id. With an election the request is multicast to the standbys together
+        with the id, as a standby that missed a request could not derive the same id itself.
+        """
+        with self.lock:
+            self.request_counter += 1
+            task_id = f"{self.comm_handler.ip}-{self.request_counter}"
+        if self.election is not None:
+            self.comm_handler.send_multicast("TASK_ACCEPTED", {"task_id": task_id, "task": task, "ip": ip})
+        return task_id
+
+    def handle_task_accepted(self, type, message, ip):
+        """
+        Buffers a request accepted by the coordinator until its TASK_DISTRIBUTION arrives. The oldest unaccepted request
+        of the same sender with the same content is removed, so a missed request does not affect the others.
         """
-        options = self.path_planner.plan_task(task["start_node"], task["end_node"], self.all_locations)
+        if ip == self.comm_handler.ip or self.is_coordinator:
+            return
+        with self.lock:
+            for request in self.unaccepted_requests:
+                if request["ip"] == message["ip"] and request["task"] == message["task"]:
+                    self.unaccepted_requests.remove(request)
+                    break
+            if message["task_id"] not in self.active_schedules:
+                self.pending_requests[message["task_id"]] = {"task": message["task"], "ip": message["ip"],
+                                                             "received": time.time()}
+
+    def plan_task(self, start_node, end_node):
+        """
+        Plans the transport from the start node to the end node and selects an option of the subtask schedules. Agents
+        with queued transports are planned from the node where their last queued subtask ends.
+        """
+        with self.lock:
+            locations = dict(self.all_locations)
+            locations.update((ip, location) for ip, location in self.planned_locations.items() if ip in locations)
+        options = self.path_planner.plan_task(start_node, end_node, locations)
         if self.use_best_path:
-            selected_option = self.path_planner.get_best_option(options)
-        else:
-            selected_option = self.path_planner.get_worst_option(options)
+            return self.path_planner.get_best_option(options)
+        return self.path_planner.get_worst_option(options)
+
+    def distribute_task(self, selected_option, task_id=None):
+        """
+        Sends the subtasks to the agents of the cell and triggers the first agent of the transport. The times are rounded
+        to milliseconds to keep the message within a single datagram.
+        """
+        for subtask in selected_option:
+            subtask["start_time"] = round(subtask["start_time"], 3)
+            subtask["end_time"] = round(subtask["end_time"], 3)
+            subtask["turn_time_per_node"] = {node: round(turn_time, 3) for node, turn_time in subtask["turn_time_per_node"].items()}
+            if task_id is not None:
+                subtask["task_id"] = task_id
+        self.update_planned_locations(selected_option)
         self.comm_handler.send_multicast("TASK_DISTRIBUTION", selected_option)
-        #time.sleep(4)
-        #self.comm_handler.send(selected_option[0]["name"], "EXECUTE_TASK", True)
-        self.comm_handler.send_multicast("EXECUTE_TASK", True)
-        return selected_option
-    
+        self.record_event("task_distributed", task_id=task_id, subtasks=len(selected_option),
+                          planned_duration=selected_option[-1]["end_time"])
+        self.comm_handler.send(selected_option[0]["name"], "EXECUTE_TASK", {"task_id": task_id})
+
+    def update_planned_locations(self, task_list):
+        """
+        Stores where every agent of the transport will be after its subtasks, so the next transport is planned from there
+        """
+        with self.lock:
+            for subtask in task_list:
+                self.planned_locations[subtask["name"]] = {"node": subtask["path"][-1], "facing_direction": subtask["last_facing_direction"]}
+
     def handle_task_distribution(self, type, task_list, ip):
         """
-        Stores subtasks assigned by the coordinator in the cell
+        Appends the own subtasks of a transport to the task queue of the agent together with the agent that has to be
+        triggered next and the time of the trigger. The subtasks wait in the queue until the transport is triggered.
         """
-        last_task_index = 0
-        for i, task in enumerate(task_list):
-            if task["name"] == self.comm_handler.ip:
-                self.scheduled_tasks.append(task)
-                last_task_index = i
-        if last_task_index == len(task_list) - 1:
-            self.next_agent = ip
-            self.next_agent_start_time = task_list[last_task_index]["end_time"]-1
+        task_id = task_list[0].get("task_id")
+        with self.lock:
+            self.pending_requests.pop(task_id, None)
+            self.active_schedules[task_id] = task_list
+        self.update_planned_locations(task_list)
+        own_indices = [i for i, task in enumerate(task_list) if task["name"] == self.comm_handler.ip]
+        if not own_indices:
+            return
+        for i in own_indices:
+            task_list[i]["subtask"] = i
+        last_index = own_indices[-1]
+        entry = {"task_id": task_id, "subtasks": [task_list[i] for i in own_indices], "next_agent": None,
+                 "next_agent_start_time": None, "triggered": False, "trigger_sent": False}
+        if last_index == len(task_list) - 1:
+            task_list[last_index]["is_final"] = True
         else:
-            self.next_agent = task_list[last_task_index + 1]["name"]
-            self.next_agent_start_time = task_list[last_task_index + 1]["start_time"]
-    
-    def handle_task_completion(self, type, payload, ip):
+            entry["next_agent"] = task_list[last_index + 1]["name"]
+            entry["next_agent_start_time"] = task_list[last_index + 1]["start_time"]
+        with self.queue_condition:
+            if task_id in self.early_triggers:
+                self.early_triggers.discard(task_id)
+                entry["triggered"] = True
+            self.task_queue.append(entry)
+            self.queue_condition.notify_all()
+        self.metrics.observe("agent.task_queue.length", len(self.task_queue))
+
+    def handle_execute_task(self, type, payload, ip):
         """
-        Upon notification from another agent the agent porcesses its subtask and passes commands to the robot.
+        Triggers the subtasks of a transport. A trigger can overtake the distribution of the transport, then it is kept
+        until the subtasks arrive.
         """
+        task_id = payload.get("task_id") if isinstance(payload, dict) else None
+        with self.queue_condition:
+            for entry in self.task_queue:
+                if entry["task_id"] == task_id:
+                    entry["triggered"] = True
+                    break
+            else:
+                self.early_triggers.add(task_id)
+            self.queue_condition.notify_all()
 
-        for task_idx, task in enumerate(self.scheduled_tasks):
+    def run_task_queue(self):
+        """
+        Executes the queued transports in the order of their distribution. Every agent receives the distributions in
+        the same order, so waiting for the trigger of the first queued transport cannot block the agents mutually. The
+        agent keeps receiving and queueing transports while the robot drives.
+        """
+        while True:
+            with self.queue_condition:
+                while self.running and not (self.task_queue and self.task_queue[0]["triggered"]):
+                    self.queue_condition.wait()
+                if not self.running:
+                    return
+                entry = self.task_queue[0]
+                self.current_entry = entry
+            self.handle_task_completion(entry)
+            with self.queue_condition:
+                self.task_queue.remove(entry)
+                self.current_entry = None
+
+    def handle_task_completion(self, entry):
+        """
+        Processes the subtasks of a triggered transport and passes commands to the robot. The next agent of the
+        transport is triggered at its planned start time, at the latest when the own subtasks are done.
+        """
+        subtasks = entry["subtasks"]
+        for task_idx, task in enumerate(subtasks):
             self.log(f"Agent begins task completion..")
+            subtask_start = time.time()
             self.clock = task["start_time"]
-            path = task["path"]
-            num_nodes = len(path)
-            last_node_index = num_nodes - 1
-            second_last_node_index = num_nodes - 2
-            scheduled_task_count = len(self.scheduled_tasks)
+            self.record_event("subtask_started", task_id=task.get("task_id"), subtask=task.get("subtask"), task=task["task"],
+                              node=task["path"][0], planned=task["start_time"])
 
             if task["task"]=="MOVE":
                 self.log("----------------Start Moving----------------------")
-                pointer = 0
-                while pointer < last_node_index:
-                    if pointer==second_last_node_index and scheduled_task_count>task_idx+1 and self.scheduled_tasks[task_idx+1]["task"]=="TRANSPORT":
-                        self.robot.prepare_pickup(task["path"][pointer+1])
-                    else:
-                        self.robot.prepare_move(task["path"][pointer+1])
-                    self.all_locations[self.comm_handler.ip] = {"node": task["path"][pointer+1], "facing_direction": task["last_facing_direction"]}
-                    self.increase_clock(self.MOVE_DURATION + task["turn_time_per_node"][task["path"][pointer]])
-                    pointer += 1
+                picks_up = len(subtasks)>task_idx+1 and subtasks[task_idx+1]["task"]=="TRANSPORT"
+                self.drive_path(task, "pickup" if picks_up else None)
             if task["task"]=="TRANSPORT":
                 self.log("----------------Start Transporting----------------")
-                self.increase_clock(self.PICKUP_DURATION)
-                pointer = 0
-                while pointer<len(task["path"])-1:
-                    if pointer==len(task["path"])-2:
-                        self.robot.prepare_dropoff(task["path"][pointer+1])
-                        self.all_locations[self.comm_handler.ip] = {"node": task["path"][pointer+1], "facing_direction": task["last_facing_direction"]}
-                    else:
-                        self.robot.prepare_move(task["path"][pointer+1])
-                        self.all_locations[self.comm_handler.ip] = {"node": task["path"][pointer+1], "facing_direction": task["last_facing_direction"]}
-                    self.increase_clock(self.MOVE_DURATION + task["turn_time_per_node"][task["path"][pointer]])
-                    pointer += 1
-                self.increase_clock(self.DROPOFF_DURATION)
-        self.scheduled_tasks = []
+                self.increase_clock(self.path_planner.get_pickup_duration())
+                self.drive_path(task, "dropoff")
+                self.increase_clock(self.path_planner.get_dropoff_duration())
+            self.record_subtask_duration(task, time.time() - subtask_start)
+            self.record_event("subtask_completed", task_id=task.get("task_id"), subtask=task.get("subtask"), task=task["task"],
+                              node=task["path"][-1], planned=task["end_time"])
+            if task.get("is_final") and not entry.get("cancelled"):
+                self.comm_handler.send_multicast("TASK_COMPLETED", {"task_id": task["task_id"]})
+        if entry.get("cancelled"):
+            self.send_task_cancelled(entry["task_id"])
+        self.trigger_next_agent(entry)
+        self.share_duration_samples()
+
+
+    def drive_path(self, task, action=None):
+        """
+        Passes the whole path of a subtask to the robot, so the robot drives through the nodes without a turn instead of
+        stopping on every node. The action pickup or dropoff is carried out on the last node.
+        """
+        if len(task["path"]) < 2 or self.is_cancelled():
+            return
+        self.hop_start = time.time()
+        self.robot.prepare_route(task["path"], action, lambda index: self.reach_node(task, index))
+
+    def reach_node(self, task, index):
+        """
+        Updates the location, the clock and the measured hop durations when the robot reaches a node of the path.
+        Returns False when the transport was cancelled, so the robot stops.
+        """
+        path = task["path"]
+        now = time.time()
+        self.record_hop_duration(path[index-1], path[index], now - self.hop_start)
+        self.hop_start = now
+        facing_direction = task["last_facing_direction"]
+        if index < len(path) - 1:
+            facing_direction = get_edge_direction(self.path_planner.pos, path[index-1], path[index], facing_direction)
+        self.all_locations[self.comm_handler.ip] = {"node": path[index], "facing_direction": facing_direction}
+        self.increase_clock(self.path_planner.get_edge_duration(path[index-1], path[index]) + task["turn_time_per_node"][path[index-1]])
+        self.record_event("node_reached", task_id=task.get("task_id"), subtask=task.get("subtask"), node=path[index],
+                          planned=self.clock)
+        return not self.is_cancelled()
+
+    def is_cancelled(self):
+        """
+        Returns whether the task queue entry in execution was cancelled
+        """
+        entry = self.current_entry
+        return entry is not None and entry.get("cancelled", False)
+
+    def handle_cancel_task(self, type, message, ip):
+        """
+        Cancels a move of the FleetPositioner. A queued move is removed, a running move ends on the next node. The
+        agent reports where it stops with TASK_CANCELLED.
+        """
+        task_id = message["task_id"]
+        with self.queue_condition:
+            entry = next((entry for entry in self.task_queue if entry["task_id"] == task_id), None)
+            if entry is None:
+                return
+            running = entry is self.current_entry
+            if running:
+                entry["cancelled"] = True
+            else:
+                self.task_queue.remove(entry)
+        if not running:
+            self.send_task_cancelled(task_id)
+
+    def send_task_cancelled(self, task_id):
+        """
+        Reports the cancelled task together with the node and facing direction where the agent stopped
+        """
+        location = self.all_locations[self.comm_handler.ip]
+        self.comm_handler.send_multicast("TASK_CANCELLED", {"task_id": task_id, "node": location["node"],
+                                                            "facing_direction": location["facing_direction"]})
+
+    def handle_task_cancelled(self, type, message, ip):
+        """
+        Removes a cancelled move from the replicated schedules and plans further transports of the agent from the node
+        where it stopped
+        """
+        with self.lock:
+            self.active_schedules.pop(message["task_id"], None)
+            self.planned_locations[ip] = {"node": message["node"], "facing_direction": message["facing_direction"]}
+        if self.fleet_positioner is not None:
+            self.fleet_positioner.finish_reposition(message["task_id"])
+
+    def handle_task_completed(self, type, message, ip):
+        """
+        Removes a completed transport from the replicated schedules
+        """
+        with self.lock:
+            self.active_schedules.pop(message["task_id"], None)
+        if self.fleet_positioner is not None:
+            self.fleet_positioner.finish_reposition(message["task_id"])
+
+    def handle_leader_change(self, leader, is_leader):
+        """
+        Takes over the coordination when the agent was elected. Requests which the previous coordinator received but
+        did not distribute yet are planned by the new coordinator, the transports in flight continue unchanged.
+        """
+        self.is_coordinator = is_leader
+        self.log(f"Coordinator of the cell is {leader}")
+        if not is_leader:
+            return
+        if self.cell_map is not None and self.cell_coordinator is None:
+            self.cell_coordinator = CellCoordinator(self, self.cell_map, self.cell_id)
+        with self.lock:
+            now = time.time()
+            pending = [(task_id, request) for task_id, request in self.pending_requests.items()
+                       if now - request["received"] < self.PENDING_REQUEST_TIMEOUT]
+            unaccepted = [request for request in self.unaccepted_requests
+                          if now - request["received"] < self.PENDING_REQUEST_TIMEOUT]
+            self.pending_requests = {}
+            self.unaccepted_requests = []
+            in_flight = len(self.active_schedules)
+        self.log(f"Taking over {len(pending) + len(unaccepted)} pending requests and {in_flight} transports in flight")
+        for task_id, request in pending:
+            task = dict(request["task"], task_id=task_id)
+            self.handle_task_request("TASK_REQUEST", task, request["ip"])
+        for request in unaccepted:
+            self.handle_task_request("TASK_REQUEST", request["task"], request["ip"])
+
+    def record_event(self, event, **fields):
+        """
+        Records a structured event of this agent in the event log
+        """
+        self.events.record(event, agent=self.comm_handler.ip, **fields)
+
+    def record_hop_duration(self, from_node, to_node, duration):
+        """
+        Splits the measured duration of a hop into the turns, pickups and dropoffs reported by the robot and the
+        traversal of the edge and keeps them as samples for the DurationEstimator
+        """
+        if self.duration_estimator is None or not self.robot.measures_durations:
+            return
+        edge_duration = duration
+        for kind, angle, timing in self.robot.pop_timings():
+            key = self.duration_estimator.get_turn_key(angle) if kind == "turn" else kind
+            self.duration_samples.append([key, round(timing, 2)])
+            edge_duration -= timing
+        self.duration_samples.append([self.duration_estimator.get_edge_key(from_node, to_node), round(edge_duration, 2)])
+
+    def share_duration_samples(self):
+        """
+        Adds the samples of the completed tasks to the own estimates and shares them with the other agents, so the
+        coordinator plans with the measured durations. The samples are sent in batches to keep the messages small.
+        """
+        samples, self.duration_samples = self.duration_samples, []
+        if not samples:
+            return
+        self.duration_estimator.add_samples(samples)
+        for i in range(0, len(samples), self.DURATION_SAMPLE_BATCH):
+            self.comm_handler.send_multicast("DURATION_SAMPLES", samples[i:i+self.DURATION_SAMPLE_BATCH])
+
+    def handle_duration_samples(self, type, samples, ip):
+        """
+        Adds the durations measured by another agent to the estimates
+        """
+        if ip == self.comm_handler.ip or self.duration_estimator is None:
+            return
+        self.duration_estimator.add_samples(samples)
+
+    def record_subtask_duration(self, task, actual_duration):
+        """
+        Records the planned and the actual duration of a subtask
+        """
+        planned_duration = task["end_time"] - task["start_time"]
+        self.metrics.increment(f"agent.subtask.{task['task']}.completed")
+        self.metrics.observe(f"agent.subtask.{task['task']}.planned", planned_duration)
+        self.metrics.observe(f"agent.subtask.{task['task']}.actual", actual_duration)
+        self.metrics.observe(f"agent.subtask.{task['task']}.deviation", abs(actual_duration - planned_duration))
 
     def handle_message(self, type, message, ip):
         """
@@ -172,15 +538,41 @@ class Agent:
     
     def increase_clock(self, duration):
         """
-        Keeps track of the agents clock
+        Keeps track of the agents clock. The MockRobot does not move, so the agent waits for the planned duration
+        instead. A real robot has spent the time driving already.
         """
         self.clock += duration
-        time.sleep(duration)
-        if self.count_clock and self.clock >= self.next_agent_start_time:
-            self.count_clock = False
-            self.comm_handler.send(self.next_agent, "EXECUTE_TASK", True)
-    
+        if not self.robot.measures_durations:
+            time.sleep(duration)
+        entry = self.current_entry
+        if entry is not None and entry["next_agent_start_time"] is not None and self.clock >= entry["next_agent_start_time"]:
+            self.trigger_next_agent(entry)
+
+    def trigger_next_agent(self, entry):
+        """
+        Triggers the next agent of the transport once
+        """
+        if entry["next_agent"] is None or entry["trigger_sent"]:
+            return
+        entry["trigger_sent"] = True
+        self.comm_handler.send(entry["next_agent"], "EXECUTE_TASK", {"task_id": entry["task_id"]})
+
     
+    def stop(self):
+        """
+        Stops the leader election, the execution of the task queue, the robot and the communication of the agent
+        """
+        if self.election is not None:
+            self.election.stop()
+        if self.fleet_positioner is not None:
+            self.fleet_positioner.stop()
+        with self.queue_condition:
+            self.running = False
+            self.queue_condition.notify_all()
+        if self.robot is not None:
+            self.robot.close()
+        self.comm_handler.stop()
+
     def send_multicast(self, type, message):
         """
         Sends a message to all the peers in the multicast group
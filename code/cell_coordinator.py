@@ -0,0 +1,141 @@
+import threading
+import time
+from cell_map import CellMap
+
+
+class CellCoordinator:
+    """
+    The CellCoordinator extends the coordinator of a cell with the handoff of transports that cross cell boundaries.
+    The coordinator only plans the part of a transport inside its own cell up to a boundary node and reserves a transfer
+    slot at that node with the coordinator of the next cell, which plans the rest of the transport once the freight is
+    there. Coordinators talk to each other over a backbone multicast group. All times are sent as relative delays, so
+    the clocks of the coordinators do not have to be synchronized.
+    """
+    HANDOFF_TIMEOUT = 5
+    TRANSFER_SLOT_DURATION = 30
+
+    def __init__(self, agent, cell_map, cell_id):
+        """
+        Joins the backbone multicast group and subscribes to the handoff messages
+        """
+        self.agent = agent
+        self.cell_map = cell_map
+        self.cell_id = cell_id
+        self.pending_handoffs = {}
+        self.transfer_slots = {}
+        self.handoff_counter = 0
+        self.lock = threading.Lock()
+        comm_handler = agent.comm_handler
+        comm_handler.join_group(CellMap.BACKBONE_MULTICAST_IP)
+        comm_handler.subscribe("CELL_TASK_REQUEST", self.handle_cell_task_request)
+        comm_handler.subscribe("HANDOFF_REQUEST", self.handle_handoff_request)
+        comm_handler.subscribe("HANDOFF_ACCEPT", self.handle_handoff_accept)
+
+    def is_local(self, task):
+        """
+        Checks whether a transport lies completely inside the own cell
+        """
+        return self.cell_map.is_local(self.cell_id, task["start_node"], task["end_node"])
+
+    def send_backbone(self, type, payload):
+        """
+        Sends a message to the coordinators of all cells over the backbone multicast group
+        """
+        self.agent.comm_handler.send_multicast(type, payload, CellMap.BACKBONE_MULTICAST_IP)
+
+    def handle_task_request(self, task):
+        """
+        Plans the part of a transport inside the own cell and requests the handoff to the next cell. Requests that
+        start in another cell are forwarded to the coordinator of that cell.
+        """
+        start_cell = self.cell_id if task["start_node"] in self.cell_map.cells[self.cell_id] else None
+        segments = self.cell_map.get_cell_route(task["start_node"], task["end_node"], start_cell)
+        segments = [segment for segment in segments if segment[1] != segment[2]]
+        target_cell = segments[0][0]
+        if target_cell != self.cell_id:
+            self.agent.log(f"Forwarding task {task['start_node']}->{task['end_node']} to cell {target_cell}")
+            self.send_backbone("CELL_TASK_REQUEST", {"cell": target_cell, "task": task})
+            return None
+        if len(segments) == 1:
+            option = self.agent.plan_task(task["start_node"], task["end_node"])
+            self.agent.distribute_task(option, task.get("task_id"))
+            return option
+
+        _, start_node, boundary_node = segments[0]
+        option = self.agent.plan_task(start_node, boundary_node)
+        option = self.agent.path_planner.add_clearing_move(option)
+        ready_in = option[-1]["end_time"]
+        with self.lock:
+            self.handoff_counter += 1
+            handoff_id = f"{self.agent.comm_handler.ip}-{self.handoff_counter}"
+            self.pending_handoffs[handoff_id] = (option, task.get("task_id"))
+        next_cell = segments[1][0]
+        self.agent.log(f"Requesting handoff {handoff_id} at {boundary_node} to cell {next_cell}")
+        self.send_backbone("HANDOFF_REQUEST", {"handoff_id": handoff_id, "cell": next_cell, "boundary_node": boundary_node,
+                                               "ready_in": ready_in, "end_node": task["end_node"],
+                                               "task_id": task.get("task_id")})
+        threading.Timer(self.HANDOFF_TIMEOUT, self.check_handoff_timeout, args=(handoff_id, next_cell)).start()
+        return option
+
+    def handle_cell_task_request(self, type, request, ip):
+        """
+        Handles a transport request forwarded by the coordinator of another cell
+        """
+        if request["cell"] != self.cell_id or not self.agent.is_coordinator:
+            return
+        self.agent.handle_task_request("TASK_REQUEST", request["task"], ip)
+
+    def handle_handoff_request(self, type, request, ip):
+        """
+        Reserves a transfer slot at the boundary node and plans the pickup of the freight at the start of the slot. The
+        freight is ready once the agent of the other cell cleared the boundary node. The rest of the transport keeps the
+        task_id of the first part.
+        """
+        if request["cell"] != self.cell_id or not self.agent.is_coordinator:
+            return
+        now = time.time()
+        ready_time = now + request["ready_in"]
+        slot_start = self.reserve_transfer_slot(request["boundary_node"], ready_time)
+        self.agent.comm_handler.send(ip, "HANDOFF_ACCEPT", {"handoff_id": request["handoff_id"], "delay": slot_start - ready_time})
+        self.agent.log(f"Accepted handoff {request['handoff_id']} at {request['boundary_node']} in {slot_start - now:.1f}s")
+        task = {"start_node": request["boundary_node"], "end_node": request["end_node"],
+                "task_id": request.get("task_id")}
+        threading.Timer(slot_start - now, self.agent.handle_task_request, args=("TASK_REQUEST", task, ip)).start()
+
+    def handle_handoff_accept(self, type, reply, ip):
+        """
+        Distributes the own part of the transport once the next cell accepted the handoff. When the transfer slot
+        starts later than the freight would arrive, the distribution is delayed accordingly.
+        """
+        with self.lock:
+            handoff = self.pending_handoffs.pop(reply["handoff_id"], None)
+        if handoff is None:
+            return
+        if reply["delay"] > 0:
+            threading.Timer(reply["delay"], self.agent.distribute_task, args=handoff).start()
+        else:
+            self.agent.distribute_task(*handoff)
+
+    def check_handoff_timeout(self, handoff_id, next_cell):
+        """
+        Drops a handoff which was not accepted in time, so no freight is left at a boundary node
+        """
+        with self.lock:
+            handoff = self.pending_handoffs.pop(handoff_id, None)
+        if handoff is not None:
+            self.agent.log(f"Handoff {handoff_id} was not accepted by cell {next_cell}, transport is not executed")
+
+    def reserve_transfer_slot(self, boundary_node, ready_time):
+        """
+        Reserves the first free transfer slot at the boundary node that starts after the freight is ready
+        """
+        with self.lock:
+            now = time.time()
+            slots = sorted(slot for slot in self.transfer_slots.get(boundary_node, []) if slot[1] > now)
+            slot_start = ready_time
+            for start, end in slots:
+                if slot_start < end and slot_start + self.TRANSFER_SLOT_DURATION > start:
+                    slot_start = end
+            slots.append((slot_start, slot_start + self.TRANSFER_SLOT_DURATION))
+            self.transfer_slots[boundary_node] = slots
+            return slot_start
@@ -0,0 +1,83 @@
+import networkx as nx
+
+
+class CellMap:
+    """
+    The CellMap partitions the warehouse map into cells. Every cell has its own coordinator and multicast group. Nodes
+    that belong to several cells are boundary nodes where freight is handed over from one cell to the next.
+    """
+    CELL_MULTICAST_PREFIX = '224.1.2.'
+    BACKBONE_MULTICAST_IP = '224.1.3.1'
+
+    def __init__(self, edges, cells):
+        """
+        The cells are passed as dictionary of cell id and the list of nodes in the cell
+        """
+        self.edges = edges
+        self.cells = {int(cell_id): set(nodes) for cell_id, nodes in cells.items()}
+        self.G = nx.Graph()
+        self.G.add_edges_from(edges)
+        for u, v in edges:
+            if not self.get_cells_of(u) & self.get_cells_of(v):
+                raise Exception(f"Edge {u}-{v} does not lie within a cell")
+
+    def get_multicast_ip(self, cell_id):
+        """
+        Returns the multicast group of the agents in the cell
+        """
+        return f"{self.CELL_MULTICAST_PREFIX}{cell_id}"
+
+    def get_cells_of(self, node):
+        """
+        Returns the ids of all cells containing the node, more than one for boundary nodes
+        """
+        return {cell_id for cell_id, nodes in self.cells.items() if node in nodes}
+
+    def get_cell_edges(self, cell_id):
+        """
+        Returns the edges with both nodes inside the cell, which are used for local planning
+        """
+        nodes = self.cells[cell_id]
+        return [(u, v) for u, v in self.edges if u in nodes and v in nodes]
+
+    def get_cell_pos(self, cell_id, pos):
+        """
+        Returns the positions of the nodes inside the cell
+        """
+        return {node: pos[node] for node in self.cells[cell_id] if node in pos}
+
+    def get_boundary_nodes(self, cell_id):
+        """
+        Returns the nodes of the cell which also belong to another cell
+        """
+        return {node for node in self.cells[cell_id] if len(self.get_cells_of(node)) > 1}
+
+    def is_local(self, cell_id, start_node, end_node):
+        """
+        Checks whether both the start and the end node lie inside the cell
+        """
+        return start_node in self.cells[cell_id] and end_node in self.cells[cell_id]
+
+    def get_cell_route(self, start_node, end_node, start_cell=None):
+        """
+        Splits the shortest path through the whole map into segments within single cells. Every segment is returned as
+        (cell id, first node, last node), where the last node of a segment is the boundary node of the handoff to the
+        next cell.
+        """
+        path = nx.shortest_path(self.G, source=start_node, target=end_node)
+        if start_cell is not None:
+            cell = start_cell
+        elif len(path) > 1:
+            cell = min(self.get_cells_of(start_node) & self.get_cells_of(path[1]))
+        else:
+            cell = min(self.get_cells_of(start_node))
+        segments = []
+        segment_start = path[0]
+        for i in range(len(path) - 1):
+            if path[i+1] in self.cells[cell]:
+                continue
+            segments.append((cell, segment_start, path[i]))
+            cell = min(self.get_cells_of(path[i]) & self.get_cells_of(path[i+1]))
+            segment_start = path[i]
+        segments.append((cell, segment_start, path[-1]))
+        return segments
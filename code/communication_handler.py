@@ -1,8 +1,10 @@
 import socket
 import struct
 import threading
-import time
 import json
+from metrics import get_metrics
+from event_log import get_event_log
+from trace_recorder import get_trace_recorder
 
 class CommunicationHandler:
     """
@@ -13,25 +15,47 @@ class CommunicationHandler:
     MULTICAST_IP = '224.1.1.1'
     PORT = 5004
     INTERVAL = 5
+    MAX_DATAGRAM = 8192
+    LOGGED_MESSAGE_TYPES = {"TASK_REQUEST", "TASK_ACCEPTED", "TASK_DISTRIBUTION", "EXECUTE_TASK", "TASK_COMPLETED", "CELL_TASK_REQUEST",
+                            "HANDOFF_REQUEST", "HANDOFF_ACCEPT"}
 
-    def __init__(self, dicover_peer_callback):
+    def __init__(self, dicover_peer_callback, multicast_ip=None):
         """
-        Initializes the socket and subscribes to a peer discovery event.
+        Initializes the socket and subscribes to a peer discovery event. Agents of different cells use different
+        multicast groups.
         """
         self.peers = set()
         self.lock = threading.Lock()
         self.running = False
+        self.stopped = threading.Event()
         self.subscriptions = {}
         self.dicover_peer_callback = dicover_peer_callback
+        self.multicast_ip = multicast_ip or self.MULTICAST_IP
+        self.metrics = get_metrics()
+        self.events = get_event_log()
+        self.trace = get_trace_recorder()
+        self.message_counter = 0
+        self.message_lock = threading.Lock()
 
         self.subscribe("DISCOVER_PEER", self.handle_discover_peer)
 
+        self.open_socket()
+        self.join_group(self.multicast_ip)
+
+    def open_socket(self):
+        """
+        Opens the UDP socket used for multicast and direct messages
+        """
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
         self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.ip = self.get_local_ip()
         self.sock.bind(('', self.PORT))
 
-        mreq = struct.pack("4sl", socket.inet_aton(self.MULTICAST_IP), socket.INADDR_ANY)
+    def join_group(self, multicast_ip):
+        """
+        Joins a multicast group to receive the messages sent to it
+        """
+        mreq = struct.pack("4sl", socket.inet_aton(multicast_ip), socket.INADDR_ANY)
 
         self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
 
@@ -56,19 +80,64 @@ class CommunicationHandler:
         Starts a threads listening to the socket
         """
         self.running = True
+        self.stopped.clear()
         threading.Thread(target=self.listen).start()
         threading.Thread(target=self.publish_presence).start()
 
 
     def listen(self):
         """
-        listens to incomming connections and deserializes them into a message type and the message itself.
+        listens to incomming connections and deserializes them into a message type and the message itself. The loop ends
+        when stop shuts the socket down.
         """
         while self.running:
-            data, addr = self.sock.recvfrom(1024)
-            message = data.decode('utf-8')
-            type, message, ip = self.deserialize_message(message)
-            self.handle_subscription(type, message, ip)
+            try:
+                data, addr = self.sock.recvfrom(self.MAX_DATAGRAM)
+            except OSError:
+                if not self.running:
+                    break
+                raise
+            if not self.running:
+                break
+            self.receive(data)
+
+    def receive(self, data):
+        """
+        Deserializes a received datagram and passes it to the subscribed function. Datagrams that cannot be decoded,
+        like messages truncated to the receive buffer, are counted and dropped instead of stopping the receive loop.
+        Messages from other senders are written to the trace when recording is turned on.
+        """
+        self.metrics.increment("comm.received.messages")
+        self.metrics.increment("comm.received.bytes", len(data))
+        try:
+            type, message, ip, message_id = self.deserialize_message(data.decode('utf-8'))
+        except ValueError:
+            self.metrics.increment("comm.decode_errors")
+            return
+        if type in self.LOGGED_MESSAGE_TYPES and ip != self.ip:
+            self.events.record("message_received", agent=self.ip, type=type, message_id=message_id, sender=ip)
+        if ip != self.ip:
+            self.trace.record(type, message, ip)
+        self.handle_subscription(type, message, ip)
+
+    def transmit(self, data, address):
+        """
+        Sends a serialized message to an ip address or a multicast group
+        """
+        self.sock.sendto(data, (address, self.PORT))
+
+    def stop(self):
+        """
+        Stops publishing the presence and listening to messages. Shutting the socket down wakes up the listening thread
+        blocked in recvfrom, on an unconnected UDP socket this raises an error which is ignored.
+        """
+        self.running = False
+        self.stopped.set()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
 
     
     def publish_presence(self):
@@ -77,31 +146,62 @@ class CommunicationHandler:
         """
         while self.running:
             self.send_multicast("DISCOVER_PEER", True)
-            time.sleep(self.INTERVAL)
+            self.stopped.wait(self.INTERVAL)
 
     
-    def send_multicast(self, type, payload):
+    def send_multicast(self, type, payload, multicast_ip=None):
         """
-        Sends messages as a multicast to other peers
+        Sends messages as a multicast to other peers, by default to the group of the own cell
         """
-        message = self.serialize_message(type, payload, self.ip)
+        message_id = self.next_message_id()
+        message = self.serialize_message(type, payload, self.ip, message_id).encode('utf-8')
+        if len(message) > self.MAX_DATAGRAM:
+            self.metrics.increment("comm.oversized")
+            print(f"Message {type} with {len(message)} bytes exceeds the receive buffer and will be truncated")
         
         try:
-            self.sock.sendto(message.encode('utf-8'), (self.MULTICAST_IP, self.PORT))
+            with self.metrics.timer("comm.send_multicast"):
+                self.transmit(message, multicast_ip or self.multicast_ip)
+            self.metrics.increment(f"comm.sent.{type}")
+            self.metrics.increment("comm.sent.bytes", len(message))
         except Exception:
+            self.metrics.increment("comm.send_errors")
             print(f"An error uccured while sending multicast message")
+            return
+        if type in self.LOGGED_MESSAGE_TYPES:
+            self.events.record("message_sent", agent=self.ip, type=type, message_id=message_id, receiver=multicast_ip or self.multicast_ip)
 
 
     def send(self, address, type, payload):
         """
         Sends messages directly to other peers
         """
-        message = self.serialize_message(type, payload, self.ip)
+        message_id = self.next_message_id()
+        message = self.serialize_message(type, payload, self.ip, message_id).encode('utf-8')
+        if len(message) > self.MAX_DATAGRAM:
+            self.metrics.increment("comm.oversized")
+            print(f"Message {type} with {len(message)} bytes exceeds the receive buffer and will be truncated")
         try:
-            self.sock.sendto(message.encode('utf-8'), (address, self.PORT))
+            with self.metrics.timer("comm.send"):
+                self.transmit(message, address)
+            self.metrics.increment(f"comm.sent.{type}")
+            self.metrics.increment("comm.sent.bytes", len(message))
         except Exception:
+            self.metrics.increment("comm.send_errors")
             print(f"Error sending message to {address}")
+            return
+        if type in self.LOGGED_MESSAGE_TYPES:
+            self.events.record("message_sent", agent=self.ip, type=type, message_id=message_id, receiver=address)
+
 
+    def next_message_id(self):
+        """
+        Returns a unique id for the next sent message, which is used to match sent and received messages in the event logs.
+        The counter has its own lock, as messages are sent from the discover peer callback while the peer lock is held.
+        """
+        with self.message_lock:
+            self.message_counter += 1
+            return f"{self.ip}-{self.message_counter}"
 
     def get_peers(self):
         """
@@ -120,9 +220,14 @@ class CommunicationHandler:
     
     def handle_subscription(self, type, message, ip):
         """
-        Executes the suiting functions based on the message type
+        Executes the suiting functions based on the message type. Messages nobody subscribed to are ignored.
         """
-        self.subscriptions[type](type, message, ip)
+        callback = self.subscriptions.get(type)
+        if callback is None:
+            return
+        self.metrics.increment(f"comm.received.{type}")
+        with self.metrics.timer(f"comm.dispatch.{type}"):
+            callback(type, message, ip)
 
     
     def handle_discover_peer(self, type, message, ip):
@@ -135,21 +240,22 @@ class CommunicationHandler:
                 self.dicover_peer_callback(ip)
 
 
-    def serialize_message(self, type, message, address):
+    def serialize_message(self, type, message, address, message_id=None):
        """
-       Serializes messages into the json format for transmission
+       Serializes messages into the compact json format for transmission
        """
        return json.dumps({
             "type": type,
             "message": message,
-            "address": address
-        })
+            "address": address,
+            "id": message_id
+        }, separators=(',', ':'))
 
     
     def deserialize_message(self, payload):
         """
-        Deserializes messages from the json format into type, message and address
+        Deserializes messages from the json format into type, message, address and message id
         """
         payload = json.loads(payload)
-        return [payload["type"], payload["message"], payload["address"]]
+        return [payload["type"], payload["message"], payload["address"], payload.get("id")]
 
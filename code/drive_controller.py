@@ -1,16 +1,28 @@
+import threading
 import time
 import numpy as np
+from motion_sequencer import MotionSequence
 
 class DriveController:
     """
     The DriveController encapsulates the driving capabilities of the DJI Robomaster EP Core with a facade pattern.
     """
-    def __init__(self, robot):
+    GRIPPER_TIMEOUT = 2
+    SEQUENTIAL_PAUSES = {"pickup": 5.5, "dropoff": 5.5}
+    GRIPPER_STEPS = {"open_gripper", "close_gripper"}
+
+    def __init__(self, robot, overlap_motion=False):
         """
-        The robot object is passed by the robot class to the DriveController
+        The robot object is passed by the robot class to the DriveController. With overlap_motion the pickups and
+        dropoffs run as motion sequences in which independent arm, gripper and chassis actions overlap.
         """
         self.robot = robot
         self.stopped = False
+        self.overlap_motion = overlap_motion
+        self.gripper_status = None
+        self.gripper_condition = threading.Condition()
+        self.gripper_subscribed = False
+        self.handling_reports = []
 
     def drive(self, speed, turn_angle, timeout=0.1):
         """
@@ -33,6 +45,9 @@ class DriveController:
         """
         Adjusts the robot into the direction of the marker and picks up the freight
         """
+        if self.overlap_motion:
+            return self.run_handling(self.create_pickup_sequence(corners, turn_angle))
+        start = time.perf_counter()
         angle, distance = self.calculate_marker_distance_and_angle(corners)
         self.turn(angle)
         time.sleep(1)
@@ -48,11 +63,15 @@ class DriveController:
         time.sleep(0.5)
         self.robot.chassis.move(x=distance/3, y=0, z=0, xy_speed=0.6, z_speed=0).wait_for_completed()
         self.turn(turn_angle)
+        self.handling_reports.append({"name": "pickup", "duration": time.perf_counter() - start})
 
     def drop_off_freight(self, corners, turn_angle):
         """
         Adjusts the robot into the direction of the marker and drops off the freight
         """
+        if self.overlap_motion:
+            return self.run_handling(self.create_dropoff_sequence(corners, turn_angle))
+        start = time.perf_counter()
         angle, distance = self.calculate_marker_distance_and_angle(corners)
         self.turn(angle)
         time.sleep(1)
@@ -68,6 +87,107 @@ class DriveController:
         time.sleep(2)
         self.robot.chassis.move(x=-2*distance/3, y=0, z=0, xy_speed=0.6, z_speed=0).wait_for_completed()
         self.turn(turn_angle)
+        self.handling_reports.append({"name": "dropoff", "duration": time.perf_counter() - start})
+
+    def create_pickup_sequence(self, corners, turn_angle):
+        """
+        Declares the pickup as motion sequence. The gripper opens and the arm is lowered while the robot aligns with the
+        marker, and the arm is retracted while the robot moves onto the marker.
+        """
+        angle, distance = self.calculate_marker_distance_and_angle(corners)
+        chassis = self.robot.chassis
+        arm = self.robot.robotic_arm
+        sequence = MotionSequence("pickup")
+        sequence.add("align", lambda: self.turn(angle))
+        sequence.add("open_gripper", lambda: self.move_gripper("opened"))
+        sequence.add("arm_forward", lambda: arm.move(x=130, y=0).wait_for_completed())
+        sequence.add("arm_down", lambda: arm.move(x=0, y=-120).wait_for_completed(), ["arm_forward"])
+        sequence.add("approach", lambda: chassis.move(x=2*distance/3, y=0, z=0, xy_speed=0.6, z_speed=0).wait_for_completed(),
+                     ["align", "arm_down", "open_gripper"])
+        sequence.add("close_gripper", lambda: self.move_gripper("closed"), ["approach"])
+        sequence.add("arm_up", lambda: arm.move(x=0, y=120).wait_for_completed(), ["close_gripper"])
+        sequence.add("arm_back", lambda: arm.move(x=-130, y=0).wait_for_completed(), ["arm_up"])
+        sequence.add("move_on_marker", lambda: chassis.move(x=distance/3, y=0, z=0, xy_speed=0.6, z_speed=0).wait_for_completed(),
+                     ["arm_up"])
+        sequence.add("turn", lambda: self.turn(turn_angle), ["arm_back", "move_on_marker"])
+        return sequence
+
+    def create_dropoff_sequence(self, corners, turn_angle):
+        """
+        Declares the dropoff as motion sequence. The arm is lowered while the robot aligns with the marker, and the robot
+        backs off while the arm is retracted and the gripper closes.
+        """
+        angle, distance = self.calculate_marker_distance_and_angle(corners)
+        chassis = self.robot.chassis
+        arm = self.robot.robotic_arm
+        sequence = MotionSequence("dropoff")
+        sequence.add("align", lambda: self.turn(angle))
+        sequence.add("arm_forward", lambda: arm.move(x=130, y=0).wait_for_completed())
+        sequence.add("arm_down", lambda: arm.move(x=0, y=-120).wait_for_completed(), ["arm_forward"])
+        sequence.add("approach", lambda: chassis.move(x=2*distance/3, y=0, z=0, xy_speed=0.6, z_speed=0).wait_for_completed(),
+                     ["align", "arm_down"])
+        sequence.add("open_gripper", lambda: self.move_gripper("opened"), ["approach"])
+        sequence.add("arm_up", lambda: arm.move(x=0, y=120).wait_for_completed(), ["open_gripper"])
+        sequence.add("arm_back", lambda: arm.move(x=-130, y=0).wait_for_completed(), ["arm_up"])
+        sequence.add("close_gripper", lambda: self.move_gripper("closed"), ["arm_up"])
+        sequence.add("back_off", lambda: chassis.move(x=-2*distance/3, y=0, z=0, xy_speed=0.6, z_speed=0).wait_for_completed(),
+                     ["arm_up"])
+        sequence.add("turn", lambda: self.turn(turn_angle), ["arm_back", "close_gripper", "back_off"])
+        return sequence
+
+    def run_handling(self, sequence):
+        """
+        Runs the motion sequence of a pickup or dropoff and keeps its report
+        """
+        report = sequence.run()
+        report["sequential_duration"] = self.get_sequential_duration(report)
+        report["saved"] = report["sequential_duration"] - report["duration"]
+        self.handling_reports.append(report)
+        return report
+
+    def get_sequential_duration(self, report):
+        """
+        Estimates how long the sequential pickup or dropoff would have taken with the measured arm and chassis motions.
+        The sequential path sends the gripper commands without waiting and sleeps the SEQUENTIAL_PAUSES instead.
+        """
+        motions = sum(end - start for name, (start, end) in report["steps"].items() if name not in self.GRIPPER_STEPS)
+        return motions + self.SEQUENTIAL_PAUSES[report["name"]]
+
+    def move_gripper(self, status):
+        """
+        Opens or closes the gripper and waits until the gripper reports the status instead of sleeping a fixed time.
+        When the gripper does not report its status the wait ends after the GRIPPER_TIMEOUT.
+        """
+        self.subscribe_gripper_status()
+        with self.gripper_condition:
+            self.gripper_status = None
+        if status == "opened":
+            self.robot.gripper.open()
+        else:
+            self.robot.gripper.close()
+        with self.gripper_condition:
+            self.gripper_condition.wait_for(lambda: self.gripper_status == status, timeout=self.GRIPPER_TIMEOUT)
+
+    def subscribe_gripper_status(self):
+        """
+        Subscribes to the status of the gripper once the robot is connected
+        """
+        if self.gripper_subscribed:
+            return
+        self.gripper_subscribed = True
+        try:
+            self.robot.gripper.sub_status(freq=5, callback=self.handle_gripper_status)
+        except Exception:
+            pass
+
+    def handle_gripper_status(self, status_info):
+        """
+        Stores the status reported by the gripper and wakes up the waiting action
+        """
+        status = status_info[0] if isinstance(status_info, (tuple, list)) else status_info
+        with self.gripper_condition:
+            self.gripper_status = status
+            self.gripper_condition.notify_all()
 
     
     def turn(self, angle):
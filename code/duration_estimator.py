@@ -0,0 +1,149 @@
+import collections
+import threading
+
+
+class RunningEstimate:
+    """
+    Keeps an exponentially weighted moving average and a window of the most recent samples for quantiles
+    """
+    def __init__(self, prior, alpha, window):
+        """
+        The prior is the mean until the first sample, alpha the weight of a new sample and window the number of samples
+        kept for the quantiles
+        """
+        self.mean = prior
+        self.alpha = alpha
+        self.count = 0
+        self.samples = collections.deque(maxlen=window)
+
+    def add(self, value):
+        """
+        Updates the moving average with a new sample. The first sample replaces the prior.
+        """
+        self.mean = value if self.count == 0 else (1 - self.alpha) * self.mean + self.alpha * value
+        self.count += 1
+        self.samples.append(value)
+
+    def quantile(self, q):
+        """
+        Returns the quantile of the recent samples or the mean when there are no samples
+        """
+        if not self.samples:
+            return self.mean
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def get(self, statistic):
+        """
+        Returns the mean for "mean" and the quantile for a statistic like "p90"
+        """
+        if statistic == "mean":
+            return self.mean
+        return self.quantile(float(statistic[1:]) / 100)
+
+
+class DurationEstimator:
+    """
+    The DurationEstimator learns the actual durations of edge traversals, turns, pickups and dropoffs from the
+    measurements of the agents. Until a manoeuvre has been measured its duration is taken from the configured durations.
+    """
+    def __init__(self, durations, alpha=0.2, window=50, statistic="mean"):
+        """
+        The statistic is either the moving average "mean" or a quantile of the recent samples like "p50" or "p90"
+        """
+        self.MOVE_DURATION = durations["MOVE_DURATION"]
+        self.PICKUP_DURATION = durations["PICKUP_DURATION"]
+        self.DROPOFF_DURATION = durations["DROPOFF_DURATION"]
+        self.TURN_DURATION = durations["TURN_DURATION"]
+        self.alpha = alpha
+        self.window = window
+        self.statistic = statistic
+        self.estimates = {}
+        self.lock = threading.Lock()
+
+    def get_edge_key(self, u, v):
+        """
+        Edges are undirected, so both directions share an estimate
+        """
+        return "edge:" + "-".join(sorted((u, v)))
+
+    def get_turn_key(self, angle):
+        """
+        Turns in both directions by the same angle share an estimate
+        """
+        return f"turn:{abs(int(angle))}"
+
+    def get_prior(self, key):
+        """
+        Returns the configured duration of a manoeuvre which is used until it has been measured
+        """
+        if key.startswith("edge:"):
+            return self.MOVE_DURATION
+        if key.startswith("turn:"):
+            return int(key[5:]) / 90 * self.TURN_DURATION
+        if key == "pickup":
+            return self.PICKUP_DURATION
+        return self.DROPOFF_DURATION
+
+    def get(self, key, prior=None):
+        """
+        Returns the estimated duration or the prior when the manoeuvre has not been measured yet
+        """
+        with self.lock:
+            estimate = self.estimates.get(key)
+            if estimate is None:
+                return self.get_prior(key) if prior is None else prior
+            return estimate.get(self.statistic)
+
+    def get_edge_duration(self, u, v, prior=None):
+        """
+        Returns the estimated duration of the edge, the prior overrides the configured duration
+        """
+        return self.get(self.get_edge_key(u, v), prior)
+
+    def get_turn_duration(self, angle):
+        """
+        Returns the estimated duration of a turn by the angle, no turn takes no time
+        """
+        if angle == 0:
+            return 0
+        return self.get(self.get_turn_key(angle))
+
+    def get_pickup_duration(self):
+        """
+        Returns the estimated duration of a pickup
+        """
+        return self.get("pickup")
+
+    def get_dropoff_duration(self):
+        """
+        Returns the estimated duration of a dropoff
+        """
+        return self.get("dropoff")
+
+    def add_sample(self, key, duration):
+        """
+        Adds a measured duration for the manoeuvre specified by the key
+        """
+        if duration < 0:
+            return
+        with self.lock:
+            estimate = self.estimates.get(key)
+            if estimate is None:
+                estimate = self.estimates[key] = RunningEstimate(self.get_prior(key), self.alpha, self.window)
+            estimate.add(duration)
+
+    def add_samples(self, samples):
+        """
+        Adds a list of [key, duration] samples like the ones shared between the agents
+        """
+        for key, duration in samples:
+            self.add_sample(key, duration)
+
+    def get_summary(self):
+        """
+        Returns the mean, median, 90% quantile and sample count of every measured manoeuvre
+        """
+        with self.lock:
+            return {key: {"mean": e.mean, "p50": e.quantile(0.5), "p90": e.quantile(0.9), "count": e.count}
+                    for key, e in self.estimates.items()}
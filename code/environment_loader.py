@@ -11,6 +11,9 @@ class EnvironmentLoader:
     def getIsCoordinator(self):
         return os.getenv('IS_COORDINATOR', 'False').lower() == 'true'
     
+    def getRole(self):
+        return os.getenv('ROLE', 'executor').lower()
+
     def getLocation(self):
         return os.getenv('LOCATION', '')
     
@@ -42,3 +45,109 @@ class EnvironmentLoader:
     
     def getUseBestPath(self):
         return os.getenv('USE_BEST_PATH', 'True').lower() == 'true'
+
+    def getOverlapMotion(self):
+        return os.getenv('OVERLAP_MOTION', 'False').lower() == 'true'
+
+    def getRecording(self):
+        recording = {}
+        recording["mode"] = os.getenv('RECORDING_MODE', 'off').lower()
+        recording["directory"] = os.getenv('RECORDING_DIRECTORY', 'images')
+        recording["every_nth"] = int(os.getenv('RECORDING_EVERY_NTH', '10'))
+        recording["buffer_size"] = int(os.getenv('RECORDING_BUFFER_SIZE', '64'))
+        recording["pre_incident_frames"] = int(os.getenv('RECORDING_PRE_INCIDENT_FRAMES', '60'))
+        recording["video"] = os.getenv('RECORDING_VIDEO', 'False').lower() == 'true'
+        recording["fps"] = int(os.getenv('RECORDING_FPS', '15'))
+        return recording
+
+    def getVision(self):
+        vision = {}
+        vision["fast_marker_detection"] = os.getenv('FAST_MARKER_DETECTION', 'False').lower() == 'true'
+        vision["fast_line_detection"] = os.getenv('FAST_LINE_DETECTION', 'False').lower() == 'true'
+        vision["debug_output"] = os.getenv('VISION_DEBUG_OUTPUT', 'True').lower() == 'true'
+        vision["backend"] = os.getenv('VISION_BACKEND', 'inline').lower()
+        return vision
+
+    def getLineControl(self):
+        line_control = {}
+        line_control["kp"] = float(os.getenv('LINE_KP', '10'))
+        line_control["ki"] = float(os.getenv('LINE_KI', '0'))
+        line_control["kd"] = float(os.getenv('LINE_KD', '1'))
+        line_control["derivative_filter"] = float(os.getenv('LINE_DERIVATIVE_FILTER', '0.7'))
+        line_control["lookahead"] = float(os.getenv('LINE_LOOKAHEAD', '0.5'))
+        line_control["min_speed"] = float(os.getenv('LINE_MIN_SPEED', '0.15'))
+        line_control["max_speed"] = float(os.getenv('LINE_MAX_SPEED', '0.4'))
+        line_control["marker_speed"] = float(os.getenv('LINE_MARKER_SPEED', '0.2'))
+        line_control["acceleration"] = float(os.getenv('LINE_ACCELERATION', '0.3'))
+        line_control["deceleration"] = float(os.getenv('LINE_DECELERATION', '0.5'))
+        line_control["curve_slowdown"] = float(os.getenv('LINE_CURVE_SLOWDOWN', '2'))
+        line_control["node_spacing"] = float(os.getenv('LINE_NODE_SPACING', '0'))
+        return line_control
+
+    def getRepositioning(self):
+        repositioning = {}
+        repositioning["enabled"] = os.getenv('REPOSITIONING', 'False').lower() == 'true'
+        repositioning["interval"] = float(os.getenv('REPOSITIONING_INTERVAL', '5'))
+        repositioning["window"] = int(os.getenv('REPOSITIONING_WINDOW', '50'))
+        repositioning["min_requests"] = int(os.getenv('REPOSITIONING_MIN_REQUESTS', '5'))
+        repositioning["cancel_timeout"] = float(os.getenv('REPOSITIONING_CANCEL_TIMEOUT', '0'))
+        return repositioning
+
+    def getMetrics(self):
+        metrics = {}
+        metrics["mode"] = os.getenv('METRICS_MODE', 'off').lower()
+        metrics["path"] = os.getenv('METRICS_PATH', 'metrics.json')
+        metrics["port"] = int(os.getenv('METRICS_PORT', '9100'))
+        metrics["interval"] = float(os.getenv('METRICS_INTERVAL', '5'))
+        return metrics
+
+    def getCalibration(self):
+        calibration = {}
+        calibration["enabled"] = os.getenv('CALIBRATION', 'False').lower() == 'true'
+        calibration["alpha"] = float(os.getenv('CALIBRATION_ALPHA', '0.2'))
+        calibration["window"] = int(os.getenv('CALIBRATION_WINDOW', '50'))
+        calibration["statistic"] = os.getenv('CALIBRATION_STATISTIC', 'mean').lower()
+        return calibration
+
+    def getEdgeWeights(self):
+        edge_weights = {}
+        edge_weights["mode"] = os.getenv('EDGE_WEIGHTS', 'hop').lower()
+        edge_weights["unit_length"] = float(os.getenv('EDGE_UNIT_LENGTH', '1'))
+        edge_weights["lengths"] = {}
+        lengths = os.getenv('EDGE_LENGTHS', '')
+        for edge in lengths.split(';'):
+            if edge:
+                u, v, length = edge.split(',')
+                edge_weights["lengths"][(u, v)] = float(length)
+        return edge_weights
+
+    def getCells(self):
+        cells = os.getenv('CELLS', '')
+        if not cells:
+            return None
+        cell_nodes = {}
+        for cell in cells.split(';'):
+            cell_id, nodes = cell.split(':')
+            cell_nodes[int(cell_id)] = nodes.split(',')
+        return {"cell_id": int(os.getenv('CELL_ID', '1')), "cells": cell_nodes}
+
+    def getElection(self):
+        election = {}
+        election["enabled"] = os.getenv('LEADER_ELECTION', 'False').lower() == 'true'
+        election["priority"] = int(os.getenv('COORDINATOR_PRIORITY', '0'))
+        election["lease_duration"] = float(os.getenv('COORDINATOR_LEASE_DURATION', '3'))
+        election["heartbeat_interval"] = float(os.getenv('COORDINATOR_HEARTBEAT_INTERVAL', '1'))
+        return election
+
+    def getEventLog(self):
+        event_log = {}
+        event_log["mode"] = os.getenv('EVENT_LOG', 'off').lower()
+        event_log["path"] = os.getenv('EVENT_LOG_PATH', 'events.jsonl')
+        return event_log
+
+    def getTrace(self):
+        trace = {}
+        trace["mode"] = os.getenv('TRACE', 'off').lower()
+        trace["path"] = os.getenv('TRACE_PATH', 'trace.jsonl.gz')
+        trace["types"] = [type for type in os.getenv('TRACE_TYPES', '').split(',') if type]
+        return trace
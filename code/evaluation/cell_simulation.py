@@ -0,0 +1,51 @@
+import os
+import sys
+import time
+code_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, code_path)
+
+from agent import Agent # type: ignore
+from loopback_network import LoopbackNetwork # type: ignore
+from cell_map import CellMap # type: ignore
+
+
+class CellSimulation:
+    """
+    Simulates a warehouse partitioned into two cells with mock agents on a LoopbackNetwork and sends a transport that
+    crosses the cell boundary, so the handoff between the cell coordinators can be followed in the log.
+    """
+    EDGES = [("A", "B"), ("B", "F"), ("F", "J"), ("J", "K"), ("K", "L"), ("L", "H"), ("H", "C"), ("C", "D"), ("E", "F"),
+             ("H", "I"), ("F", "G"), ("G", "H")]
+    POS = {"A": (0, 2), "B": (2, 2), "C": (6, 2), "D": (8, 2), "E": (0, 1), "F": (2, 1), "G": (4, 1), "K": (4, 0),
+           "H": (6, 1), "I": (8, 1), "J": (2, 0), "L": (6, 0)}
+    CELLS = {1: ["A", "B", "E", "F", "G", "J", "K"], 2: ["G", "H", "C", "D", "I", "L", "K"]}
+    AGENTS = [("10.0.1.1", 1, "E", True), ("10.0.1.2", 1, "J", False), ("10.0.2.1", 2, "I", True), ("10.0.2.2", 2, "L", False)]
+
+    def __init__(self, move_duration=0.2):
+        self.network = LoopbackNetwork()
+        self.durations = {"MOVE_DURATION": move_duration, "PICKUP_DURATION": move_duration,
+                          "DROPOFF_DURATION": move_duration, "TURN_DURATION": move_duration / 2}
+        self.agents = []
+
+    def start(self):
+        for ip, cell_id, location, is_coordinator in self.AGENTS:
+            cells = {"cell_id": cell_id, "cells": self.CELLS}
+            agent = Agent(location, is_coordinator, self.POS, self.EDGES, True, 0, self.durations, True,
+                          cells=cells, comm_handler_factory=self.network.create_handler_factory(ip))
+            self.agents.append(agent)
+        time.sleep(0.5)
+
+    def run(self, start_node, end_node, duration):
+        self.start()
+        wms = self.network.create_handler_factory("10.0.0.1")(lambda ip: None, CellMap(self.EDGES, self.CELLS).get_multicast_ip(1))
+        wms.send_multicast("TASK_REQUEST", {"start_node": start_node, "end_node": end_node})
+        time.sleep(duration)
+        wms.stop()
+        for agent in self.agents:
+            agent.stop()
+
+
+if __name__ == "__main__":
+    start_node = sys.argv[1] if len(sys.argv) > 1 else "A"
+    end_node = sys.argv[2] if len(sys.argv) > 2 else "D"
+    CellSimulation().run(start_node, end_node, 10)
@@ -0,0 +1,122 @@
+import glob
+import os
+import sys
+import cv2
+import numpy as np
+code_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, code_path)
+
+from marker_detector import MarkerDetector # type: ignore
+from line_detector import LineDetector # type: ignore
+
+
+class DetectorComparison:
+    """
+    Compares the fast detection modes against the original detectors on recorded frames like the ones written to images/
+    """
+
+    def __init__(self, image_directory, corner_tolerance=1.5, centroid_tolerance=2, contour_tolerance=10):
+        """
+        The tolerances are in pixels. The centroid_tolerance applies to the centroid within the bands, the looser
+        contour_tolerance to the offset from the centroid of the whole contour that the robot steers by without the fast
+        path. A slanted line shifts the centroid in the bands by a few pixels, 10 pixels are about 5 % of half the width
+        of the line region.
+        """
+        self.image_paths = sorted(glob.glob(os.path.join(image_directory, "*.jpg")))
+        self.corner_tolerance = corner_tolerance
+        self.centroid_tolerance = centroid_tolerance
+        self.contour_tolerance = contour_tolerance
+
+    def compare_lines(self):
+        """
+        The fast path estimates the centroid of the line within its bands, the contour path the centroid of the whole
+        visible line. The fast centroid is checked against the largest contour within the same bands with the
+        centroid_tolerance and against the centroid of the whole contour with the contour_tolerance.
+        """
+        reference = LineDetector()
+        tuned = LineDetector(fast=True, headless=True)
+        mismatches = 0
+        max_centroid_error = 0
+        contour_offsets = []
+        for path in self.image_paths:
+            img = cv2.imread(path)
+            line_img = img[:, img.shape[1]//3:img.shape[1]*2//3]
+            ref_detected, ref_centroid, _ = reference.detect(line_img.copy())
+            detected, centroid, _ = tuned.detect(line_img.copy())
+            if ref_detected != detected:
+                mismatches += 1
+                print(f"{os.path.basename(path)}: line detected {ref_detected} != {detected}")
+                continue
+            if not detected:
+                continue
+            band_centroid = self.get_band_centroid(line_img, reference, tuned.get_band_rows(line_img.shape[0]))
+            error = abs(band_centroid - centroid[0])
+            max_centroid_error = max(max_centroid_error, error)
+            contour_offset = abs(ref_centroid[0] - centroid[0])
+            contour_offsets.append(contour_offset)
+            if error > self.centroid_tolerance:
+                mismatches += 1
+                print(f"{os.path.basename(path)}: centroid x in the bands {band_centroid:.1f} != {centroid[0]}")
+            elif contour_offset > self.contour_tolerance:
+                mismatches += 1
+                print(f"{os.path.basename(path)}: centroid x of the whole contour {ref_centroid[0]} != {centroid[0]}")
+        print(f"Lines: {len(self.image_paths)} frames, {mismatches} mismatches, max centroid error {max_centroid_error:.1f}px")
+        if contour_offsets:
+            print(f"Lines: offset to the centroid of the whole contour mean {np.mean(contour_offsets):.1f}px, "
+                  f"max {max(contour_offsets)}px")
+        return mismatches
+
+    def get_band_centroid(self, image, detector, band_rows):
+        """
+        Returns the centroid x of the largest contour of the contour path within the band rows of the fast path
+        """
+        mask = cv2.inRange(cv2.cvtColor(image, cv2.COLOR_BGR2HSV), detector.lower_red, detector.upper_red)
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        contour_mask = np.zeros_like(mask)
+        cv2.drawContours(contour_mask, [max(contours, key=cv2.contourArea)], -1, 255, -1)
+        rows = np.concatenate([(mask & contour_mask)[y0:y1] for y0, y1 in band_rows])
+        column_counts = np.count_nonzero(rows, axis=0)
+        return np.dot(column_counts, np.arange(column_counts.size)) / max(column_counts.sum(), 1)
+
+    def compare_markers(self):
+        """
+        Checks that the fast marker detection finds the same ids with corners within the corner_tolerance in the middle
+        third of the frames, where the Robot detects the markers
+        """
+        reference = MarkerDetector()
+        tuned = MarkerDetector(fast=True, debug=False)
+        mismatches = 0
+        max_corner_error = 0
+        for path in self.image_paths:
+            img = cv2.imread(path)
+            marker_image = img[:, img.shape[1]//3:img.shape[1]*2//3]
+            ref_ids, ref_corners, _ = reference.detect(marker_image.copy())
+            ids, corners, _ = tuned.detect(marker_image.copy())
+            ref_ids = self.filter_ids(ref_ids, ref_corners, tuned.marker_ids)
+            found_ids = self.filter_ids(ids, corners, tuned.marker_ids)
+            if set(ref_ids) != set(found_ids):
+                mismatches += 1
+                print(f"{os.path.basename(path)}: ids {sorted(ref_ids)} != {sorted(found_ids)}")
+                continue
+            for marker_id in ref_ids:
+                error = np.abs(ref_ids[marker_id] - found_ids[marker_id]).max()
+                max_corner_error = max(max_corner_error, error)
+                if error > self.corner_tolerance:
+                    mismatches += 1
+                    print(f"{os.path.basename(path)}: corners of marker {marker_id} differ by {error:.2f}px")
+        print(f"Markers: {len(self.image_paths)} frames, {mismatches} mismatches, max corner error {max_corner_error:.2f}px")
+        return mismatches
+
+    def filter_ids(self, ids, corners, marker_ids):
+        """
+        Returns the corners of the detected markers of the map by their id
+        """
+        if ids is None:
+            return {}
+        return {marker_id: c.reshape(4, 2) for marker_id, c in zip(ids.flatten(), corners) if marker_id in marker_ids}
+
+
+if __name__ == "__main__":
+    comparison = DetectorComparison(sys.argv[1] if len(sys.argv) > 1 else "images")
+    comparison.compare_lines()
+    comparison.compare_markers()
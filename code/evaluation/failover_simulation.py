@@ -0,0 +1,79 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+code_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, code_path)
+
+from agent import Agent # type: ignore
+from loopback_network import LoopbackNetwork # type: ignore
+
+
+class FailoverSimulation:
+    """
+    Simulates a cell with mock agents and leader election on a LoopbackNetwork. The WMS sends transport requests at a
+    fixed rate, the coordinator is stopped in the middle of the run and the served requests per second show how long
+    the cell was without coordinator.
+    """
+    EDGES = [("A", "B"), ("B", "F"), ("F", "J"), ("J", "K"), ("K", "L"), ("L", "H"), ("H", "C"), ("C", "D"), ("E", "F"),
+             ("H", "I"), ("F", "G"), ("G", "H")]
+    POS = {"A": (0, 2), "B": (2, 2), "C": (6, 2), "D": (8, 2), "E": (0, 1), "F": (2, 1), "G": (4, 1), "K": (4, 0),
+           "H": (6, 1), "I": (8, 1), "J": (2, 0), "L": (6, 0)}
+    AGENTS = [("10.0.0.11", "E", 3, True), ("10.0.0.12", "J", 2, False), ("10.0.0.13", "I", 1, False)]
+    REQUESTS = [("A", "C"), ("B", "D"), ("A", "D"), ("B", "C")]
+
+    def __init__(self, request_interval=0.5, lease_duration=1.5, heartbeat_interval=0.5, move_duration=0.05):
+        self.network = LoopbackNetwork()
+        self.request_interval = request_interval
+        self.election = {"enabled": True, "lease_duration": lease_duration, "heartbeat_interval": heartbeat_interval}
+        self.durations = {"MOVE_DURATION": move_duration, "PICKUP_DURATION": move_duration,
+                          "DROPOFF_DURATION": move_duration, "TURN_DURATION": move_duration}
+        self.served = []
+        self.agents = []
+
+    def start(self):
+        for ip, location, priority, is_coordinator in self.AGENTS:
+            election = dict(self.election, priority=priority)
+            self.agents.append(Agent(location, is_coordinator, self.POS, self.EDGES, True, 0, self.durations, True,
+                                     comm_handler_factory=self.network.create_handler_factory(ip), election=election))
+        self.wms = self.network.create_handler_factory("10.0.0.1")(lambda ip: None)
+        self.wms.subscribe("TASK_DISTRIBUTION", self.handle_task_distribution)
+        self.wms.running = True
+        threading.Thread(target=self.wms.listen).start()
+
+    def handle_task_distribution(self, type, task_list, ip):
+        self.served.append((time.time(), ip, task_list[0].get("task_id")))
+
+    def run(self, duration=10, failure_time=3):
+        self.start()
+        start = time.time()
+        sent = 0
+        failed = False
+        while time.time() - start < duration:
+            if not failed and time.time() - start > failure_time:
+                self.agents[0].stop()
+                failed = True
+            start_node, end_node = self.REQUESTS[sent % len(self.REQUESTS)]
+            self.wms.send_multicast("TASK_REQUEST", {"start_node": start_node, "end_node": end_node})
+            sent += 1
+            time.sleep(self.request_interval)
+        time.sleep(1)
+        self.report(start, sent, failure_time)
+        self.wms.stop()
+        for agent in self.agents[1:]:
+            agent.stop()
+
+    def report(self, start, sent, failure_time):
+        per_second = Counter(int(served_time - start) for served_time, _, _ in self.served)
+        for second in range(max(per_second) + 1 if per_second else 0):
+            print(f"{second:3d}s served {per_second[second]}")
+        task_ids = {task_id for _, _, task_id in self.served}
+        takeover = [served_time - start - failure_time for served_time, ip, _ in self.served if ip != self.AGENTS[0][0]]
+        print(f"sent {sent}, served {len(task_ids)}, duplicates {len(self.served) - len(task_ids)}")
+        if takeover:
+            print(f"first request served by the new coordinator {takeover[0]:.2f}s after the failure")
+
+
+if __name__ == "__main__":
+    FailoverSimulation().run()
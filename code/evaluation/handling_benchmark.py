@@ -0,0 +1,39 @@
+import os
+import sys
+code_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, code_path)
+
+from drive_controller import DriveController # type: ignore
+from mock_sdk import MockEPRobot # type: ignore
+
+
+class HandlingBenchmark:
+    """
+    Compares the sequential pickups and dropoffs with the overlapped motion sequences on a MockEPRobot which simulates
+    the durations of the arm, gripper and chassis actions. The sequential duration which the overlapped sequences
+    estimate for the log of the robot is printed next to the measured one.
+    """
+
+    def __init__(self, time_scale=1):
+        self.time_scale = time_scale
+        self.corners = [[[[190, 420], [250, 420], [250, 480], [190, 480]]]]
+
+    def measure(self, overlap_motion):
+        drive_controller = DriveController(MockEPRobot(time_scale=self.time_scale), overlap_motion)
+        drive_controller.pick_up_freight(self.corners, 90)
+        drive_controller.drop_off_freight(self.corners, -90)
+        return {report["name"]: report for report in drive_controller.handling_reports}
+
+    def run(self):
+        sequential = self.measure(False)
+        overlapped = self.measure(True)
+        for name in sequential:
+            duration = sequential[name]["duration"]
+            report = overlapped[name]
+            print(f"{name}: sequential {duration:.2f}s (estimated {report['sequential_duration']:.2f}s), "
+                  f"overlapped {report['duration']:.2f}s, saved {duration - report['duration']:.2f}s")
+        return sequential, overlapped
+
+
+if __name__ == "__main__":
+    HandlingBenchmark(float(sys.argv[1]) if len(sys.argv) > 1 else 1).run()
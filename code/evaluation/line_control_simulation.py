@@ -0,0 +1,129 @@
+import argparse
+import math
+import os
+import random
+import sys
+code_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, code_path)
+
+from line_controller import LineController, get_line_geometry # type: ignore
+
+
+class FixedController:
+    """
+    The proportional controller the Robot used before the LineController, with a constant speed of 0.2 m/s and a gain
+    of 0.05 degrees per second and pixel, which is about 10 for a normalized error
+    """
+    def __init__(self, speed=0.2, kp=10.6):
+        self.speed = speed
+        self.kp = kp
+        self.distance = 0
+
+    def reset(self):
+        self.distance = 0
+
+    def update(self, error, heading=0.0, curvature=0.0, remaining=None, now=None, marker_ahead=False):
+        return self.speed, self.kp * error
+
+
+class LineControlSimulation:
+    """
+    Simulates a robot following a straight line between two markers. After the turn on a marker the robot starts with
+    a lateral offset and a heading error. The camera sees the line in the bands of the LineDetector at look-ahead
+    distances in front of the robot, the centroids are disturbed by noise and the robot applies the drive command of
+    the controller until the next frame. The simulation reports the time per edge, the lateral error and the speed
+    when the robot reaches the marker where it has to stop. Without a known distance the controller is not told the
+    remaining distance to the marker, like a robot without a node spacing, and only learns that the marker is ahead
+    once it appears at the top of the image.
+    """
+    WIDTH = 426
+    HEIGHT = 720
+    BANDS = (0.6, 0.75, 0.9)
+    NEAR = 0.12
+    FAR = 0.30
+    HALF_FIELD = 0.15
+
+    def __init__(self, edge_length=1.0, frame_rate=20, noise=4, offset=0.02, heading=5, seed=1):
+        """
+        The edge_length is in metres, the noise is the standard deviation of the centroids in pixels, the offset in
+        metres and the heading in degrees are the maximum disturbances after a turn
+        """
+        self.edge_length = edge_length
+        self.frame_rate = frame_rate
+        self.noise = noise
+        self.offset = offset
+        self.heading = heading
+        self.seed = seed
+
+    def get_distance(self, row):
+        """
+        Returns the distance in front of the robot that is seen in the given row of the image in image heights
+        """
+        return self.NEAR + (self.FAR - self.NEAR) * (max(self.BANDS) - row) / (max(self.BANDS) - min(self.BANDS))
+
+    def get_bands(self, lateral, heading, rng):
+        """
+        Projects the line into the bands. The lateral offset is positive when the robot is right of the line and the
+        heading is positive when the robot is turned to the right.
+        """
+        bands = []
+        for band in self.BANDS:
+            distance = self.get_distance(band)
+            line = -(lateral + distance * math.tan(heading))
+            column = self.WIDTH / 2 + line / self.HALF_FIELD * self.WIDTH / 2 + rng.gauss(0, self.noise)
+            bands.append((int(self.HEIGHT * band), column if 0 <= column < self.WIDTH else None))
+        return bands
+
+    def drive_edge(self, controller, rng, known_distance=True):
+        """
+        Drives one edge and returns the duration, the mean and maximum lateral error and the speed at the marker
+        """
+        lateral = rng.uniform(-self.offset, self.offset)
+        heading = math.radians(rng.uniform(-self.heading, self.heading))
+        controller.reset()
+        dt = 1 / self.frame_rate
+        now = 0
+        travelled = 0
+        speed = 0
+        errors = []
+        while travelled < self.edge_length:
+            geometry = get_line_geometry(self.get_bands(lateral, heading, rng), self.WIDTH, self.HEIGHT)
+            if geometry is None:
+                return None
+            remaining = self.edge_length - travelled
+            marker_ahead = not known_distance and remaining <= self.get_distance(0)
+            speed, turn_angle = controller.update(*geometry, remaining=remaining if known_distance else None, now=now,
+                                                  marker_ahead=marker_ahead)
+            heading += math.radians(turn_angle) * dt
+            lateral += speed * math.sin(heading) * dt
+            travelled += speed * math.cos(heading) * dt
+            errors.append(abs(lateral))
+            now += dt
+        return now, sum(errors) / len(errors), max(errors), speed
+
+    def run(self, controller, edges=50, known_distance=True):
+        rng = random.Random(self.seed)
+        results = [self.drive_edge(controller, rng, known_distance) for _ in range(edges)]
+        lost = results.count(None)
+        results = [result for result in results if result is not None]
+        return {"edges": edges, "lost": lost,
+                "duration": sum(result[0] for result in results) / len(results),
+                "mean_error": sum(result[1] for result in results) / len(results),
+                "max_error": max(result[2] for result in results),
+                "marker_speed": max(result[3] for result in results)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compares the fixed speed line following with the LineController")
+    parser.add_argument("--edge-length", type=float, default=1.0, help="length of an edge in metres")
+    parser.add_argument("--noise", type=float, default=4, help="noise of the centroids in pixels")
+    parser.add_argument("--frame-rate", type=float, default=20, help="processed frames per second")
+    parser.add_argument("--edges", type=int, default=50, help="number of simulated edges")
+    args = parser.parse_args()
+    simulation = LineControlSimulation(args.edge_length, args.frame_rate, args.noise)
+    for name, controller, known_distance in (("fixed", FixedController(), True), ("adaptive", LineController(), True),
+                                             ("unknown", LineController(), False)):
+        report = simulation.run(controller, args.edges, known_distance)
+        print(f"{name:8s} {report['duration']:.2f}s per edge, lateral error mean {report['mean_error']*100:.1f}cm "
+              f"max {report['max_error']*100:.1f}cm, speed at marker {report['marker_speed']:.2f}m/s, "
+              f"line lost on {report['lost']} of {report['edges']} edges")
@@ -0,0 +1,133 @@
+import argparse
+import os
+import sys
+import threading
+import time
+code_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, code_path)
+
+from loopback_network import LoopbackNetwork, LoopbackCommunicationHandler # type: ignore
+
+
+class LatencyRecorder:
+    """
+    Collects the latencies and counts of the received messages of every message type
+    """
+    def __init__(self):
+        self.latencies = {}
+        self.lock = threading.Lock()
+
+    def record(self, type, latency):
+        with self.lock:
+            self.latencies.setdefault(type, []).append(latency)
+
+    def count(self, type):
+        with self.lock:
+            return len(self.latencies.get(type, []))
+
+    def get_percentiles(self, type):
+        with self.lock:
+            ordered = sorted(self.latencies.get(type, []))
+        if not ordered:
+            return None
+        def quantile(q):
+            return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+        return {"p50": quantile(0.5), "p90": quantile(0.9), "p99": quantile(0.99), "max": ordered[-1] * 1000}
+
+
+class SimulatedPeer:
+    """
+    Lightweight peer that only communicates: it publishes its presence and answers location requests like an agent.
+    The coordinator additionally receives the transport requests. Slow callbacks are simulated with a delay.
+    """
+    def __init__(self, network, ip, recorder, callback_delay, discover_interval, is_coordinator=False):
+        self.recorder = recorder
+        self.callback_delay = callback_delay
+        self.comm_handler = LoopbackCommunicationHandler(network, ip, self.handle_discover_peer)
+        self.comm_handler.INTERVAL = discover_interval
+        self.comm_handler.subscribe("LOCATION_REQUEST", self.send_location_info)
+        self.comm_handler.subscribe("LOCATION_RESPONSE", self.handle_location_info)
+        if is_coordinator:
+            self.comm_handler.subscribe("TASK_REQUEST", self.handle_task_request)
+        self.max_queue = 0
+
+    def handle_discover_peer(self, ip):
+        self.comm_handler.send(ip, "LOCATION_REQUEST", {"node": "A", "facing_direction": 0, "sent": time.time()})
+
+    def send_location_info(self, type, message, ip):
+        time.sleep(self.callback_delay)
+        self.comm_handler.send(ip, "LOCATION_RESPONSE", {"node": "A", "facing_direction": 0, "sent": message["sent"]})
+
+    def handle_location_info(self, type, message, ip):
+        self.recorder.record("LOCATION round trip", time.time() - message["sent"])
+
+    def handle_task_request(self, type, task, ip):
+        self.recorder.record("TASK_REQUEST", time.time() - task["sent"])
+        self.max_queue = max(self.max_queue, self.comm_handler.inbox.qsize())
+        time.sleep(self.callback_delay)
+
+
+class LoadTest:
+    """
+    Starts simulated peers on a LoopbackNetwork and lets a simulated WMS send bursts of transport requests to the cell.
+    Reports the latency percentiles, the drop and truncation rates and the queue of the coordinator.
+    """
+    def __init__(self, peers=50, task_rate=20, burst=1, padding=0, callback_delay=0, discover_interval=1,
+                 receive_buffer=256, max_datagram=LoopbackCommunicationHandler.MAX_DATAGRAM):
+        self.network = LoopbackNetwork(max_datagram, receive_buffer)
+        self.recorder = LatencyRecorder()
+        self.task_rate = task_rate
+        self.burst = burst
+        self.padding = padding
+        self.peers = [SimulatedPeer(self.network, f"10.1.{i // 250}.{i % 250 + 1}", self.recorder, callback_delay,
+                                    discover_interval, i == 0) for i in range(peers)]
+        self.wms = LoopbackCommunicationHandler(self.network, "10.0.0.1", lambda ip: None)
+
+    def run(self, duration=10):
+        for peer in self.peers:
+            peer.comm_handler.start()
+        start = time.time()
+        sent = 0
+        while time.time() - start < duration:
+            for _ in range(self.burst):
+                self.wms.send_multicast("TASK_REQUEST", {"start_node": "A", "end_node": "D", "sent": time.time(),
+                                                         "seq": sent, "padding": "x" * self.padding})
+                sent += 1
+            time.sleep(self.burst / self.task_rate)
+        time.sleep(1)
+        for peer in self.peers:
+            peer.comm_handler.stop()
+        self.wms.stop()
+        self.report(sent, duration)
+
+    def report(self, sent, duration):
+        stats = self.network.get_stats()
+        total = stats["delivered"] + stats["dropped"]
+        expected_locations = len(self.peers) * (len(self.peers) - 1)
+        print(f"{len(self.peers)} peers, {sent / duration:.1f} task requests/s in bursts of {self.burst}")
+        print(f"datagrams delivered {stats['delivered']}, dropped {stats['dropped']} ({stats['dropped'] / max(total, 1):.1%}), "
+              f"truncated {stats['truncated']} ({stats['truncated'] / max(total, 1):.1%})")
+        print(f"task requests received {self.recorder.count('TASK_REQUEST')}/{sent}, "
+              f"location round trips {self.recorder.count('LOCATION round trip')}/{expected_locations}")
+        print(f"max queue of the coordinator {self.peers[0].max_queue}")
+        for type in ("TASK_REQUEST", "LOCATION round trip"):
+            percentiles = self.recorder.get_percentiles(type)
+            if percentiles is not None:
+                print(f"{type} latency ms: " + ", ".join(f"{name} {value:.2f}" for name, value in percentiles.items()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test of the communication with simulated peers")
+    parser.add_argument("--peers", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--task-rate", type=float, default=20, help="transport requests per second")
+    parser.add_argument("--burst", type=int, default=1, help="transport requests sent back to back")
+    parser.add_argument("--padding", type=int, default=0, help="additional bytes of every transport request")
+    parser.add_argument("--callback-delay", type=float, default=0, help="duration of every subscription callback in s")
+    parser.add_argument("--discover-interval", type=float, default=1, help="interval of DISCOVER_PEER in s")
+    parser.add_argument("--receive-buffer", type=int, default=256, help="datagrams queued per peer before drops")
+    parser.add_argument("--max-datagram", type=int, default=LoopbackCommunicationHandler.MAX_DATAGRAM,
+                        help="size of the receive buffer of a socket in bytes")
+    args = parser.parse_args()
+    LoadTest(args.peers, args.task_rate, args.burst, args.padding, args.callback_delay, args.discover_interval,
+             args.receive_buffer, args.max_datagram).run(args.duration)
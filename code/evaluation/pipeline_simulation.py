@@ -0,0 +1,68 @@
+import os
+import sys
+import threading
+import time
+code_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, code_path)
+
+from agent import Agent # type: ignore
+from loopback_network import LoopbackNetwork # type: ignore
+
+
+class PipelineSimulation:
+    """
+    Submits a number of transport orders at once to a cell of mock agents on a LoopbackNetwork and measures the time
+    until all transports are completed. With the task queues of the agents the throughput grows with the number of
+    queued orders until all agents are busy.
+    """
+    EDGES = [("A", "B"), ("B", "F"), ("F", "J"), ("J", "K"), ("K", "L"), ("L", "H"), ("H", "C"), ("C", "D"), ("E", "F"),
+             ("H", "I"), ("F", "G"), ("G", "H")]
+    POS = {"A": (0, 2), "B": (2, 2), "C": (6, 2), "D": (8, 2), "E": (0, 1), "F": (2, 1), "G": (4, 1), "K": (4, 0),
+           "H": (6, 1), "I": (8, 1), "J": (2, 0), "L": (6, 0)}
+    AGENTS = [("10.0.0.11", "E", True), ("10.0.0.12", "J", False), ("10.0.0.13", "I", False)]
+    ORDERS = [("A", "C"), ("B", "D"), ("A", "D"), ("B", "C")]
+
+    def __init__(self, move_duration=0.1):
+        self.durations = {"MOVE_DURATION": move_duration, "PICKUP_DURATION": move_duration,
+                          "DROPOFF_DURATION": move_duration, "TURN_DURATION": move_duration}
+
+    def measure(self, order_count, timeout=120):
+        network = LoopbackNetwork()
+        agents = [Agent(location, is_coordinator, self.POS, self.EDGES, True, 0, self.durations, True,
+                        comm_handler_factory=network.create_handler_factory(ip))
+                  for ip, location, is_coordinator in self.AGENTS]
+        time.sleep(0.5)
+        completed = set()
+        all_completed = threading.Event()
+
+        def handle_task_completed(type, message, ip):
+            completed.add(message["task_id"])
+            if len(completed) == order_count:
+                all_completed.set()
+
+        wms = network.create_handler_factory("10.0.0.1")(lambda ip: None)
+        wms.subscribe("TASK_COMPLETED", handle_task_completed)
+        wms.running = True
+        threading.Thread(target=wms.listen).start()
+        start = time.time()
+        for i in range(order_count):
+            start_node, end_node = self.ORDERS[i % len(self.ORDERS)]
+            wms.send(self.AGENTS[0][0], "TASK_REQUEST", {"start_node": start_node, "end_node": end_node})
+        all_completed.wait(timeout)
+        duration = time.time() - start
+        wms.stop()
+        for agent in agents:
+            agent.stop()
+        return len(completed), duration
+
+    def run(self, order_counts=(1, 2, 4, 8)):
+        results = []
+        for order_count in order_counts:
+            completed, duration = self.measure(order_count)
+            results.append((order_count, completed, duration))
+        for order_count, completed, duration in results:
+            print(f"{order_count} orders: {completed} completed in {duration:.1f}s, {completed / duration * 60:.1f} transports/min")
+
+
+if __name__ == "__main__":
+    PipelineSimulation().run()
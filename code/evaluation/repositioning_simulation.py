@@ -0,0 +1,106 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+code_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, code_path)
+
+from agent import Agent # type: ignore
+from loopback_network import LoopbackNetwork # type: ignore
+import event_log # type: ignore
+
+
+class RepositioningSimulation:
+    """
+    Sends the same sequence of transport requests to a cell of mock agents with and without the FleetPositioner and
+    reports the mean time from a request to the pickup. The pickups are concentrated on the left of the map and the
+    dropoffs on the right, so without repositioning the agents wait on the right for the next request. The pickup time
+    is taken from the event log, when the agent starts the TRANSPORT subtask.
+    """
+    EDGES = [("A", "B"), ("B", "F"), ("F", "J"), ("J", "K"), ("K", "L"), ("L", "H"), ("H", "C"), ("C", "D"), ("E", "F"),
+             ("H", "I"), ("F", "G"), ("G", "H")]
+    POS = {"A": (0, 2), "B": (2, 2), "C": (6, 2), "D": (8, 2), "E": (0, 1), "F": (2, 1), "G": (4, 1), "K": (4, 0),
+           "H": (6, 1), "I": (8, 1), "J": (2, 0), "L": (6, 0)}
+    AGENTS = [("10.0.0.11", "D", True), ("10.0.0.12", "I", False), ("10.0.0.13", "L", False)]
+    START_NODES = {"A": 0.6, "B": 0.4}
+    END_NODES = {"D": 0.5, "I": 0.5}
+
+    def __init__(self, requests=12, request_interval=2, move_duration=0.1, seed=1):
+        self.requests = requests
+        self.request_interval = request_interval
+        self.durations = {"MOVE_DURATION": move_duration, "PICKUP_DURATION": move_duration,
+                          "DROPOFF_DURATION": move_duration, "TURN_DURATION": move_duration}
+        self.seed = seed
+
+    def get_requests(self):
+        rng = random.Random(self.seed)
+        return [(rng.choices(list(self.START_NODES), list(self.START_NODES.values()))[0],
+                 rng.choices(list(self.END_NODES), list(self.END_NODES.values()))[0]) for _ in range(self.requests)]
+
+    def measure(self, name, repositioning):
+        """
+        Runs the requests and returns the time of every request by its task id
+        """
+        network = LoopbackNetwork()
+        options = {"enabled": repositioning, "interval": self.request_interval / 4, "window": 50, "min_requests": 3,
+                   "cancel_timeout": 0}
+        agents = [Agent(location, is_coordinator, self.POS, self.EDGES, True, 0, self.durations, True,
+                        comm_handler_factory=network.create_handler_factory(ip), repositioning=options)
+                  for ip, location, is_coordinator in self.AGENTS]
+        time.sleep(0.5)
+        completed = set()
+        all_completed = threading.Event()
+        request_times = {}
+
+        def handle_task_completed(type, message, ip):
+            if message["task_id"] in request_times:
+                completed.add(message["task_id"])
+            if len(completed) == self.requests:
+                all_completed.set()
+
+        wms = network.create_handler_factory("10.0.0.1")(lambda ip: None)
+        wms.subscribe("TASK_COMPLETED", handle_task_completed)
+        wms.running = True
+        threading.Thread(target=wms.listen).start()
+        for i, (start_node, end_node) in enumerate(self.get_requests()):
+            task_id = f"{name}-{i}"
+            request_times[task_id] = time.time()
+            wms.send(self.AGENTS[0][0], "TASK_REQUEST", {"start_node": start_node, "end_node": end_node, "task_id": task_id})
+            time.sleep(self.request_interval)
+        all_completed.wait(60)
+        wms.stop()
+        for agent in agents:
+            agent.stop()
+        return request_times
+
+    def run(self):
+        path = os.path.join(tempfile.mkdtemp(), "events.jsonl")
+        log = event_log.configure({"mode": "file", "path": path})
+        request_times = {}
+        for name, repositioning in (("before", False), ("after", True)):
+            request_times[name] = self.measure(name, repositioning)
+        log.close()
+        pickups = {}
+        with open(path) as f:
+            for line in f:
+                event = json.loads(line)
+                if event["event"] == "subtask_started" and event["task"] == "TRANSPORT":
+                    pickups.setdefault(event["task_id"], event["ts"])
+        for name, times in request_times.items():
+            waits = [pickups[task_id] - requested for task_id, requested in times.items() if task_id in pickups]
+            mean = sum(waits) / len(waits) if waits else float('nan')
+            print(f"{name:6s} repositioning: mean time from request to pickup {mean:.2f}s "
+                  f"({len(waits)} of {len(times)} transports picked up)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measures the time from request to pickup with and without repositioning")
+    parser.add_argument("--requests", type=int, default=12, help="number of transport requests")
+    parser.add_argument("--request-interval", type=float, default=2, help="seconds between the requests")
+    parser.add_argument("--move-duration", type=float, default=0.1, help="duration of a move between two nodes")
+    args = parser.parse_args()
+    RepositioningSimulation(args.requests, args.request_interval, args.move_duration).run()
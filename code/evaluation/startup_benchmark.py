@@ -0,0 +1,53 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+code_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+AGENT_SCRIPT = """
+import sys
+sys.path.insert(0, {code_path!r})
+from startup_profile import StartupProfile
+startup_profile = StartupProfile()
+from agent import Agent
+from loopback_network import LoopbackNetwork
+startup_profile.mark("imports")
+edges = [("A", "B"), ("B", "C")]
+pos = {{"A": (0, 0), "B": (1, 0), "C": (2, 0)}}
+durations = {{"MOVE_DURATION": 1, "PICKUP_DURATION": 1, "DROPOFF_DURATION": 1, "TURN_DURATION": 1}}
+agent = Agent("A", {role!r} == "coordinator", pos, edges, True, 0, durations, True,
+              comm_handler_factory=LoopbackNetwork().create_handler_factory("10.0.0.2"), role={role!r},
+              startup_profile=startup_profile)
+agent.stop()
+"""
+
+
+class StartupBenchmark:
+    """
+    Measures the cold start of agent processes of every role, from spawning the interpreter until the agent is
+    initialized. Every agent runs in a new process on a LoopbackNetwork, so no network and no robot is needed.
+    """
+    def __init__(self, runs=5):
+        self.runs = runs
+
+    def measure(self, role):
+        durations = []
+        report = ""
+        for _ in range(self.runs):
+            start = time.perf_counter()
+            output = subprocess.run([sys.executable, "-c", AGENT_SCRIPT.format(code_path=code_path, role=role)],
+                                    capture_output=True, text=True, check=True).stdout
+            durations.append(time.perf_counter() - start)
+            report = [line for line in output.splitlines() if "Startup took" in line][-1]
+        return statistics.median(durations), report
+
+    def run(self):
+        for role in ("coordinator", "simulator", "executor"):
+            duration, report = self.measure(role)
+            print(f"{role}: cold start {duration * 1000:.0f} ms (median of {self.runs})")
+            print(f"    {report.split(' ', 2)[2]}")
+
+
+if __name__ == "__main__":
+    StartupBenchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 5).run()
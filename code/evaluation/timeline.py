@@ -0,0 +1,103 @@
+import argparse
+import json
+import statistics
+from collections import defaultdict
+
+
+class Timeline:
+    """
+    Merges the event logs of all agents into a timeline per transport. The clocks of the agents are aligned with the
+    messages found in several logs: the offset of an agent is the median difference between receiving and sending the
+    same message, so the offsets include the network latency. Times are reported relative to the distribution of the
+    transport, which is the zero point of the planned times.
+    """
+    def __init__(self, paths):
+        self.events = []
+        for path in paths:
+            with open(path) as f:
+                self.events.extend(json.loads(line) for line in f if line.strip())
+        self.offsets = self.estimate_offsets()
+        for event in self.events:
+            event["aligned_ts"] = event["ts"] - self.offsets.get(event.get("agent"), 0)
+        self.events.sort(key=lambda event: event["aligned_ts"])
+
+    def estimate_offsets(self):
+        """
+        Estimates the clock offset of every agent relative to the agent that distributed the most transports
+        """
+        distributions = [event["agent"] for event in self.events if event["event"] == "task_distributed"]
+        if not distributions:
+            return {}
+        reference = max(set(distributions), key=distributions.count)
+        sent = {event["message_id"]: event for event in self.events if event["event"] == "message_sent"}
+        differences = defaultdict(list)
+        for event in self.events:
+            if event["event"] == "message_received" and event["message_id"] in sent:
+                sender = sent[event["message_id"]]["agent"]
+                differences[(sender, event["agent"])].append(event["ts"] - sent[event["message_id"]]["ts"])
+        offsets = {reference: 0}
+        changed = True
+        while changed:
+            changed = False
+            for (sender, receiver), values in differences.items():
+                if sender in offsets and receiver not in offsets:
+                    offsets[receiver] = offsets[sender] + statistics.median(values)
+                    changed = True
+                elif receiver in offsets and sender not in offsets:
+                    offsets[sender] = offsets[receiver] - statistics.median(values)
+                    changed = True
+        return offsets
+
+    def get_tasks(self):
+        """
+        Returns the planned and actual start and end of every subtask and the handoff gaps between the agents
+        """
+        tasks = {}
+        for event in self.events:
+            task_id = event.get("task_id")
+            if task_id is None:
+                continue
+            if event["event"] == "task_distributed":
+                tasks[task_id] = {"distributed": event["aligned_ts"], "planned_duration": event["planned_duration"],
+                                  "subtasks": {}}
+            elif task_id in tasks and event["event"] in ("subtask_started", "subtask_completed"):
+                task = tasks[task_id]
+                subtask = task["subtasks"].setdefault(event["subtask"], {"agent": event["agent"], "task": event["task"]})
+                key = "start" if event["event"] == "subtask_started" else "end"
+                subtask[f"planned_{key}"] = event["planned"]
+                subtask[f"actual_{key}"] = event["aligned_ts"] - task["distributed"]
+        for task in tasks.values():
+            subtasks = [task["subtasks"][index] for index in sorted(task["subtasks"])]
+            task["subtasks"] = subtasks
+            task["handoffs"] = []
+            for previous, following in zip(subtasks, subtasks[1:]):
+                if previous["agent"] == following["agent"] or "actual_end" not in previous or "actual_start" not in following:
+                    continue
+                task["handoffs"].append({"from": previous["agent"], "to": following["agent"],
+                                         "planned_gap": following["planned_start"] - previous["planned_end"],
+                                         "actual_gap": following["actual_start"] - previous["actual_end"]})
+            ends = [subtask["actual_end"] for subtask in subtasks if "actual_end" in subtask]
+            task["actual_duration"] = max(ends) if ends and len(ends) == len(subtasks) else None
+        return tasks
+
+    def report(self):
+        for task_id, task in self.get_tasks().items():
+            actual = "incomplete" if task["actual_duration"] is None else f"{task['actual_duration']:.2f}s"
+            print(f"task {task_id}: planned {task['planned_duration']:.2f}s, actual {actual}")
+            for subtask in task["subtasks"]:
+                line = f"  {subtask['task']:9s} {subtask['agent']:15s} planned {subtask['planned_start']:6.2f}"
+                if "actual_end" in subtask:
+                    deviation = subtask["actual_end"] - subtask["planned_end"]
+                    line = f"{line}-{subtask['planned_end']:6.2f} actual {subtask['actual_start']:6.2f}-{subtask['actual_end']:6.2f} deviation {deviation:+.2f}s"
+                else:
+                    line += f" actual {subtask['actual_start']:6.2f} running"
+                print(line)
+            for handoff in task["handoffs"]:
+                print(f"  handoff {handoff['from']} -> {handoff['to']}: planned gap {handoff['planned_gap']:+.2f}s, "
+                      f"actual gap {handoff['actual_gap']:+.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merges the event logs of the agents into a timeline per transport")
+    parser.add_argument("logs", nargs="+", help="event logs written with EVENT_LOG=file")
+    Timeline(parser.parse_args().logs).report()
@@ -0,0 +1,175 @@
+import argparse
+import json
+import math
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+code_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, code_path)
+
+from agent import Agent # type: ignore
+from environment_loader import EnvironmentLoader # type: ignore
+from loopback_network import LoopbackNetwork # type: ignore
+from trace_recorder import read_trace # type: ignore
+import event_log # type: ignore
+
+
+class TraceReplay:
+    """
+    Feeds the requests of a recorded trace into a coordinator with mock agents on a LoopbackNetwork, so changes of the
+    planner and the coordinator can be compared on the same real workload. The requests are sent with the recorded
+    gaps divided by the speed, with a speed of 0 as fast as possible. The durations of the mock agents are divided by
+    the same factor, so the agents are as busy as in the recording. For every request the replay reports the planning
+    latency from the request to the distribution, the queueing delay from the distribution until the first agent
+    starts, and the produced schedule. The delays and the schedules are reported in the time of the recording.
+    """
+    MAX_SPEED = 100
+    AGENT_NETWORK = "10.99.0."
+
+    def __init__(self, path, edges, pos, durations, locations, speed=1, types=("TASK_REQUEST",), edge_weights=None):
+        self.requests = [message for message in read_trace(path) if message["type"] in types]
+        self.edges = edges
+        self.pos = pos
+        self.locations = locations
+        self.speed = speed
+        self.scale = speed if speed > 0 else self.MAX_SPEED
+        self.durations = {key: value / self.scale for key, value in durations.items()}
+        self.edge_weights = edge_weights
+        self.schedules = {}
+        self.completed = {}
+        self.sent = {}
+
+    def handle_task_distribution(self, type, task_list, ip):
+        task_id = task_list[0].get("task_id")
+        if task_id in self.sent:
+            self.schedules[task_id] = task_list
+
+    def handle_task_completed(self, type, message, ip):
+        if message["task_id"] in self.sent:
+            self.completed[message["task_id"]] = time.time()
+            if len(self.completed) == len(self.sent):
+                self.all_completed.set()
+
+    def run(self, timeout=60):
+        """
+        Replays the requests and returns the report
+        """
+        path = os.path.join(tempfile.mkdtemp(), "events.jsonl")
+        log = event_log.configure({"mode": "file", "path": path})
+        network = LoopbackNetwork()
+        agents = [Agent(location, i == 0, self.pos, self.edges, True, 0, self.durations, True,
+                        edge_weights=self.edge_weights,
+                        comm_handler_factory=network.create_handler_factory(f"{self.AGENT_NETWORK}{11 + i}"))
+                  for i, location in enumerate(self.locations)]
+        coordinator = agents[0].comm_handler.ip
+        time.sleep(0.5)
+        self.all_completed = threading.Event()
+        senders = {}
+        start = time.time()
+        first = self.requests[0]["ts"] if self.requests else 0
+        for i, request in enumerate(self.requests):
+            if self.speed > 0:
+                time.sleep(max(0.0, start + (request["ts"] - first) / self.speed - time.time()))
+            if request["ip"] not in senders:
+                sender = network.create_handler_factory(request["ip"])(lambda ip: None)
+                sender.subscribe("TASK_DISTRIBUTION", self.handle_task_distribution)
+                sender.subscribe("TASK_COMPLETED", self.handle_task_completed)
+                sender.running = True
+                threading.Thread(target=sender.listen).start()
+                senders[request["ip"]] = sender
+            message = dict(request["message"])
+            message.setdefault("task_id", f"replay-{i}")
+            self.sent[message["task_id"]] = (time.time(), message)
+            senders[request["ip"]].send(coordinator, request["type"], message)
+        self.all_completed.wait(timeout)
+        for sender in senders.values():
+            sender.stop()
+        for agent in agents:
+            agent.stop()
+        log.close()
+        return self.get_report(path)
+
+    def get_report(self, path):
+        """
+        Combines the send times, the event log of the agents and the received schedules into the report
+        """
+        distributed = {}
+        started = {}
+        with open(path) as f:
+            for line in f:
+                event = json.loads(line)
+                task_id = event.get("task_id")
+                if event["event"] == "task_distributed":
+                    distributed.setdefault(task_id, event["ts"])
+                elif event["event"] == "subtask_started":
+                    started[task_id] = min(started.get(task_id, event["ts"]), event["ts"])
+        requests = []
+        for task_id, (sent, message) in self.sent.items():
+            request = {"task_id": task_id, "start_node": message.get("start_node"), "end_node": message.get("end_node"),
+                       "planning_latency": None, "queueing_delay": None, "completed": task_id in self.completed,
+                       "schedule": []}
+            if task_id in distributed:
+                request["planning_latency"] = distributed[task_id] - sent
+            if task_id in distributed and task_id in started:
+                request["queueing_delay"] = (started[task_id] - distributed[task_id]) * self.scale
+            for subtask in self.schedules.get(task_id, []):
+                request["schedule"].append({"agent": subtask["name"], "task": subtask["task"], "path": subtask["path"],
+                                            "start_time": subtask["start_time"] * self.scale,
+                                            "end_time": subtask["end_time"] * self.scale})
+            requests.append(request)
+        latencies = [request["planning_latency"] for request in requests if request["planning_latency"] is not None]
+        delays = [request["queueing_delay"] for request in requests if request["queueing_delay"] is not None]
+        durations = [request["schedule"][-1]["end_time"] for request in requests if request["schedule"]]
+        summary = {"requests": len(requests), "planned": len(latencies),
+                   "completed": sum(request["completed"] for request in requests), "speed": self.speed}
+        if latencies:
+            summary["planning_latency_mean"] = statistics.mean(latencies)
+            summary["planning_latency_p95"] = sorted(latencies)[math.ceil(0.95 * len(latencies)) - 1]
+        if delays:
+            summary["queueing_delay_mean"] = statistics.mean(delays)
+        if durations:
+            summary["planned_duration_mean"] = statistics.mean(durations)
+        return {"summary": summary, "requests": requests}
+
+
+def print_report(report):
+    for request in report["requests"]:
+        latency = request["planning_latency"]
+        delay = request["queueing_delay"]
+        line = f"{request['task_id']:20s} {request['start_node']}->{request['end_node']}"
+        line += " not planned" if latency is None else f" planning {latency * 1000:6.1f}ms"
+        line += "" if delay is None else f" queued {delay:6.2f}s"
+        print(line)
+        for subtask in request["schedule"]:
+            print(f"    {subtask['agent']:12s} {subtask['task']:9s} {'-'.join(subtask['path']):20s} "
+                  f"{subtask['start_time']:7.2f}-{subtask['end_time']:7.2f}s")
+    summary = report["summary"]
+    print(f"{summary['planned']} of {summary['requests']} requests planned, {summary['completed']} completed")
+    if "planning_latency_mean" in summary:
+        print(f"planning latency mean {summary['planning_latency_mean'] * 1000:.1f}ms, "
+              f"p95 {summary['planning_latency_p95'] * 1000:.1f}ms")
+    if "queueing_delay_mean" in summary:
+        print(f"queueing delay mean {summary['queueing_delay_mean']:.2f}s, "
+              f"planned duration mean {summary['planned_duration_mean']:.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replays the requests of a recorded trace into a coordinator with mock agents")
+    parser.add_argument("trace", help="trace recorded with TRACE=file")
+    parser.add_argument("--speed", type=float, default=1, help="replay speed, 0 replays as fast as possible")
+    parser.add_argument("--agents", default="D,I,L", help="comma separated start nodes of the mock agents, the first one coordinates")
+    parser.add_argument("--types", default="TASK_REQUEST", help="comma separated message types to replay")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds to wait for the transports after the last request")
+    parser.add_argument("--output", help="writes the report as JSON to compare runs")
+    args = parser.parse_args()
+    envl = EnvironmentLoader()
+    replay = TraceReplay(args.trace, envl.getEdges(), envl.getPos(), envl.getDurations(), args.agents.split(","),
+                         args.speed, args.types.split(","), envl.getEdgeWeights())
+    report = replay.run(args.timeout)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
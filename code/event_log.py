@@ -0,0 +1,125 @@
+import collections
+import json
+import threading
+import time
+
+
+class NullEventLog:
+    """
+    The NullEventLog has the same interface as EventLog but does nothing, so a disabled event log costs a single call
+    """
+    enabled = False
+
+    def record(self, event, **fields):
+        """
+        Does nothing
+        """
+        pass
+
+    def close(self):
+        """
+        Does nothing
+        """
+        pass
+
+
+class EventLog:
+    """
+    The EventLog writes structured events as JSON lines, so the logs of all agents can be merged into a timeline of
+    every transport. Events are only appended to a queue on the calling thread and written in batches by a background
+    thread. Every event carries the wall clock time and the fields passed by the caller, like the agent, the task id,
+    the subtask, the node, the planned time and the message id.
+    """
+    FLUSH_INTERVAL = 1
+
+    def __init__(self, path, max_pending=10000):
+        """
+        When the writer falls behind, events beyond max_pending are dropped and counted
+        """
+        self.path = path
+        self.max_pending = max_pending
+        self.pending = collections.deque()
+        self.condition = threading.Condition()
+        self.dropped_events = 0
+        self.running = True
+        self.file = self.open_file(path)
+        self.writer_thread = threading.Thread(target=self.write_events, daemon=True)
+        self.writer_thread.start()
+
+    def open_file(self, path):
+        """
+        Opens the log for appending
+        """
+        return open(path, "a")
+
+    def serialize(self, fields):
+        """
+        Returns the event as a JSON line
+        """
+        return json.dumps(fields)
+
+    def record(self, event, **fields):
+        """
+        Queues an event with the current wall clock time and the given fields
+        """
+        fields["ts"] = time.time()
+        fields["event"] = event
+        self.enqueue(fields)
+
+    def enqueue(self, fields):
+        """
+        Queues the fields for the writer thread, they are dropped and counted when max_pending are queued
+        """
+        with self.condition:
+            if len(self.pending) >= self.max_pending:
+                self.dropped_events += 1
+                return
+            self.pending.append(fields)
+            self.condition.notify()
+
+    def write_events(self):
+        """
+        Writes the queued events in batches and flushes the file at most once per flush interval
+        """
+        while True:
+            with self.condition:
+                if self.running and not self.pending:
+                    self.condition.wait(self.FLUSH_INTERVAL)
+                events, self.pending = self.pending, collections.deque()
+                running = self.running
+            for event in events:
+                self.file.write(self.serialize(event) + "\n")
+            self.file.flush()
+            if not running and not events:
+                break
+        self.file.close()
+
+    def close(self):
+        """
+        Writes the queued events and stops the writer thread
+        """
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.writer_thread.join()
+
+
+event_log = NullEventLog()
+
+
+def get_event_log():
+    """
+    Returns the event log of the process. Modules fetch it once on initialization.
+    """
+    return event_log
+
+
+def configure(options):
+    """
+    Enables the event log based on the options loaded by the EnvironmentLoader
+    """
+    global event_log
+    if (options or {}).get("mode", "off") == "off":
+        return event_log
+    event_log = EventLog(options.get("path", "events.jsonl"))
+    return event_log
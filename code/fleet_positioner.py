@@ -0,0 +1,259 @@
+import collections
+import itertools
+import threading
+import networkx as nx
+from metrics import get_metrics
+
+
+class FleetPositioner:
+    """
+    The FleetPositioner moves idle agents to parking nodes close to the expected pickups, so the next transport does
+    not have to pull an agent across the map. It learns the distribution of the start nodes of the recent transport
+    requests and places the idle agents on the nodes that minimize the mean driving time to these start nodes (a k-median
+    over the durations of the PathPlanner), taking the planned locations of the busy agents into account. The moves are
+    distributed as low priority transports with a single MOVE subtask. When a request arrives while agents are being
+    repositioned, the moves are cancelled and the request is planned once the agents reported where they stopped.
+    """
+    CANCEL_MARGIN = 2
+
+    def __init__(self, agent, interval=5, window=50, min_requests=5, cancel_timeout=0):
+        """
+        Every interval seconds the coordinator repositions the idle agents once min_requests of the last window
+        requests are known. Deferred requests are planned at the latest cancel_timeout seconds after the moves were
+        cancelled, without a cancel_timeout the timeout is derived from the edge durations.
+        """
+        self.agent = agent
+        self.interval = interval
+        self.min_requests = min_requests
+        self.cancel_timeout = cancel_timeout
+        self.cancel_timer = None
+        self.cancelled_repositions = set()
+        self.start_nodes = collections.deque(maxlen=window)
+        self.end_nodes = collections.deque(maxlen=window)
+        self.repositions = {}
+        self.deferred_requests = []
+        self.move_counter = 0
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.metrics = get_metrics()
+
+    def start(self):
+        """
+        Starts the thread repositioning the idle agents every interval
+        """
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def stop(self):
+        """
+        Stops the repositioning thread
+        """
+        self.stopped.set()
+
+    def run(self):
+        """
+        Repositions the idle agents every interval while the agent is coordinator
+        """
+        while not self.stopped.wait(self.interval):
+            if self.agent.is_coordinator:
+                try:
+                    self.reposition()
+                except Exception as e:
+                    self.agent.log(f"Could not reposition the idle agents: {e}")
+
+    def record_request(self, task):
+        """
+        Learns the start and end node of a transport request. All agents of the cell record the requests, so a new
+        coordinator knows the distribution as well.
+        """
+        with self.lock:
+            self.start_nodes.append(task["start_node"])
+            self.end_nodes.append(task["end_node"])
+
+    def is_reposition(self, task_id):
+        """
+        Returns whether the task id belongs to a move of the FleetPositioner
+        """
+        return isinstance(task_id, str) and task_id.startswith("reposition-")
+
+    def get_cancel_timeout(self):
+        """
+        Returns how long the deferred requests wait for the confirmations of the cancelled moves. A running move ends on
+        the next node, so an agent may have to turn and drive the longest edge before it confirms.
+        """
+        if self.cancel_timeout:
+            return self.cancel_timeout
+        planner = self.agent.path_planner
+        longest_edge = max((planner.get_edge_duration(u, v) for u, v in planner.G.edges), default=0)
+        return longest_edge + 2 * planner.TURN_DURATION + self.CANCEL_MARGIN
+
+    def get_durations(self):
+        """
+        Returns the driving durations between all pairs of nodes
+        """
+        planner = self.agent.path_planner
+        return dict(nx.all_pairs_dijkstra_path_length(planner.G, weight=lambda u, v, d: planner.get_edge_duration(u, v)))
+
+    def get_cost(self, durations, parking_nodes, start_nodes):
+        """
+        Returns the mean driving duration from the closest parking node to the start nodes
+        """
+        if not parking_nodes:
+            return float('inf')
+        return sum(min(durations[node].get(start_node, float('inf')) for node in parking_nodes)
+                   for start_node in start_nodes) / len(start_nodes)
+
+    def get_parking_nodes(self, count, occupied, start_nodes, durations):
+        """
+        Selects count parking nodes in addition to the occupied nodes of the busy agents by a greedy k-median, which is
+        improved by swapping parking nodes with other candidates. Agents are not parked on the start and end nodes of
+        the requests, as the planner does not pick up with an agent already standing on the start node and parked
+        agents would block the dropoffs.
+        """
+        with self.lock:
+            blocked = set(self.start_nodes) | set(self.end_nodes)
+        candidates = [node for node in durations if node not in blocked and node not in occupied]
+        if len(candidates) < count:
+            candidates = [node for node in durations if node not in occupied]
+        parking_nodes = []
+        for _ in range(min(count, len(candidates))):
+            best = min((node for node in candidates if node not in parking_nodes),
+                       key=lambda node: self.get_cost(durations, list(occupied) + parking_nodes + [node], start_nodes))
+            parking_nodes.append(best)
+        improved = True
+        while improved:
+            improved = False
+            cost = self.get_cost(durations, list(occupied) + parking_nodes, start_nodes)
+            for i, candidate in itertools.product(range(len(parking_nodes)), candidates):
+                if candidate in parking_nodes:
+                    continue
+                swapped = parking_nodes[:i] + [candidate] + parking_nodes[i+1:]
+                if self.get_cost(durations, list(occupied) + swapped, start_nodes) < cost - 1e-9:
+                    parking_nodes = swapped
+                    improved = True
+                    break
+        return parking_nodes
+
+    def assign(self, idle_locations, parking_nodes, durations):
+        """
+        Assigns the parking nodes to the idle agents with the lowest total driving duration. Small fleets are assigned
+        exactly, larger ones greedily. When there are fewer parking nodes than idle agents, the remaining agents stay.
+        """
+        def get_duration(agent, node):
+            return durations[idle_locations[agent]["node"]].get(node, float('inf'))
+
+        agents = list(idle_locations)
+        if len(agents) <= 6:
+            best = min(itertools.permutations(agents, len(parking_nodes)),
+                       key=lambda assigned: sum(get_duration(agent, node) for agent, node in zip(assigned, parking_nodes)))
+            return dict(zip(best, parking_nodes))
+        assignment = {}
+        for node in parking_nodes:
+            agent = min((agent for agent in agents if agent not in assignment), key=lambda agent: get_duration(agent, node))
+            assignment[agent] = node
+        return assignment
+
+    def get_idle_locations(self):
+        """
+        Returns the planned locations of the agents without transports in flight and of the busy agents
+        """
+        agent = self.agent
+        with agent.lock:
+            locations = dict(agent.all_locations)
+            locations.update((ip, location) for ip, location in agent.planned_locations.items() if ip in locations)
+            busy = {subtask["name"] for schedule in agent.active_schedules.values() for subtask in schedule}
+        idle = {ip: location for ip, location in locations.items() if ip not in busy}
+        occupied = {location["node"] for ip, location in locations.items() if ip in busy}
+        return idle, occupied
+
+    def reposition(self):
+        """
+        Moves the idle agents to their parking nodes. Agents which are already parked are not moved.
+        """
+        with self.lock:
+            start_nodes = list(self.start_nodes)
+            if len(start_nodes) < self.min_requests or self.repositions or self.deferred_requests:
+                return
+        idle, occupied = self.get_idle_locations()
+        if not idle:
+            return
+        durations = self.get_durations()
+        parking_nodes = self.get_parking_nodes(len(idle), occupied, start_nodes, durations)
+        before = self.get_cost(durations, list(occupied) + [location["node"] for location in idle.values()], start_nodes)
+        after = self.get_cost(durations, list(occupied) + parking_nodes, start_nodes)
+        if after >= before:
+            return
+        for ip, node in self.assign(idle, parking_nodes, durations).items():
+            if node == idle[ip]["node"]:
+                continue
+            move = self.agent.path_planner.plan_move(ip, idle[ip], node)
+            if not move:
+                continue
+            with self.lock:
+                self.move_counter += 1
+                task_id = f"reposition-{self.agent.comm_handler.ip}-{self.move_counter}"
+                self.repositions[task_id] = ip
+            self.agent.log(f"Repositioning {ip} from {idle[ip]['node']} to {node}")
+            self.metrics.increment("positioner.moves")
+            self.agent.distribute_task(move, task_id)
+        self.metrics.observe("positioner.expected_pickup_duration", after)
+
+    def defer_request(self, task, task_id):
+        """
+        Cancels the moves in flight before a request is planned. Returns False when no move has to be cancelled, then
+        the request is planned right away, otherwise the request is planned once all agents confirmed the cancellation
+        or after the cancel timeout.
+        """
+        with self.lock:
+            if not self.repositions:
+                return False
+            self.deferred_requests.append((task, task_id))
+            cancel = len(self.deferred_requests) == 1
+            repositions = dict(self.repositions)
+            if cancel:
+                self.cancelled_repositions = set(repositions)
+                self.cancel_timer = threading.Timer(self.get_cancel_timeout(), self.handle_cancel_timeout,
+                                                    (self.cancelled_repositions,))
+                self.cancel_timer.daemon = True
+        if cancel:
+            self.agent.log(f"Cancelling {len(repositions)} repositioning moves for request {task_id}")
+            for reposition_id, agent_ip in repositions.items():
+                self.agent.comm_handler.send(agent_ip, "CANCEL_TASK", {"task_id": reposition_id})
+            self.metrics.increment("positioner.cancellations", len(repositions))
+            self.cancel_timer.start()
+        return True
+
+    def finish_reposition(self, task_id):
+        """
+        Removes a completed or cancelled move and plans the deferred requests once no move is in flight anymore
+        """
+        with self.lock:
+            if self.repositions.pop(task_id, None) is None or self.repositions:
+                return
+            if self.cancel_timer is not None:
+                self.cancel_timer.cancel()
+        self.plan_deferred_requests()
+
+    def handle_cancel_timeout(self, cancelled_repositions):
+        """
+        Gives up on the cancelled moves which are still not confirmed and plans the deferred requests
+        """
+        with self.lock:
+            if cancelled_repositions is not self.cancelled_repositions:
+                return
+            missing = cancelled_repositions & set(self.repositions)
+            for task_id in missing:
+                del self.repositions[task_id]
+        if missing:
+            self.agent.log(f"No confirmation for the cancelled moves {sorted(missing)}")
+        self.plan_deferred_requests()
+
+    def plan_deferred_requests(self):
+        """
+        Plans the requests deferred while the moves were cancelled
+        """
+        with self.lock:
+            requests, self.deferred_requests = self.deferred_requests, []
+            self.cancel_timer = None
+            self.cancelled_repositions = set()
+        for task, task_id in requests:
+            self.agent.plan_request(task, task_id)
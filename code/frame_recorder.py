@@ -0,0 +1,152 @@
+import collections
+import os
+import threading
+import time
+import cv2
+
+
+class RecordingMode:
+    """
+    The recorder either records nothing, every nth frame, only frames with a detected marker or a rolling window of
+    frames that is only written when an incident is triggered.
+    """
+    OFF = "off"
+    EVERY_NTH = "every_nth"
+    MARKER = "marker"
+    INCIDENT = "incident"
+
+
+class FrameRecorder:
+    """
+    The FrameRecorder keeps the JPEG encoding and disk writes off the control loop. Frames are put into a bounded
+    in-memory ring buffer which is drained by a background writer thread. When the writer falls behind, the oldest
+    frames are dropped and counted.
+    """
+
+    def __init__(self, mode, directory="images", every_nth=10, buffer_size=64, pre_incident_frames=60, video=False, fps=15):
+        """
+        Initializes the ring buffer and starts the writer thread. With video enabled the frames are written into a
+        single video container instead of separate images.
+        """
+        self.mode = mode
+        self.directory = directory
+        self.every_nth = max(1, every_nth)
+        self.buffer_size = max(1, buffer_size)
+        self.video = video
+        self.fps = fps
+        self.pending = collections.deque()
+        self.history = collections.deque(maxlen=max(1, pre_incident_frames))
+        self.condition = threading.Condition()
+        self.dropped_frames = 0
+        self.written_frames = 0
+        self.incident_count = 0
+        self.frame_number = 0
+        self.video_writer = None
+        self.running = True
+        os.makedirs(self.directory, exist_ok=True)
+        self.writer_thread = threading.Thread(target=self.write_frames, daemon=True)
+        self.writer_thread.start()
+
+    @classmethod
+    def from_options(cls, options):
+        """
+        Creates a recorder from the recording options loaded by the EnvironmentLoader. Returns None when recording is
+        turned off so the control loop does not have to do any work.
+        """
+        if options is None or options.get("mode", RecordingMode.OFF) == RecordingMode.OFF:
+            return None
+        return cls(options["mode"],
+                   directory=options.get("directory", "images"),
+                   every_nth=options.get("every_nth", 10),
+                   buffer_size=options.get("buffer_size", 64),
+                   pre_incident_frames=options.get("pre_incident_frames", 60),
+                   video=options.get("video", False),
+                   fps=options.get("fps", 15))
+
+    def record(self, img, target, counter, marker_detected=False):
+        """
+        Offers a frame of the control loop to the recorder. Depending on the mode the frame is sampled, kept in the
+        rolling incident window or ignored.
+        """
+        if self.mode == RecordingMode.EVERY_NTH:
+            if counter % self.every_nth == 0:
+                self.enqueue((img, target, counter))
+        elif self.mode == RecordingMode.MARKER:
+            if marker_detected:
+                self.enqueue((img, target, counter))
+        elif self.mode == RecordingMode.INCIDENT:
+            self.history.append((img, target, counter))
+
+    def trigger_incident(self):
+        """
+        Hands the rolling window of frames before an incident to the writer.
+        """
+        if self.mode != RecordingMode.INCIDENT:
+            return
+        self.incident_count += 1
+        frames = list(self.history)
+        self.history.clear()
+        for frame in frames:
+            self.enqueue(frame)
+
+    def enqueue(self, frame):
+        """
+        Adds a frame to the ring buffer and drops the oldest frame when the buffer is full. Every frame gets a number
+        that runs through the whole recording, as the frame counter of the control loop restarts for every target.
+        """
+        with self.condition:
+            if len(self.pending) >= self.buffer_size:
+                self.pending.popleft()
+                self.dropped_frames += 1
+            self.frame_number += 1
+            self.pending.append((self.frame_number,) + frame)
+            self.condition.notify()
+
+    def write_frames(self):
+        """
+        Drains the ring buffer in the background and encodes the frames either as images or into a video.
+        """
+        while True:
+            with self.condition:
+                while self.running and not self.pending:
+                    self.condition.wait()
+                if not self.pending:
+                    break
+                number, img, target, counter = self.pending.popleft()
+            if self.video:
+                self.write_video_frame(img)
+            else:
+                cv2.imwrite(os.path.join(self.directory, f"image_{number:06d}_{target}_{counter}.jpg"), img)
+            with self.condition:
+                self.written_frames += 1
+        if self.video_writer is not None:
+            self.video_writer.release()
+            self.video_writer = None
+
+    def write_video_frame(self, img):
+        """
+        Writes a frame into the video container, which is opened with the size of the first frame. Every run writes its
+        own video named by its start time.
+        """
+        if self.video_writer is None:
+            height, width = img.shape[:2]
+            path = os.path.join(self.directory, f"recording_{time.strftime('%Y%m%d_%H%M%S')}.avi")
+            self.video_writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), self.fps, (width, height))
+        self.video_writer.write(img)
+
+    def get_stats(self):
+        """
+        Returns the number of written, dropped and still pending frames
+        """
+        with self.condition:
+            return {"written": self.written_frames, "dropped": self.dropped_frames, "pending": len(self.pending),
+                    "incidents": self.incident_count}
+
+    def close(self):
+        """
+        Writes the remaining frames and stops the writer thread
+        """
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.writer_thread.join()
@@ -0,0 +1,163 @@
+import threading
+import time
+from metrics import get_metrics
+
+
+class LeaderElection:
+    """
+    The LeaderElection decides which agent of a cell acts as coordinator. The leader holds a lease that it renews with
+    heartbeats. When the lease of the leader expires, the agents elect a new leader with the bully algorithm: the
+    agent with the highest priority (the ip breaks ties) wins. A new leader is therefore known at the latest after the
+    lease duration and the election timeout.
+    """
+    ELECTION_TIMEOUT = 1
+
+    def __init__(self, comm_handler, priority, leader_change_callback, lease_duration=3, heartbeat_interval=1, is_leader=False):
+        """
+        Subscribes to the election messages. An agent configured as coordinator starts as leader, all others wait
+        for a heartbeat for one lease duration before they start an election.
+        """
+        self.comm_handler = comm_handler
+        self.priority = priority
+        self.leader_change_callback = leader_change_callback
+        self.lease_duration = lease_duration
+        self.heartbeat_interval = heartbeat_interval
+        self.leader = None
+        self.lease_expiry = time.time() + lease_duration
+        self.electing = False
+        self.answered = False
+        self.election_deadline = 0
+        self.running = False
+        self.lock = threading.Lock()
+        self.metrics = get_metrics()
+        comm_handler.subscribe("COORDINATOR_HEARTBEAT", self.handle_heartbeat)
+        comm_handler.subscribe("ELECTION", self.handle_election)
+        comm_handler.subscribe("ELECTION_ANSWER", self.handle_election_answer)
+        comm_handler.subscribe("VICTORY", self.handle_heartbeat)
+        if is_leader:
+            self.become_leader()
+
+    def start(self):
+        """
+        Starts the thread sending the heartbeats and watching the lease
+        """
+        self.running = True
+        threading.Thread(target=self.run).start()
+
+    def stop(self):
+        """
+        Stops the thread after its current iteration
+        """
+        self.running = False
+
+    def is_leader(self):
+        """
+        Returns whether this agent is the current leader
+        """
+        return self.leader == self.comm_handler.ip
+
+    def get_rank(self, priority, ip):
+        """
+        Returns the rank of an agent, the priority first and the ip to break ties
+        """
+        return (priority, tuple(int(part) for part in ip.split('.')))
+
+    def outranks(self, priority, ip):
+        """
+        Returns whether this agent has a higher rank than the given agent
+        """
+        return self.get_rank(self.priority, self.comm_handler.ip) > self.get_rank(priority, ip)
+
+    def run(self):
+        """
+        Sends the heartbeats as leader, starts an election when the lease of the leader expired and decides the
+        election when nobody with a higher rank answered in time
+        """
+        while self.running:
+            if self.is_leader():
+                self.comm_handler.send_multicast("COORDINATOR_HEARTBEAT", {"priority": self.priority})
+            else:
+                with self.lock:
+                    now = time.time()
+                    start_election = not self.electing and now > self.lease_expiry
+                    decide_election = self.electing and now > self.election_deadline
+                if start_election:
+                    self.start_election()
+                elif decide_election:
+                    self.decide_election()
+            time.sleep(self.heartbeat_interval / 2)
+
+    def start_election(self):
+        """
+        Asks all agents with a higher rank to answer within the ELECTION_TIMEOUT
+        """
+        with self.lock:
+            if self.electing:
+                return
+            self.electing = True
+            self.answered = False
+            self.election_deadline = time.time() + self.ELECTION_TIMEOUT
+        self.metrics.increment("election.started")
+        self.comm_handler.send_multicast("ELECTION", {"priority": self.priority})
+
+    def decide_election(self):
+        """
+        Becomes leader when no agent with a higher rank answered, otherwise waits another lease for its victory
+        """
+        with self.lock:
+            self.electing = False
+            answered = self.answered
+            if answered:
+                self.lease_expiry = time.time() + self.lease_duration
+        if not answered:
+            self.become_leader()
+
+    def become_leader(self):
+        """
+        Announces the victory and takes over as coordinator. The time since the lease expired is measured as takeover
+        duration.
+        """
+        with self.lock:
+            lease_expiry = self.lease_expiry
+            self.leader = self.comm_handler.ip
+        self.metrics.increment("election.victories")
+        if time.time() > lease_expiry:
+            self.metrics.observe("election.takeover_duration", time.time() - lease_expiry)
+        self.comm_handler.send_multicast("VICTORY", {"priority": self.priority})
+        self.leader_change_callback(self.leader, True)
+
+    def handle_election(self, type, message, ip):
+        """
+        Answers an election of an agent with a lower rank and starts an own election, unless already leader
+        """
+        if ip == self.comm_handler.ip or not self.outranks(message["priority"], ip):
+            return
+        self.comm_handler.send(ip, "ELECTION_ANSWER", {"priority": self.priority})
+        if self.is_leader():
+            self.comm_handler.send_multicast("VICTORY", {"priority": self.priority})
+        else:
+            self.start_election()
+
+    def handle_election_answer(self, type, message, ip):
+        """
+        Notes that an agent with a higher rank takes over the election
+        """
+        with self.lock:
+            self.answered = True
+
+    def handle_heartbeat(self, type, message, ip):
+        """
+        Renews the lease of the leader. When two agents claim to be leader, the one with the lower rank steps down.
+        """
+        if ip == self.comm_handler.ip:
+            return
+        if self.is_leader() and self.outranks(message["priority"], ip):
+            return
+        with self.lock:
+            changed = self.leader != ip
+            self.leader = ip
+            self.electing = False
+            self.lease_expiry = time.time() + self.lease_duration
+        if changed:
+            self.metrics.increment("election.leader_changes")
+            self.leader_change_callback(ip, False)
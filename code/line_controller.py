@@ -0,0 +1,131 @@
+import math
+import time
+import numpy as np
+
+
+def get_line_geometry(bands, width, height):
+    """
+    Estimates the lateral error, the heading and the curvature of the line from the centroids of the horizontal bands of
+    the LineDetector. The columns are normalized by half the image width and the rows by the image height, so an
+    error of 1 means the line is at the border of the image. The error is taken at the nearest band, the heading is the
+    slope of a straight line through the bands, which is less sensitive to the noise of the centroids than the slope of
+    the parabola, whose second derivative is the curvature. Positive values mean the line is right of the robot or
+    bends to the right further ahead.
+    """
+    points = [(row / height, (x - width / 2) / (width / 2)) for row, x in bands if x is not None]
+    if not points:
+        return None
+    rows = np.array([row for row, _ in points])
+    columns = np.array([column for _, column in points])
+    nearest = rows.argmax()
+    if len(points) == 1:
+        return columns[nearest], 0.0, 0.0
+    slope = np.polyfit(rows, columns, 1)[0]
+    curvature = 2 * np.polyfit(rows, columns, 2)[0] if len(points) >= 3 else 0.0
+    return float(columns[nearest]), float(-slope), float(curvature)
+
+
+class LineController:
+    """
+    The LineController steers the robot along the line with a PID controller on the lateral error at a look-ahead
+    point, which is extrapolated from the error and the heading of the line. The derivative is low pass filtered, as
+    the centroid of the line jumps by a few pixels between frames. The speed follows a profile: on straight and stable
+    segments the robot accelerates up to the maximum speed, in curves and with large errors it slows down, and before a
+    node where it has to stop it brakes, so it reaches the marker with the marker speed. The braking starts from the
+    remaining distance to the node when it is known, otherwise as soon as the marker of the node is seen ahead. The
+    speed profile uses the filtered geometry of the line, so the noise of single frames does not slow the robot down.
+    """
+    MAX_DT = 0.2
+
+    def __init__(self, kp=10, ki=0, kd=1, derivative_filter=0.7, integral_limit=1, lookahead=0.5, min_speed=0.15,
+                 max_speed=0.4, marker_speed=0.2, acceleration=0.3, deceleration=0.5, curve_slowdown=2,
+                 curvature_weight=0.1, geometry_filter=0.8):
+        """
+        The gains are in degrees per second for a normalized error of 1. The derivative_filter is the weight of the
+        previous derivative in the exponential filter and lookahead the distance of the look-ahead point in image
+        heights. The speeds are in m/s and the acceleration and deceleration in m/s². The speed drops from the maximum to
+        the minimum speed when the sum of the error, the heading and the weighted curvature reaches 1 / curve_slowdown.
+        """
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.derivative_filter = derivative_filter
+        self.integral_limit = integral_limit
+        self.lookahead = lookahead
+        self.min_speed = min_speed
+        self.max_speed = max_speed
+        self.marker_speed = marker_speed
+        self.acceleration = acceleration
+        self.deceleration = deceleration
+        self.curve_slowdown = curve_slowdown
+        self.curvature_weight = curvature_weight
+        self.geometry_filter = geometry_filter
+        self.reset()
+
+    @classmethod
+    def from_options(cls, options):
+        """
+        Creates the LineController with the gains loaded by the EnvironmentLoader
+        """
+        return cls(**(options or {}))
+
+    def reset(self):
+        """
+        Resets the controller when the robot starts driving from standstill, e.g. after a manoeuvre on a marker. The
+        distance is measured from the last reset.
+        """
+        self.speed = self.min_speed
+        self.integral = 0
+        self.derivative = 0
+        self.previous_error = None
+        self.previous_time = None
+        self.geometry = None
+        self.distance = 0
+
+    def get_target_speed(self, remaining, dt, marker_ahead=False):
+        """
+        Returns the speed for the filtered geometry of the line. The remaining distance to the next stop limits the
+        speed to the braking curve towards the marker speed. The distance driven until the next frame is subtracted, as
+        the speed only changes with the next drive command. Once the marker of the next stop is ahead, the speed is
+        limited to the marker speed.
+        """
+        error, heading, curvature = self.geometry
+        deviation = abs(error) + abs(heading) + self.curvature_weight * abs(curvature)
+        straightness = max(0.0, 1 - self.curve_slowdown * deviation)
+        target = self.min_speed + (self.max_speed - self.min_speed) * straightness
+        if remaining is not None:
+            remaining -= self.speed * dt
+            braking_speed = math.sqrt(self.marker_speed ** 2 + 2 * self.deceleration * max(0.0, remaining))
+            target = min(target, max(self.marker_speed, braking_speed))
+        if marker_ahead:
+            target = min(target, self.marker_speed)
+        return target
+
+    def update(self, error, heading=0.0, curvature=0.0, remaining=None, now=None, marker_ahead=False):
+        """
+        Returns the speed and the turn angle for the next drive command. The remaining distance to the next node where
+        the robot stops is optional, marker_ahead tells whether the marker of that node is in view.
+        """
+        now = time.perf_counter() if now is None else now
+        dt = 0 if self.previous_time is None else min(now - self.previous_time, self.MAX_DT)
+        self.previous_time = now
+        lookahead_error = error + self.lookahead * heading
+        if dt > 0:
+            self.integral = max(-self.integral_limit, min(self.integral_limit, self.integral + lookahead_error * dt))
+            raw_derivative = (lookahead_error - self.previous_error) / dt
+            self.derivative = self.derivative_filter * self.derivative + (1 - self.derivative_filter) * raw_derivative
+        self.previous_error = lookahead_error
+        turn_angle = self.kp * lookahead_error + self.ki * self.integral + self.kd * self.derivative
+
+        if self.geometry is None:
+            self.geometry = (error, heading, curvature)
+        else:
+            self.geometry = tuple(self.geometry_filter * previous + (1 - self.geometry_filter) * value
+                                  for previous, value in zip(self.geometry, (error, heading, curvature)))
+        target = self.get_target_speed(remaining, dt, marker_ahead)
+        if target > self.speed:
+            self.speed = min(target, self.speed + self.acceleration * dt)
+        else:
+            self.speed = max(target, self.speed - self.deceleration * dt)
+        self.distance += self.speed * dt
+        return self.speed, turn_angle
@@ -5,36 +5,162 @@ class LineDetector:
     """
     The LineDetector class uses computer vision to recognize lines it has to follow.
     """
-    def __init__(self):
+    def __init__(self, fast=False, headless=False, step=4, bands=(0.6, 0.75, 0.9), band_height=0.05):
         """
-        Specifies the upper and lower color of the line that should be detected
+        Specifies the upper and lower color of the line that should be detected. In fast mode only a few horizontal
+        bands near the bottom of the image are sampled with the given step.
         """
         self.lower_red = np.array([0, 120, 70])
         self.upper_red = np.array([10, 255, 255])
+        self.fast = fast
+        self.headless = headless
+        self.step = step
+        self.bands = bands
+        self.band_height = band_height
 
     def detect(self, image, min_size=100):
         """
         Masks the image and detects the line the robot has to move. It returns the image with the contours on it as well as the
         central coordinates of the line
         """
+        if self.fast:
+            return self.detect_fast(image, min_size)
+
         hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-        mask = cv2.inRange(hsv, self.lower_red, self.upper_red)
+        return self.get_contour_centroid(image, cv2.inRange(hsv, self.lower_red, self.upper_red), min_size)
+
+    def detect_with_bands(self, image, min_size=100):
+        """
+        Detects the line like detect and additionally returns the centroids of the line in the bands like detect_bands.
+        The image is converted and thresholded only once and the centroid and the bands are computed from the same mask.
+        """
+        if self.fast:
+            band_rows, mask = self.sample_bands(image)
+            band_masks = self.split_bands(band_rows, mask)
+            detected, centroid, image = self.get_fast_centroid(image, band_rows, mask, min_size)
+        else:
+            hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+            mask = cv2.inRange(hsv, self.lower_red, self.upper_red)
+            band_rows = self.get_band_rows(image.shape[0])
+            band_masks = [mask[y0:y1:self.step, ::self.step] for y0, y1 in band_rows]
+            detected, centroid, image = self.get_contour_centroid(image, mask, min_size)
+        return detected, centroid, image, self.get_band_centroids(band_rows, band_masks)
+
+    def get_contour_centroid(self, image, mask, min_size):
+        """
+        Returns whether the largest contour in the mask is large enough, its centroid and the image
+        """
         contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         if contours:
             largest_contour = max(contours, key=cv2.contourArea)
-            
+
             if cv2.contourArea(largest_contour) >= min_size:
-                epsilon = 0.01 * cv2.arcLength(largest_contour, True)
-                approx = cv2.approxPolyDP(largest_contour, epsilon, True)
-                cv2.drawContours(image, [approx], -1, (0, 255, 0), 2)
-                
+                if not self.headless:
+                    epsilon = 0.01 * cv2.arcLength(largest_contour, True)
+                    approx = cv2.approxPolyDP(largest_contour, epsilon, True)
+                    cv2.drawContours(image, [approx], -1, (0, 255, 0), 2)
+
                 M = cv2.moments(largest_contour)
                 if M['m00'] != 0:
                     cx = int(M['m10'] / M['m00'])
                     cy = int(M['m01'] / M['m00'])
                 else:
                     cx, cy = 0, 0
-                
+
                 return True, (cx, cy), image
-        
-        return False, (0, 0), image
\ No newline at end of file
+
+        return False, (0, 0), image
+
+    def get_band_rows(self, height):
+        """
+        Returns the first and last row of every band in image coordinates
+        """
+        half_band = max(1, int(height * self.band_height / 2))
+        rows = []
+        for band in self.bands:
+            center = int(height * band)
+            rows.append((max(0, center - half_band), min(height, center + half_band)))
+        return rows
+
+    def sample_bands(self, image):
+        """
+        Returns the rows of the bands and the mask of the sampled pixels of all bands stacked on top of each other
+        """
+        band_rows = self.get_band_rows(image.shape[0])
+        samples = np.concatenate([image[y0:y1:self.step, ::self.step] for y0, y1 in band_rows])
+        hsv = cv2.cvtColor(samples, cv2.COLOR_BGR2HSV)
+        return band_rows, cv2.inRange(hsv, self.lower_red, self.upper_red)
+
+    def split_bands(self, band_rows, mask):
+        """
+        Splits the stacked mask of sample_bands into the masks of the single bands
+        """
+        sizes = [len(range(y0, y1, self.step)) for y0, y1 in band_rows]
+        return np.split(mask, np.cumsum(sizes)[:-1])
+
+    def detect_bands(self, image, min_size=20):
+        """
+        Returns the center row and the centroid column of the line in every band, from the farthest to the nearest band.
+        The column is None when the line is not visible in the band. The LineController estimates the heading and the
+        curvature of the line from the bands.
+        """
+        band_rows, mask = self.sample_bands(image)
+        return self.get_band_centroids(band_rows, self.split_bands(band_rows, mask), min_size)
+
+    def get_band_centroids(self, band_rows, band_masks, min_size=20):
+        """
+        Returns the center row and the centroid column of the line for the sampled mask of every band
+        """
+        bands = []
+        for (y0, y1), band_mask in zip(band_rows, band_masks):
+            column_counts = np.count_nonzero(band_mask, axis=0)
+            total = column_counts.sum()
+            if total * self.step * self.step < min_size:
+                bands.append(((y0 + y1) // 2, None))
+            else:
+                bands.append(((y0 + y1) // 2, np.dot(column_counts, np.arange(column_counts.size)) / total * self.step))
+        return bands
+
+    def get_largest_run(self, column_counts):
+        """
+        Returns the first and the last column + 1 of the connected run of sampled columns with the most line pixels. Gaps
+        of a single sampled column are bridged. Like the largest contour of the contour path, this ignores red objects
+        beside the line.
+        """
+        columns = np.flatnonzero(column_counts)
+        if columns.size == 0:
+            return 0, 0
+        runs = np.split(columns, np.flatnonzero(np.diff(columns) > 2) + 1)
+        largest = max(runs, key=lambda run: column_counts[run[0]:run[-1] + 1].sum())
+        return largest[0], largest[-1] + 1
+
+    def detect_fast(self, image, min_size=100):
+        """
+        Thresholds only the sampled bands of a downscaled image and computes the centroid from the column sums of the
+        largest connected run in the mask. The centroid is returned in the coordinates of the full image. Unlike the
+        contour path, which averages the whole visible line, it is the centroid of the line within the bands.
+        """
+        band_rows, mask = self.sample_bands(image)
+        return self.get_fast_centroid(image, band_rows, mask, min_size)
+
+    def get_fast_centroid(self, image, band_rows, mask, min_size):
+        """
+        Returns whether the largest run in the stacked mask of the bands is large enough, its centroid and the image
+        """
+        column_counts = np.count_nonzero(mask, axis=0)
+        start, end = self.get_largest_run(column_counts)
+        column_counts = column_counts[start:end]
+        total = column_counts.sum()
+        if total * self.step * self.step < min_size:
+            return False, (0, 0), image
+
+        cx = int((np.dot(column_counts, np.arange(start, end)) / total) * self.step)
+        row_counts = np.count_nonzero(mask[:, start:end], axis=1)
+        row_positions = np.concatenate([np.arange(y0, y1, self.step) for y0, y1 in band_rows])
+        cy = int(np.dot(row_counts, row_positions) / total)
+
+        if not self.headless:
+            for y0, y1 in band_rows:
+                cv2.rectangle(image, (0, y0), (image.shape[1] - 1, y1), (0, 255, 0), 1)
+            cv2.circle(image, (cx, cy), 5, (0, 255, 0), -1)
+        return True, (cx, cy), image
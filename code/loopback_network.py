@@ -0,0 +1,143 @@
+import queue
+import threading
+from collections import defaultdict
+from communication_handler import CommunicationHandler
+
+
+class LoopbackNetwork:
+    """
+    The LoopbackNetwork replaces the UDP sockets and multicast groups with in-process queues, so several agents and
+    cells can be simulated and tested in a single process. Like the socket, datagrams larger than the receive buffer
+    are truncated and, when a receive buffer size is given, datagrams arriving at a full buffer are dropped.
+    """
+    def __init__(self, max_datagram=CommunicationHandler.MAX_DATAGRAM, receive_buffer=0):
+        """
+        The receive buffer is the number of datagrams a handler can queue before it drops, 0 queues without limit
+        """
+        self.max_datagram = max_datagram
+        self.receive_buffer = receive_buffer
+        self.handlers = {}
+        self.groups = defaultdict(set)
+        self.lock = threading.Lock()
+        self.delivered = 0
+        self.dropped = 0
+        self.truncated = 0
+
+    def create_handler_factory(self, ip):
+        """
+        Returns a factory that creates a LoopbackCommunicationHandler with the given ip. It can be passed to the Agent
+        instead of the default CommunicationHandler.
+        """
+        def create_handler(dicover_peer_callback, multicast_ip=None):
+            return LoopbackCommunicationHandler(self, ip, dicover_peer_callback, multicast_ip)
+        return create_handler
+
+    def register(self, handler):
+        """
+        Makes the handler reachable under its ip
+        """
+        with self.lock:
+            self.handlers[handler.ip] = handler
+
+    def unregister(self, handler):
+        """
+        Removes the handler and its memberships, so it receives no further datagrams
+        """
+        with self.lock:
+            self.handlers.pop(handler.ip, None)
+            for members in self.groups.values():
+                members.discard(handler.ip)
+
+    def join(self, multicast_ip, ip):
+        """
+        Adds the ip to the members of the multicast group
+        """
+        with self.lock:
+            self.groups[multicast_ip].add(ip)
+
+    def deliver(self, data, address):
+        """
+        Delivers a datagram to a single handler or to all members of a multicast group
+        """
+        truncated = len(data) > self.max_datagram
+        data = data[:self.max_datagram]
+        with self.lock:
+            if address in self.groups:
+                receivers = [self.handlers[ip] for ip in self.groups[address] if ip in self.handlers]
+            elif address in self.handlers:
+                receivers = [self.handlers[address]]
+            else:
+                receivers = []
+            if truncated:
+                self.truncated += len(receivers)
+        delivered = 0
+        for handler in receivers:
+            try:
+                handler.inbox.put_nowait(data)
+                delivered += 1
+            except queue.Full:
+                pass
+        with self.lock:
+            self.delivered += delivered
+            self.dropped += len(receivers) - delivered
+
+    def get_stats(self):
+        """
+        Returns the numbers of delivered, dropped and truncated datagrams
+        """
+        with self.lock:
+            return {"delivered": self.delivered, "dropped": self.dropped, "truncated": self.truncated}
+
+
+class LoopbackCommunicationHandler(CommunicationHandler):
+    """
+    CommunicationHandler that sends and receives its messages through a LoopbackNetwork instead of a socket
+    """
+    def __init__(self, network, ip, dicover_peer_callback, multicast_ip=None):
+        """
+        The ip replaces the local ip of the socket, received datagrams are queued in the inbox
+        """
+        self.network = network
+        self.ip = ip
+        self.inbox = queue.Queue(network.receive_buffer)
+        super().__init__(dicover_peer_callback, multicast_ip)
+
+    def open_socket(self):
+        """
+        Registers the handler with the network instead of opening a socket
+        """
+        self.network.register(self)
+
+    def join_group(self, multicast_ip):
+        """
+        Joins the multicast group of the network
+        """
+        self.network.join(multicast_ip, self.ip)
+
+    def listen(self):
+        """
+        Passes the datagrams of the inbox to receive until the handler is stopped
+        """
+        while self.running:
+            data = self.inbox.get()
+            if data is None:
+                break
+            self.receive(data)
+
+    def transmit(self, data, address):
+        """
+        Hands the datagram to the network for delivery
+        """
+        self.network.deliver(data, address)
+
+    def stop(self):
+        """
+        Stops the handler, leaves the network and wakes up the listening thread
+        """
+        self.running = False
+        self.stopped.set()
+        self.network.unregister(self)
+        try:
+            self.inbox.put_nowait(None)
+        except queue.Full:
+            pass
@@ -1,12 +1,20 @@
+import time
+from startup_profile import StartupProfile
+startup_profile = StartupProfile()
 from agent import Agent
 from environment_loader import EnvironmentLoader
+import metrics
+import event_log
+import trace_recorder
+startup_profile.mark("imports")
 
 """
 Load all the environment variables
 """
 #print("Loading environments")
 envl = EnvironmentLoader()
-is_coordinator = envl.getIsCoordinator()
+role = envl.getRole()
+is_coordinator = envl.getIsCoordinator() or role == "coordinator"
 location = envl.getLocation()
 pos = envl.getPos()
 edges = envl.getEdges()
@@ -14,10 +22,32 @@ use_mock_robot = envl.getUseMockRobot()
 robot_facing_direction = envl.getFacingDirection()
 durations = envl.getDurations()
 use_best_path = envl.getUseBestPath()
+recording = envl.getRecording()
+vision = envl.getVision()
+line_control = envl.getLineControl()
+calibration = envl.getCalibration()
+edge_weights = envl.getEdgeWeights()
+cells = envl.getCells()
+election = envl.getElection()
+repositioning = envl.getRepositioning()
+overlap_motion = envl.getOverlapMotion()
+metrics.configure(envl.getMetrics())
+event_log.configure(envl.getEventLog())
+trace_recorder.configure(envl.getTrace())
+startup_profile.mark("configuration")
 #print("Done loading")
 
 """
 Initializes an Agent object 
 """
 #print("Init agent")
-a = Agent(location, is_coordinator, pos, edges, use_mock_robot, robot_facing_direction, durations, use_best_path)
+a = Agent(location, is_coordinator, pos, edges, use_mock_robot, robot_facing_direction, durations, use_best_path, recording, vision, calibration, edge_weights, cells, election=election, role=role, startup_profile=startup_profile, line_control=line_control, repositioning=repositioning, overlap_motion=overlap_motion)
+
+"""
+Runs until the agent is interrupted, then stops it so the recorded frames are written
+"""
+try:
+    while True:
+        time.sleep(1)
+except KeyboardInterrupt:
+    a.stop()
@@ -1,21 +1,49 @@
 import cv2
 import cv2.aruco as aruco
+import numpy as np
 
 class MarkerDetector:
     """
     The MarkerDetector class uses computer vision to recognize markers for navigating the AGV
     """
-    def __init__(self):
+    SUBPIX_WINDOW = (5, 5)
+    SUBPIX_CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.01)
+
+    def __init__(self, fast=False, marker_ids=None, debug=True, detection_scale=0.5, roi_margin=60, full_search_interval=5):
         """
-        A dictionary of all aruco markers ass well as the parameters are initialized
+        A dictionary of all aruco markers ass well as the parameters are initialized. In fast mode a reusable ArucoDetector
+        with a dictionary that only contains the marker ids of the map is created. While a marker is tracked, the whole
+        image is still searched every full_search_interval frames.
         """
         self.aruco_markers_dict = aruco.getPredefinedDictionary(aruco.DICT_4X4_250)
         self.parameters = aruco.DetectorParameters()
+        self.fast = fast
+        self.debug = debug
+        self.detection_scale = detection_scale
+        self.roi_margin = roi_margin
+        self.marker_ids = set(marker_ids) if marker_ids else set(range(1, 13))
+        self.full_search_interval = max(1, full_search_interval)
+        self.last_window = None
+        self.tracked_frames = 0
+        if self.fast:
+            self.detector = aruco.ArucoDetector(self.create_reduced_dictionary(), self.parameters)
+
+    def create_reduced_dictionary(self):
+        """
+        Creates a dictionary with the first entries of DICT_4X4_250 up to the highest used marker id, so the ids stay the
+        same while far fewer candidates have to be identified.
+        """
+        max_id = max(self.marker_ids)
+        base = self.aruco_markers_dict
+        return aruco.Dictionary(base.bytesList[:max_id + 1], base.markerSize, base.maxCorrectionBits)
 
     def detect(self, image):
         """
         Detects the markers if available on the image and returns its id together with the corners and the modified image
         """
+        if self.fast:
+            return self.detect_fast(image)
+
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
 
         corners, ids, _ = aruco.detectMarkers(gray, self.aruco_markers_dict, parameters=self.parameters)
@@ -23,4 +51,67 @@ class MarkerDetector:
         if ids is not None:
             image = aruco.drawDetectedMarkers(image, corners, ids)
             return ids, corners, image
-        return None, None, image
\ No newline at end of file
+        return None, None, image
+
+    def detect_fast(self, image):
+        """
+        Searches the window around the last detection first and falls back to the whole image. As a new marker can appear
+        outside the window while the last one is still inside, the whole image is searched every full_search_interval
+        frames as well. Markers are detected on a downscaled image and the corners are refined on the full resolution
+        afterwards.
+        """
+        height, width = image.shape[:2]
+        ids, corners = None, None
+        if self.last_window is not None and self.tracked_frames < self.full_search_interval - 1:
+            self.tracked_frames += 1
+            ids, corners = self.detect_in_window(image, self.last_window)
+        if ids is None:
+            self.tracked_frames = 0
+            ids, corners = self.detect_in_window(image, (0, 0, width, height))
+        if ids is None:
+            self.last_window = None
+            return None, None, image
+
+        self.last_window = self.get_search_window(corners, width, height)
+        if self.debug:
+            image = aruco.drawDetectedMarkers(image, corners, ids)
+        return ids, corners, image
+
+    def detect_in_window(self, image, window):
+        """
+        Runs the detector on the given window of the image and returns the ids and the corners in image coordinates
+        """
+        x0, y0, x1, y1 = window
+        gray = cv2.cvtColor(image[y0:y1, x0:x1], cv2.COLOR_BGR2GRAY)
+        if self.detection_scale < 1:
+            small = cv2.resize(gray, None, fx=self.detection_scale, fy=self.detection_scale, interpolation=cv2.INTER_AREA)
+        else:
+            small = gray
+        corners, ids, _ = self.detector.detectMarkers(small)
+        if ids is None:
+            return None, None
+
+        found_ids = []
+        refined_corners = []
+        for marker_id, marker_corners in zip(ids.flatten(), corners):
+            if marker_id not in self.marker_ids:
+                continue
+            points = (marker_corners.reshape(-1, 1, 2) / min(self.detection_scale, 1)).astype(np.float32)
+            cv2.cornerSubPix(gray, points, self.SUBPIX_WINDOW, (-1, -1), self.SUBPIX_CRITERIA)
+            points += np.array([x0, y0], dtype=np.float32)
+            found_ids.append([marker_id])
+            refined_corners.append(points.reshape(1, 4, 2))
+        if not found_ids:
+            return None, None
+        return np.array(found_ids, dtype=np.int32), tuple(refined_corners)
+
+    def get_search_window(self, corners, width, height):
+        """
+        Calculates the search window for the next frame from the bounding box of the detected markers
+        """
+        points = np.concatenate([c.reshape(-1, 2) for c in corners])
+        x_min, y_min = points.min(axis=0)
+        x_max, y_max = points.max(axis=0)
+        margin = self.roi_margin + max(x_max - x_min, y_max - y_min) / 2
+        return (max(0, int(x_min - margin)), max(0, int(y_min - margin)),
+                min(width, int(x_max + margin) + 1), min(height, int(y_max + margin) + 1))
@@ -0,0 +1,297 @@
+import json
+import os
+import threading
+import time
+
+
+class Histogram:
+    """
+    Counts observations in fixed buckets and keeps the count, sum, minimum and maximum
+    """
+    BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self):
+        """
+        Starts with empty buckets
+        """
+        self.bucket_counts = [0] * (len(self.BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        """
+        Counts the value in the first bucket whose upper bound is not below it
+        """
+        index = 0
+        while index < len(self.BUCKETS) and value > self.BUCKETS[index]:
+            index += 1
+        self.bucket_counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def to_dict(self):
+        """
+        Returns the statistics and the count per bucket as a dictionary
+        """
+        return {"count": self.count, "sum": self.sum, "min": self.min, "max": self.max,
+                "mean": self.sum / self.count if self.count else None,
+                "buckets": dict(zip([str(b) for b in self.BUCKETS] + ["+Inf"], self.bucket_counts))}
+
+
+class Timer:
+    """
+    Context manager that observes the duration of its block in a histogram
+    """
+    def __init__(self, metrics, name):
+        """
+        The duration is observed in the histogram with the given name
+        """
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        """
+        Starts the measurement
+        """
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        Observes the duration of the block, exceptions are not suppressed
+        """
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class NullTimer:
+    """
+    Timer used when metrics are disabled
+    """
+    def __enter__(self):
+        """
+        Does nothing
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        Does nothing, exceptions are not suppressed
+        """
+        return False
+
+
+class NullMetrics:
+    """
+    The NullMetrics has the same interface as Metrics but does nothing, so disabled metrics cost a single method call
+    """
+    enabled = False
+    NULL_TIMER = NullTimer()
+
+    def increment(self, name, value=1):
+        """
+        Does nothing
+        """
+        pass
+
+    def observe(self, name, value):
+        """
+        Does nothing
+        """
+        pass
+
+    def timer(self, name):
+        """
+        Returns the shared NullTimer
+        """
+        return self.NULL_TIMER
+
+    def snapshot(self):
+        """
+        Returns an empty snapshot
+        """
+        return {"counters": {}, "histograms": {}}
+
+    def close(self):
+        """
+        Does nothing
+        """
+        pass
+
+
+class Metrics:
+    """
+    The Metrics class keeps counters and histograms. Timers observe durations in seconds into histograms. The values
+    are exported either periodically into a local file or through a local scrape endpoint.
+    """
+    enabled = True
+
+    def __init__(self):
+        """
+        Starts without counters and histograms and without export
+        """
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.start_time = time.time()
+        self.running = False
+        self.server = None
+
+    def increment(self, name, value=1):
+        """
+        Increments the counter with the given name by value
+        """
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, value):
+        """
+        Observes the value in the histogram with the given name, which is created on first use
+        """
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(value)
+
+    def timer(self, name):
+        """
+        Returns a Timer that observes the duration of a block in the histogram with the given name
+        """
+        return Timer(self, name)
+
+    def snapshot(self):
+        """
+        Returns a copy of all the metrics as a dictionary
+        """
+        with self.lock:
+            return {"timestamp": time.time(), "uptime": time.time() - self.start_time,
+                    "counters": dict(self.counters),
+                    "histograms": {name: h.to_dict() for name, h in self.histograms.items()}}
+
+    def to_prometheus(self):
+        """
+        Formats the metrics in the Prometheus text format
+        """
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot["counters"].items()):
+            metric = self.metric_name(name)
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+        for name, histogram in sorted(snapshot["histograms"].items()):
+            metric = self.metric_name(name)
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bucket, count in histogram["buckets"].items():
+                cumulative += count
+                lines.append(f'{metric}_bucket{{le="{bucket}"}} {cumulative}')
+            lines.append(f"{metric}_sum {histogram['sum']}")
+            lines.append(f"{metric}_count {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+    def metric_name(self, name):
+        """
+        Converts the name of a metric into a valid Prometheus metric name with the agv_ prefix
+        """
+        return "agv_" + "".join(c if c.isalnum() else "_" for c in name).lower()
+
+    def start_file_export(self, path, interval):
+        """
+        Writes a snapshot of the metrics into a json file in the specified interval
+        """
+        self.running = True
+
+        def export():
+            while self.running:
+                time.sleep(interval)
+                self.write_file(path)
+
+        threading.Thread(target=export, daemon=True).start()
+
+    def write_file(self, path):
+        """
+        Writes a snapshot into a temporary file which replaces the file at path, so readers never see a partial file
+        """
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.snapshot(), f, indent=1)
+        os.replace(temp_path, path)
+
+    def start_http_export(self, port):
+        """
+        Serves the metrics on localhost under /metrics in the Prometheus format and under /metrics.json. The http
+        server is only imported when the export is used to keep the startup fast.
+        """
+        from http.server import BaseHTTPRequestHandler, HTTPServer
+        metrics = self
+
+        class MetricsRequestHandler(BaseHTTPRequestHandler):
+            """
+            Answers the scrape requests with the current metrics
+            """
+            def do_GET(self):
+                """
+                Returns the metrics in the format of the requested path
+                """
+                if self.path == "/metrics.json":
+                    body, content_type = json.dumps(metrics.snapshot()), "application/json"
+                elif self.path == "/metrics":
+                    body, content_type = metrics.to_prometheus(), "text/plain; version=0.0.4"
+                else:
+                    self.send_error(404)
+                    return
+                body = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                """
+                Suppresses the access log of every scrape
+                """
+                pass
+
+        self.server = HTTPServer(("127.0.0.1", port), MetricsRequestHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        """
+        Stops the file export and the http server
+        """
+        self.running = False
+        if self.server is not None:
+            self.server.shutdown()
+            self.server = None
+
+
+metrics = NullMetrics()
+
+
+def get_metrics():
+    """
+    Returns the metrics of the process. Modules fetch it once on initialization.
+    """
+    return metrics
+
+
+def configure(options):
+    """
+    Enables the metrics and their export based on the options loaded by the EnvironmentLoader
+    """
+    global metrics
+    mode = (options or {}).get("mode", "off")
+    if mode == "off":
+        return metrics
+    metrics = Metrics()
+    if mode == "file":
+        metrics.start_file_export(options.get("path", "metrics.json"), options.get("interval", 5))
+    elif mode == "http":
+        metrics.start_http_export(options.get("port", 9100))
+    return metrics
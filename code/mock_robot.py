@@ -4,12 +4,35 @@ class MockRobot:
     The MockRobot class serves for testing and simulation purposes when no real robot is available
     
     """
+    measures_durations = False
+
     def __init__(self, log, edges, pos, location, robot_facing_direction):
         """
         Takes in the same parameters as the Robot class but only initializes the logger
         """
         self.log = log
     
+    def prepare_route(self, path, action=None, node_callback=None):
+        """
+        Logs the moves along the path and reports every node as reached. The route ends on the node for which the
+        node_callback returns False.
+        """
+        for index in range(1, len(path)):
+            if index == len(path) - 1 and action == "pickup":
+                self.prepare_pickup(path[index])
+            elif index == len(path) - 1 and action == "dropoff":
+                self.prepare_dropoff(path[index])
+            else:
+                self.prepare_move(path[index])
+            if node_callback is not None and node_callback(index) is False:
+                break
+
+    def close(self):
+        """
+        Does nothing, as the MockRobot holds no resources
+        """
+        pass
+
     def prepare_move(self, target):
         """
         Logs a move
@@ -27,4 +50,10 @@ class MockRobot:
         Logs drop offs
         """
         self.log(f"Move to {target} and drop off")
-        
\ No newline at end of file
+        
+
+    def pop_timings(self):
+        """
+        The MockRobot does not move, so there are no measured durations
+        """
+        return []
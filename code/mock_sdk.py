@@ -0,0 +1,172 @@
+import threading
+import time
+
+
+class MockAction:
+    """
+    Stands in for the action objects of the RoboMaster SDK which are returned by blocking moves
+    """
+    def __init__(self, duration):
+        """
+        The duration is the scaled duration of the action in seconds
+        """
+        self.duration = duration
+
+    def wait_for_completed(self, timeout=None):
+        """
+        Waits for the simulated duration of the action
+        """
+        if self.duration > 0:
+            time.sleep(self.duration)
+        return True
+
+
+class MockChassis:
+    """
+    Records the chassis commands instead of moving a robot
+    """
+    def __init__(self, ep_robot):
+        """
+        The commands are recorded in the trace of the ep_robot
+        """
+        self.ep_robot = ep_robot
+
+    def drive_speed(self, x=0.0, y=0.0, z=0.0, timeout=None):
+        """
+        Records a drive command, which returns immediately like on the real chassis
+        """
+        self.ep_robot.record("chassis", "drive_speed", x=x, y=y, z=z, timeout=timeout)
+
+    def move(self, x=0, y=0, z=0, xy_speed=0.5, z_speed=30):
+        """
+        Records a relative move and returns an action that lasts as long as the move would take
+        """
+        duration = self.ep_robot.simulate(max(abs(x) / xy_speed if xy_speed else 0, abs(z) / 90))
+        self.ep_robot.record("chassis", "move", x=x, y=y, z=z, xy_speed=xy_speed, z_speed=z_speed)
+        return MockAction(duration)
+
+    def stop(self):
+        """
+        Records that the chassis was stopped
+        """
+        self.ep_robot.record("chassis", "stop")
+
+
+class MockRoboticArm:
+    """
+    Records the moves of the robotic arm
+    """
+    def __init__(self, ep_robot):
+        """
+        The moves are recorded in the trace of the ep_robot
+        """
+        self.ep_robot = ep_robot
+
+    def move(self, x=0, y=0):
+        """
+        Records a relative move of the arm and returns an action that lasts as long as the move would take
+        """
+        duration = self.ep_robot.simulate(max(abs(x), abs(y)) / 100)
+        self.ep_robot.record("robotic_arm", "move", x=x, y=y)
+        return MockAction(duration)
+
+
+class MockGripper:
+    """
+    Records the gripper commands. Like the real gripper the commands return immediately while the gripper keeps moving.
+    """
+    def __init__(self, ep_robot):
+        """
+        The gripper starts in the normal status without a subscription
+        """
+        self.ep_robot = ep_robot
+        self.status = "normal"
+        self.status_callback = None
+
+    def open(self, power=50):
+        """
+        Records the command and reports the opened status once the gripper would be open
+        """
+        self.ep_robot.record("gripper", "open", power=power)
+        self.change_status("opened")
+
+    def close(self, power=50):
+        """
+        Records the command and reports the closed status once the gripper would be closed
+        """
+        self.ep_robot.record("gripper", "close", power=power)
+        self.change_status("closed")
+
+    def sub_status(self, freq=5, callback=None):
+        """
+        Subscribes the callback to the status changes of the gripper
+        """
+        self.status_callback = callback
+
+    def unsub_status(self):
+        """
+        Removes the subscription to the status changes
+        """
+        self.status_callback = None
+
+    def change_status(self, status):
+        """
+        Reports the new status after the simulated duration of the gripper movement
+        """
+        def report():
+            self.status = status
+            if self.status_callback is not None:
+                self.status_callback(status)
+        duration = self.ep_robot.simulate(1)
+        if duration > 0:
+            threading.Timer(duration, report).start()
+        else:
+            report()
+
+
+class MockEPRobot:
+    """
+    The MockEPRobot replaces the robomaster.robot.Robot object. All commands are recorded in a trace together with the
+    time and the frame of the camera they were sent in. The simulated durations of blocking actions are multiplied by
+    the time_scale, so a scale of 0 makes all actions return immediately.
+    """
+    def __init__(self, camera=None, time_scale=0):
+        """
+        The camera is optional, its frame_index is stored with every recorded command
+        """
+        self.camera = camera
+        self.time_scale = time_scale
+        self.chassis = MockChassis(self)
+        self.robotic_arm = MockRoboticArm(self)
+        self.gripper = MockGripper(self)
+        self.trace = []
+        self.lock = threading.Lock()
+        self.start_time = time.time()
+
+    def initialize(self, conn_type="sta"):
+        """
+        Restarts the clock of the trace, no connection is established
+        """
+        self.start_time = time.time()
+
+    def close(self):
+        """
+        Does nothing, as there is no connection to close
+        """
+        pass
+
+    def simulate(self, duration):
+        """
+        Returns the scaled duration of a simulated action
+        """
+        return duration * self.time_scale
+
+    def record(self, component, command, **kwargs):
+        """
+        Adds a command to the trace. NumPy scalars are converted so the trace can be stored as json.
+        """
+        kwargs = {key: value.item() if hasattr(value, "item") else value for key, value in kwargs.items()}
+        entry = {"time": time.time() - self.start_time, "frame": getattr(self.camera, "frame_index", None),
+                 "component": component, "command": command, "args": kwargs}
+        with self.lock:
+            self.trace.append(entry)
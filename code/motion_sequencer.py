@@ -0,0 +1,88 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+class MotionStep:
+    """
+    A single action of a motion sequence together with the names of the steps it depends on
+    """
+    def __init__(self, name, action, depends_on=()):
+        """
+        The action is called without arguments, depends_on holds the names of the steps that have to be completed first
+        """
+        self.name = name
+        self.action = action
+        self.depends_on = set(depends_on)
+        self.start = None
+        self.end = None
+
+    def run(self, sequence_start):
+        """
+        Runs the action and records its start and end time relative to the start of the sequence
+        """
+        self.start = time.perf_counter() - sequence_start
+        self.action()
+        self.end = time.perf_counter() - sequence_start
+
+    def get_duration(self):
+        """
+        Returns how long the action took
+        """
+        return self.end - self.start
+
+
+class MotionSequence:
+    """
+    The MotionSequence declares the dependencies between the actions of a manoeuvre and runs every action as soon as all
+    the actions it depends on are completed. Independent actions, e.g. of the arm and the chassis, run concurrently.
+    """
+    def __init__(self, name):
+        """
+        Creates an empty sequence, the name identifies it in the report
+        """
+        self.name = name
+        self.steps = []
+        self.duration = None
+
+    def add(self, name, action, depends_on=()):
+        """
+        Adds an action which is started once all the steps in depends_on are completed
+        """
+        names = {step.name for step in self.steps}
+        missing = set(depends_on) - names
+        if missing:
+            raise Exception(f"Step {name} depends on unknown steps {missing}")
+        self.steps.append(MotionStep(name, action, depends_on))
+        return name
+
+    def run(self):
+        """
+        Runs all the steps and returns the report of the sequence. The first exception of a step is raised after the
+        running steps are completed.
+        """
+        sequence_start = time.perf_counter()
+        completed = set()
+        pending = list(self.steps)
+        running = {}
+        with ThreadPoolExecutor(max_workers=max(1, len(self.steps))) as pool:
+            while pending or running:
+                for step in list(pending):
+                    if step.depends_on <= completed:
+                        running[pool.submit(step.run, sequence_start)] = step
+                        pending.remove(step)
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    step = running.pop(future)
+                    if future.exception() is not None:
+                        wait(running)
+                        raise future.exception()
+                    completed.add(step.name)
+        self.duration = time.perf_counter() - sequence_start
+        return self.get_report()
+
+    def get_report(self):
+        """
+        Returns the duration of the sequence and the start and end time of every step
+        """
+        return {"name": self.name, "duration": self.duration,
+                "steps": {step.name: (step.start, step.end) for step in self.steps}}
@@ -1,16 +1,21 @@
+import math
 import networkx as nx
 #print(nx.__file__)
 from route_navigator import RouteNavigator
+from metrics import get_metrics
 
 class PathPlanner:
     """
     The PathPlanner class is responsible all path planning and task scheduling tasks.
     """
 
-    def __init__(self, edges, pos, durations):
+    def __init__(self, edges, pos, durations, duration_estimator=None, edge_weights=None):
         """
         The duration of the moves, pickups and dropoffs are initialized for cost calulation. 
         The network graph with all its edges is initialiezed for path plannning.
+        When a DurationEstimator is passed, the measured durations are used instead of the configured ones.
+        With geometric edge weights the MOVE_DURATION is the duration for an edge of unit_length and every edge is
+        weighted by its length, which is computed from the node positions or overridden per edge.
         """
         self.MOVE_DURATION = durations["MOVE_DURATION"]
         self.PICKUP_DURATION = durations["PICKUP_DURATION"]
@@ -21,12 +26,82 @@ class PathPlanner:
         self.pos = pos
         self.G = nx.Graph()
         self.G.add_edges_from(self.edges)
+        self.metrics = get_metrics()
+        self.duration_estimator = duration_estimator
+        edge_weights = edge_weights or {}
+        self.geometric = edge_weights.get("mode", "hop") == "geometric"
+        self.unit_length = edge_weights.get("unit_length", 1)
+        self.add_edge_lengths(edge_weights.get("lengths", {}))
+
+    def add_edge_lengths(self, lengths):
+        """
+        Stores the length of every edge in the graph. Lengths from the map config take precedence over the distance
+        between the node positions.
+        """
+        for u, v in self.G.edges:
+            if (u, v) in lengths:
+                length = lengths[(u, v)]
+            elif (v, u) in lengths:
+                length = lengths[(v, u)]
+            else:
+                length = math.hypot(self.pos[v][0] - self.pos[u][0], self.pos[v][1] - self.pos[u][1])
+            self.G[u][v]["length"] = length
+
+    def get_edge_length(self, u, v):
+        """
+        Returns the length of the edge between two nodes
+        """
+        return self.G[u][v]["length"]
+
+    def get_edge_duration(self, u, v):
+        """
+        Returns the duration for driving along the edge between two nodes
+        """
+        if self.geometric:
+            duration = self.MOVE_DURATION * self.get_edge_length(u, v) / self.unit_length
+        else:
+            duration = self.MOVE_DURATION
+        if self.duration_estimator is None:
+            return duration
+        return self.duration_estimator.get_edge_duration(u, v, duration)
+
+    def get_path_duration(self, path):
+        """
+        Returns the driving duration of a path without turns
+        """
+        return sum(self.get_edge_duration(path[i], path[i+1]) for i in range(len(path)-1))
+
+    def get_turn_duration(self, angle):
+        """
+        Returns the duration of a turn by the specified angle
+        """
+        if self.duration_estimator is None:
+            return abs(angle)/90*self.TURN_DURATION
+        return self.duration_estimator.get_turn_duration(angle)
+
+    def get_pickup_duration(self):
+        """
+        Returns the duration of a pickup, estimated from the measurements when a duration_estimator is used
+        """
+        if self.duration_estimator is None:
+            return self.PICKUP_DURATION
+        return self.duration_estimator.get_pickup_duration()
+
+    def get_dropoff_duration(self):
+        """
+        Returns the duration of a dropoff, estimated from the measurements when a duration_estimator is used
+        """
+        if self.duration_estimator is None:
+            return self.DROPOFF_DURATION
+        return self.duration_estimator.get_dropoff_duration()
     
     def find_path(self, start_node, end_node):
         """
-        Finds a path in the network when available.
+        Finds a path in the network when available. With weighted edges or measured durations the fastest path is returned.
         """
         try:
+            if self.geometric or self.duration_estimator is not None:
+                return nx.shortest_path(self.G, source=start_node, target=end_node, weight=lambda u, v, d: self.get_edge_duration(u, v))
             return nx.shortest_path(self.G, source=start_node, target=end_node)
         except nx.NetworkXNoPath:
             return []
@@ -52,31 +127,33 @@ class PathPlanner:
         """
         Calculates the cost of the path for the agent
         """
-        route_navigator = RouteNavigator(self.edges, self.pos, agent_location["node"], agent_location["facing_direction"])
+        route_navigator = RouteNavigator(self.edges, self.pos, agent_location["node"], agent_location["facing_direction"], self.G)
         turns, _ = route_navigator.get_turns(path[-1], path)
         turn_time = 0
         real_turns = 0
         for i in range(len(path)-1):
-            turn_time+=abs(turns[path[i]])/90*self.TURN_DURATION
+            turn_time+=self.get_turn_duration(turns[path[i]])
             if abs(turns[path[i]])>0:
                 real_turns+=1
 
-        return (len(path)-1)*self.MOVE_DURATION + turn_time+ real_turns+0.1
+        return self.get_path_duration(path) + turn_time+ real_turns+0.1
 
     def plan_task(self, start_node, end_node, agent_locations):
         """
         Finds all the possible paths from start node to the end node and schedules multiple scenarios.
         """
-        self.agent_locations = agent_locations
-        all_possible_paths = nx.all_simple_paths(self.G, source=start_node, target=end_node)
-        options= {}
-        for i, path in enumerate(all_possible_paths):
-            options[i] = self.schedule_agents(path, agent_locations)
-        option_keys = list(options.keys())
-        for option in option_keys:
-            if len(options[option]) == 0:
-                del options[option]
-                
+        with self.metrics.timer("planner.plan_task"):
+            self.agent_locations = agent_locations
+            all_possible_paths = nx.all_simple_paths(self.G, source=start_node, target=end_node)
+            options= {}
+            for i, path in enumerate(all_possible_paths):
+                options[i] = self.schedule_agents(path, agent_locations)
+            option_keys = list(options.keys())
+            for option in option_keys:
+                if len(options[option]) == 0:
+                    del options[option]
+        self.metrics.increment("planner.plan_task.calls")
+        self.metrics.observe("planner.plan_task.options", len(options))
         return options
     
     def get_best_option(self, options):
@@ -166,25 +243,54 @@ class PathPlanner:
                 turn_time, turn_time_per_node, last_facing_direction = self.get_turn_info(subtask["path"], subtask["name"])
                 subtask["turn_time_per_node"] = turn_time_per_node
                 subtask["last_facing_direction"] = last_facing_direction
-                subtask["end_time"] = start_time + (len(subtask["path"])-1)*self.MOVE_DURATION + turn_time
+                subtask["end_time"] = start_time + self.get_path_duration(subtask["path"]) + turn_time
                 start_time = subtask["end_time"]
             if subtask["task"] == "TRANSPORT":
                 subtask["start_time"] = start_time
                 turn_time, turn_time_per_node, last_facing_direction = self.get_turn_info(subtask["path"], subtask["name"])
                 subtask["turn_time_per_node"] = turn_time_per_node
                 subtask["last_facing_direction"] = last_facing_direction
-                subtask["end_time"] = start_time + (len(subtask["path"])-1)*self.MOVE_DURATION + self.PICKUP_DURATION + self.DROPOFF_DURATION + turn_time
+                subtask["end_time"] = start_time + self.get_path_duration(subtask["path"]) + self.get_pickup_duration() + self.get_dropoff_duration() + turn_time
                 start_time = subtask["end_time"]
         return tasks
     
+    def plan_move(self, agent_name, agent_location, end_node):
+        """
+        Schedules a single MOVE of an agent to the end node, e.g. to park an idle agent
+        """
+        path = self.find_path(agent_location["node"], end_node)
+        if len(path) < 2:
+            return []
+        route_navigator = RouteNavigator(self.edges, self.pos, path[0], agent_location["facing_direction"], self.G)
+        turns, _ = route_navigator.get_turns(path[-1], path)
+        turn_time_per_node = {node: self.get_turn_duration(turns[node]) for node in path[:-1]}
+        return [{"name": agent_name, "task": "MOVE", "path": path, "start_time": 0,
+                 "turn_time_per_node": turn_time_per_node, "last_facing_direction": route_navigator.getFacingDirection(),
+                 "end_time": self.get_path_duration(path) + sum(turn_time_per_node.values())}]
+
+    def add_clearing_move(self, tasks):
+        """
+        Appends a move of the last agent from the final node back to the previous node of its transport, so the final
+        node is free when the freight is handed over to another cell.
+        """
+        last_task = tasks[-1]
+        path = [last_task["path"][-1], last_task["path"][-2]]
+        route_navigator = RouteNavigator(self.edges, self.pos, path[0], last_task["last_facing_direction"], self.G)
+        turns, _ = route_navigator.get_turns(path[-1], path)
+        turn_time = self.get_turn_duration(turns[path[0]])
+        tasks.append({"name": last_task["name"], "task": "MOVE", "path": path, "start_time": last_task["end_time"],
+                      "turn_time_per_node": {path[0]: turn_time}, "last_facing_direction": route_navigator.getFacingDirection(),
+                      "end_time": last_task["end_time"] + self.get_edge_duration(path[0], path[1]) + turn_time})
+        return tasks
+
     def get_turn_info(self, path, agent_name):
-        route_navigator = RouteNavigator(self.edges, self.pos, self.agent_locations[agent_name]["node"], self.agent_locations[agent_name]["facing_direction"])
+        route_navigator = RouteNavigator(self.edges, self.pos, self.agent_locations[agent_name]["node"], self.agent_locations[agent_name]["facing_direction"], self.G)
         turns, _ = route_navigator.get_turns(path[-1], path)
         turn_time = 0
         turn_time_per_node = {}
         for i in range(len(path)-1):
-            turn_time+=abs(turns[path[i]])/90*self.TURN_DURATION
-            turn_time_per_node[path[i]] = abs(turns[path[i]])/90*self.TURN_DURATION
+            turn_time+=self.get_turn_duration(turns[path[i]])
+            turn_time_per_node[path[i]] = self.get_turn_duration(turns[path[i]])
         last_facing_direction = route_navigator.getFacingDirection()
         return turn_time, turn_time_per_node, last_facing_direction
                 
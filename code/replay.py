@@ -0,0 +1,254 @@
+import argparse
+import glob
+import json
+import os
+import re
+import time
+import cv2
+import numpy as np
+from environment_loader import EnvironmentLoader
+from mock_sdk import MockEPRobot
+from robot import Robot
+
+
+class ReplayFinished(Exception):
+    """
+    Raised by the ReplayCamera when all recorded frames have been replayed
+    """
+
+
+class ReplayCamera:
+    """
+    The ReplayCamera stands in for the camera of the RoboMaster and returns recorded frames from a directory of images
+    or from a video file instead of the live stream.
+    """
+    def __init__(self, source, max_frames=None):
+        """
+        Images are sorted by the frame number in their file name like the ones written by the FrameRecorder
+        """
+        self.source = source
+        self.frame_index = -1
+        self.max_frames = max_frames
+        self.read_times = []
+        self.capture = None
+        self.image_paths = []
+        if os.path.isdir(source):
+            paths = glob.glob(os.path.join(source, "*.jpg")) + glob.glob(os.path.join(source, "*.png"))
+            self.image_paths = sorted(paths, key=self.get_frame_number)
+        else:
+            self.capture = cv2.VideoCapture(source)
+
+    def get_frame_number(self, path):
+        """
+        Returns the sort key of an image. Older recordings named image_{target}_{counter} restart the counter for every
+        target, so they are sorted by the time the writer wrote them.
+        """
+        match = re.match(r"image_(\d+)_", os.path.basename(path))
+        if match:
+            return (0, int(match.group(1)), path)
+        return (1, os.path.getmtime(path), path)
+
+    def start_video_stream(self, display=False):
+        """
+        Does nothing, the recorded frames are read on demand
+        """
+        pass
+
+    def stop_video_stream(self):
+        """
+        Does nothing, the recorded frames are read on demand
+        """
+        pass
+
+    def read_cv2_image(self, strategy='newest', timeout=None):
+        """
+        Returns the next recorded frame and raises ReplayFinished when there are no frames left
+        """
+        start = time.perf_counter()
+        self.frame_index += 1
+        if self.max_frames is not None and self.frame_index >= self.max_frames:
+            raise ReplayFinished()
+        if self.capture is not None:
+            success, img = self.capture.read()
+            if not success:
+                raise ReplayFinished()
+        else:
+            if self.frame_index >= len(self.image_paths):
+                raise ReplayFinished()
+            img = cv2.imread(self.image_paths[self.frame_index])
+        self.read_times.append(time.perf_counter() - start)
+        return img
+
+
+class TimedStage:
+    """
+    Wraps a function of the vision and control loop and measures the duration of every call
+    """
+    def __init__(self, function):
+        """
+        Wraps the function, the durations of the calls are stored in seconds
+        """
+        self.function = function
+        self.durations = []
+
+    def __call__(self, *args, **kwargs):
+        """
+        Calls the wrapped function and records how long it took
+        """
+        start = time.perf_counter()
+        result = self.function(*args, **kwargs)
+        self.durations.append(time.perf_counter() - start)
+        return result
+
+
+class ReplayHarness:
+    """
+    The ReplayHarness feeds recorded frames through Robot.execute with a stand-in camera and a MockEPRobot so the
+    vision path can be benchmarked and the resulting drive commands can be compared against a golden trace.
+    """
+    def __init__(self, source, edges, pos, location, facing_direction, vision=None, max_frames=None, quiet=False):
+        """
+        Creates the Robot with the ReplayCamera and the MockEPRobot and wraps the stages of the loop in TimedStages
+        """
+        self.camera = ReplayCamera(source, max_frames)
+        self.ep_robot = MockEPRobot(camera=self.camera)
+        self.quiet = quiet
+        self.robot = Robot(self.log, edges, pos, location, facing_direction, vision=vision, ep_robot=self.ep_robot)
+        self.stages = {
+            "line_detection": TimedStage(self.robot.line_detector.detect_with_bands),
+            "marker_detection": TimedStage(self.robot.marker_detector.detect),
+            "line_control": TimedStage(self.robot.handle_line_detection),
+        }
+        self.robot.line_detector.detect_with_bands = self.stages["line_detection"]
+        self.robot.marker_detector.detect = self.stages["marker_detection"]
+        self.robot.handle_line_detection = self.stages["line_control"]
+        if self.robot.vision_workers is not None:
+            self.stages["vision_workers"] = TimedStage(self.robot.vision_workers.detect)
+            self.robot.vision_workers.detect = self.stages["vision_workers"]
+
+    def log(self, message):
+        """
+        Prints the log messages of the Robot unless the harness is quiet
+        """
+        if not self.quiet:
+            print(f"replay {message}")
+
+    def run(self, targets, action=None):
+        """
+        Drives along the targets as one route until the last target is reached or the recorded frames are used up. The
+        last target can be combined with a pickup or dropoff action.
+        """
+        route_navigator = self.robot.route_navigator
+        path = [route_navigator.location]
+        for target in targets:
+            path += route_navigator.get_path(target, path[-1])[1:]
+        start = time.perf_counter()
+        try:
+            self.robot.prepare_route(path, action)
+        except ReplayFinished:
+            pass
+        self.elapsed = time.perf_counter() - start
+        self.robot.close()
+        return self.get_report()
+
+    def get_report(self):
+        """
+        Summarizes the per stage timings, the achieved frame rate and the detection latency per frame
+        """
+        frames = len(self.camera.read_times)
+        report = {"frames": frames, "elapsed": self.elapsed,
+                  "fps": frames / self.elapsed if self.elapsed > 0 else 0, "stages": {}}
+        stages = dict(self.stages)
+        stages["camera_read"] = self.camera
+        for name, stage in stages.items():
+            durations = np.array(stage.read_times if name == "camera_read" else stage.durations)
+            if durations.size == 0:
+                continue
+            report["stages"][name] = {"calls": int(durations.size),
+                                      "mean_ms": float(durations.mean() * 1000),
+                                      "p95_ms": float(np.percentile(durations, 95) * 1000),
+                                      "max_ms": float(durations.max() * 1000)}
+        if "vision_workers" in report["stages"]:
+            report["detection_latency_ms"] = report["stages"]["vision_workers"]["mean_ms"]
+        else:
+            report["detection_latency_ms"] = sum(report["stages"][name]["mean_ms"] for name in ("line_detection", "marker_detection")
+                                                 if name in report["stages"])
+        return report
+
+    def get_drive_trace(self):
+        """
+        Returns the commands sent to the chassis, arm and gripper together with the frame they were sent in
+        """
+        return [{"frame": entry["frame"], "component": entry["component"], "command": entry["command"], "args": entry["args"]}
+                for entry in self.ep_robot.trace]
+
+    def compare_with_golden(self, golden, tolerance=1e-3):
+        """
+        Compares the drive trace with a golden trace and returns a list of differences
+        """
+        trace = self.get_drive_trace()
+        differences = []
+        if len(trace) != len(golden):
+            differences.append(f"trace has {len(trace)} commands, golden trace has {len(golden)}")
+        for i, (command, expected) in enumerate(zip(trace, golden)):
+            if (command["component"], command["command"], command.get("frame")) != (expected["component"], expected["command"], expected.get("frame")):
+                differences.append(f"command {i}: {command} != {expected}")
+                continue
+            for key, value in expected["args"].items():
+                actual = command["args"].get(key)
+                if isinstance(value, (int, float)) and isinstance(actual, (int, float)):
+                    if abs(actual - value) > tolerance:
+                        differences.append(f"command {i}: {key}={actual} != {value}")
+                elif actual != value:
+                    differences.append(f"command {i}: {key}={actual} != {value}")
+        return differences
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replays recorded frames through the vision and control loop")
+    parser.add_argument("source", help="directory with recorded images or a video file")
+    parser.add_argument("targets", help="comma separated nodes the robot drives to, e.g. B,F")
+    parser.add_argument("--location", help="start node, defaults to LOCATION of the .env file")
+    parser.add_argument("--facing", type=int, help="start facing direction, defaults to FACING_DIRECTION")
+    parser.add_argument("--action", choices=["pickup", "dropoff"], help="action at the last target")
+    parser.add_argument("--golden", help="golden trace to compare the drive commands with")
+    parser.add_argument("--write-golden", action="store_true", help="write the drive commands as new golden trace")
+    parser.add_argument("--tolerance", type=float, default=1e-3, help="allowed difference of numeric command arguments")
+    parser.add_argument("--max-frames", type=int)
+    parser.add_argument("--fast-line", action="store_true")
+    parser.add_argument("--fast-marker", action="store_true")
+    parser.add_argument("--headless", action="store_true")
+    parser.add_argument("--vision-backend", choices=["inline", "process"], default="inline")
+    parser.add_argument("--compare-backends", action="store_true", help="also replay with the other vision backend and compare")
+    args = parser.parse_args()
+
+    envl = EnvironmentLoader()
+    vision = {"fast_line_detection": args.fast_line, "fast_marker_detection": args.fast_marker,
+              "debug_output": not args.headless, "backend": args.vision_backend}
+    location = args.location or envl.getLocation()
+    facing = args.facing if args.facing is not None else envl.getFacingDirection()
+    harness = ReplayHarness(args.source, envl.getEdges(), envl.getPos(), location, facing, vision, args.max_frames)
+    report = harness.run(args.targets.split(","), args.action)
+    print(json.dumps(report, indent=2))
+
+    if args.compare_backends:
+        other_backend = "process" if args.vision_backend == "inline" else "inline"
+        other = ReplayHarness(args.source, envl.getEdges(), envl.getPos(), location, facing,
+                              dict(vision, backend=other_backend), args.max_frames, quiet=True)
+        other_report = other.run(args.targets.split(","), args.action)
+        for backend, result in ((args.vision_backend, report), (other_backend, other_report)):
+            print(f"{backend}: {result['fps']:.1f} fps, detection latency {result['detection_latency_ms']:.1f} ms")
+        if other.get_drive_trace() != harness.get_drive_trace():
+            print("The vision backends produced different drive commands")
+
+    if args.golden and args.write_golden:
+        with open(args.golden, "w") as f:
+            json.dump(harness.get_drive_trace(), f, indent=1)
+        print(f"Golden trace written to {args.golden}")
+    elif args.golden:
+        with open(args.golden) as f:
+            differences = harness.compare_with_golden(json.load(f), args.tolerance)
+        for difference in differences:
+            print(difference)
+        print("Drive commands match the golden trace" if not differences else f"{len(differences)} differences")
+        raise SystemExit(1 if differences else 0)
@@ -1,93 +1,283 @@
-#from robomaster import robot
 import cv2
+import math
+import queue
 import threading
+import time
+import numpy as np
 from marker_detector import MarkerDetector
 from line_detector import LineDetector
 from drive_controller import DriveController
-from route_navigator import RouteNavigator
+from route_navigator import RouteNavigator, get_edge_direction
+from line_controller import LineController, get_line_geometry
+from frame_recorder import FrameRecorder
+from metrics import get_metrics
         
 
 class State:
     """
-    The robot is either in a FOLLOWING_LINE or MOVING_ON_NODE state.
+    The robot is IDLE until a mission is prepared. It is then either in a FOLLOWING_LINE or MOVING_ON_NODE state and
+    reaches the COMPLETED state when the mission is done, after which it is IDLE again.
     """
+    IDLE = 0
     FOLLOWING_LINE = 1
     MOVING_ON_NODE = 2
+    COMPLETED = 3
+
+    TRANSITIONS = {
+        IDLE: {FOLLOWING_LINE},
+        FOLLOWING_LINE: {FOLLOWING_LINE, MOVING_ON_NODE},
+        MOVING_ON_NODE: {FOLLOWING_LINE, COMPLETED},
+        COMPLETED: {IDLE},
+    }
 
 class Robot:
-    def __init__(self, log, edges, pos, location, robot_facing_direction):
+    LOST_LINE_INCIDENT_FRAMES = 30
+    measures_durations = True
+
+    def __init__(self, log, edges, pos, location, robot_facing_direction, recording=None, vision=None, ep_robot=None,
+                 line_control=None, overlap_motion=False):
         """
         Initializes the computer vision modules LineDetector and MarkerDetector as well as the RouteNavigator module.
+        The FrameRecorder is only created when recording is turned on. With the process vision backend the detectors run
+        in VisionWorkers instead. A stand-in for the RoboMaster can be passed as ep_robot, otherwise the SDK robot is
+        created. The gains of the LineController are passed as line_control together with the node_spacing, the
+        length in metres of one unit of the node positions, which lets the robot brake along the distance to the nodes.
+        Without it the robot brakes once the marker of the next stop is in view. With overlap_motion the arm, gripper
+        and chassis motions of pickups and dropoffs overlap.
         """
         self.log = log
-        #self.ep_robot = robot.Robot()
-        self.line_detector = LineDetector()
-        self.marker_detector = MarkerDetector()
-        self.drive_controller = DriveController(self.ep_robot)
-        self.state = State.FOLLOWING_LINE
+        vision = vision or {}
+        if ep_robot is None:
+            from robomaster import robot
+            ep_robot = robot.Robot()
+        self.ep_robot = ep_robot
+        self.line_detector = LineDetector(fast=vision.get("fast_line_detection", False),
+                                          headless=not vision.get("debug_output", True))
+        self.marker_detector = MarkerDetector(fast=vision.get("fast_marker_detection", False),
+                                              marker_ids=[ord(node) - 64 for node in pos],
+                                              debug=vision.get("debug_output", True))
+        self.vision_workers = None
+        if vision.get("backend", "inline") == "process":
+            from vision_workers import VisionWorkers
+            self.vision_workers = VisionWorkers(vision, [ord(node) - 64 for node in pos])
+        self.drive_controller = DriveController(self.ep_robot, overlap_motion)
+        line_control = dict(line_control or {})
+        self.node_spacing = line_control.pop("node_spacing", 0)
+        self.line_controller = LineController.from_options(line_control)
+        self.stop_distance = None
+        self.stop_ahead = False
+        self.state = State.IDLE
+        self.state_lock = threading.Lock()
         self.route_navigator = RouteNavigator(edges, pos, location, robot_facing_direction)
         self.turns = {}
         self.pickup_parcel = False
         self.dropoff_parcel = False
-        self.mission_completed = False
+        self.timings = []
+        self.motion_queue = queue.Queue()
+        self.manoeuvre_done = threading.Event()
+        self.motion_worker = threading.Thread(target=self.run_motion_worker, daemon=True)
+        self.motion_worker.start()
+        self.frame_recorder = FrameRecorder.from_options(recording)
+        self.lost_line_frames = 0
+        self.metrics = get_metrics()
         self.configure()
 
     def configure(self):
         """
         Establishes a connection to the robot through the Wi-Fi network and initializes the cmaera stream.
         """
-        #self.ep_robot.initialize(conn_type="sta")
-        #self.ep_camera = self.ep_robot.camera
-        #self.ep_camera.start_video_stream(display=False)
+        self.ep_robot.initialize(conn_type="sta")
+        self.ep_camera = self.ep_robot.camera
+        self.ep_camera.start_video_stream(display=False)
 
-    def prepare_move(self, target):
+    def prepare_route(self, path, action=None, node_callback=None):
         """
-        Prepares the robot for a move to the next node
+        Prepares the robot for driving along a path of several nodes, starting at the current location. The robot only
+        stops on nodes where it has to turn and on the last node, where the action pickup or dropoff is carried out.
+        Markers of straight nodes are passed without slowing down. The node_callback is called with the index of every
+        node of the path the robot reaches. When it returns False the route ends at the next node.
         """
-        self.log(f"Move to {target}")  
-        self.target = target
-        self.turns, self.initial_turn = self.route_navigator.get_turns(target)
-        self.turns[target] = 0
-        self.mission_completed = False
-        self.pickup_parcel = False
-        self.state = State.FOLLOWING_LINE
+        self.log(f"Move along {' -> '.join(path)}" + (f" and {action}" if action else ""))
+        self.route = path
+        self.route_index = 0
+        self.node_callback = node_callback
+        self.target = path[-1]
+        self.turns, self.initial_turn = self.route_navigator.get_turns(self.target, path)
+        self.turns[self.target] = 0
+        self.pickup_parcel = action == "pickup"
+        self.dropoff_parcel = action == "dropoff"
+        self.set_state(State.FOLLOWING_LINE)
         self.execute()
 
+    def prepare_move(self, target):
+        """
+        Prepares the robot for a move to the target along the shortest path
+        """
+        self.prepare_route(self.route_navigator.get_path(target))
+
     def prepare_pickup(self, target):
         """
-        Prepares the robot for a pickup on the next node
+        Prepares the robot for a pickup on the target
         """
-        self.log(f"Move to {target} and pick up")
-        self.target = target
-        self.turns, self.initial_turn = self.route_navigator.get_turns(target)
-        self.turns[target] = 0
-        self.mission_completed = False
-        self.state = State.FOLLOWING_LINE
-        self.pickup_parcel = True
-        self.execute()
+        self.prepare_route(self.route_navigator.get_path(target), "pickup")
 
     def prepare_dropoff(self, target):
         """
-        Prepares the robot for a dropoff on the next node
+        Prepares the robot for a dropoff on the target
         """
-        self.log(f"Move to {target} and drop off")
-        self.target = target
-        self.turns, self.initial_turn = self.route_navigator.get_turns(target)
-        self.turns[target] = 0
-        self.mission_completed = False
-        self.state = State.FOLLOWING_LINE
-        self.dropoff_parcel = True
-        self.execute()
+        self.prepare_route(self.route_navigator.get_path(target), "dropoff")
+
+    def get_route_index(self, marker_letter):
+        """
+        Returns the index of the marker in the remaining route. Markers of nodes which were passed already, like the
+        marker the robot is still standing on, and markers which do not belong to the route return None.
+        """
+        remaining = self.route[self.route_index + 1:]
+        if marker_letter not in remaining:
+            return None
+        return self.route_index + 1 + remaining.index(marker_letter)
+
+    def get_route_marker(self, ids):
+        """
+        Returns the lowest index in the remaining route of all detected markers together with the position of that marker
+        in ids. The marker which was just passed is often still in view next to the next one, so every detected id is
+        matched against the route.
+        """
+        route_index, position = None, None
+        if ids is None:
+            return route_index, position
+        for i, marker_id in enumerate(ids.flatten()):
+            index = self.get_route_index(chr(64 + int(marker_id)))
+            if index is not None and (route_index is None or index < route_index):
+                route_index, position = index, i
+        return route_index, position
+
+    def split_markers(self, ids, corners, height):
+        """
+        Splits the markers detected in the middle third of the image into the markers in the lower half, which the robot
+        has reached, and the ids of the markers further ahead. The corners of the reached markers are returned relative
+        to the lower half, as expected by the manoeuvres.
+        """
+        if ids is None:
+            return None, None, []
+        reached_ids, reached_corners, ahead = [], [], []
+        for marker_id, marker_corners in zip(ids, corners):
+            if marker_corners[..., 1].min() >= height // 2:
+                reached_ids.append(marker_id)
+                reached_corners.append(marker_corners - np.array([0, height // 2], dtype=marker_corners.dtype))
+            else:
+                ahead.append(int(marker_id[0]))
+        if not reached_ids:
+            return None, None, ahead
+        return np.array(reached_ids), tuple(reached_corners), ahead
+
+    def is_stop_ahead(self, ahead):
+        """
+        Returns whether one of the markers ahead belongs to a node of the remaining route where the robot stops
+        """
+        indices = (self.get_route_index(chr(64 + marker_id)) for marker_id in ahead)
+        return any(index is not None and self.requires_manoeuvre(index) for index in indices)
+
+    def reach_node(self, index):
+        """
+        Advances the route to the node with the given index. Nodes whose marker was missed are reported as well, so the
+        route continues at the next detected marker.
+        """
+        if index is None:
+            return
+        if index - self.route_index > 1:
+            self.metrics.increment("robot.markers_missed", index - self.route_index - 1)
+        while self.route_index < index:
+            self.route_index += 1
+            if self.node_callback is not None and self.node_callback(self.route_index) is False:
+                self.end_route(min(self.route_index + 1, len(self.route) - 1))
+
+    def end_route(self, index):
+        """
+        Shortens the route, so the robot stops on the node with the given index without a pickup or dropoff
+        """
+        if index >= len(self.route) - 1:
+            return
+        self.route = self.route[:index + 1]
+        self.target = self.route[-1]
+        self.turns[self.target] = 0
+        self.pickup_parcel = False
+        self.dropoff_parcel = False
+        self.route_navigator.location = self.target
+        self.route_navigator.robot_facing_direction = get_edge_direction(
+            self.route_navigator.pos, self.route[-2], self.target, self.route_navigator.robot_facing_direction)
+
+    def set_state(self, state):
+        """
+        Changes the state of the robot and rejects transitions that are not part of the state machine
+        """
+        with self.state_lock:
+            if state not in State.TRANSITIONS[self.state]:
+                raise Exception(f"Invalid state transition from {self.state} to {state}")
+            self.state = state
+
+    def get_state(self):
+        """
+        Returns the current state of the robot
+        """
+        with self.state_lock:
+            return self.state
+
+    def run_motion_worker(self):
+        """
+        The motion worker is the only thread executing blocking manoeuvres. It processes the commands of the motion queue
+        one after another and signals when a manoeuvre is done. It stops once the manoeuvres queued before close are
+        done.
+        """
+        while True:
+            command = self.motion_queue.get()
+            if command is None:
+                break
+            try:
+                if command[0] == "turn":
+                    start = time.time()
+                    self.drive_controller.turn(command[1])
+                    if command[1] != 0:
+                        self.timings.append(("turn", command[1], time.time() - start))
+                elif command[0] == "marker":
+                    self.handle_marker_detection(command[1], command[2], None)
+            except Exception as e:
+                self.log(f"Manoeuvre {command[0]} failed: {e}")
+                with self.state_lock:
+                    if self.state == State.MOVING_ON_NODE:
+                        self.state = State.FOLLOWING_LINE
+            finally:
+                self.manoeuvre_done.set()
+
+    def run_manoeuvre(self, *command):
+        """
+        Passes a manoeuvre to the motion worker and pauses the perception until it is done
+        """
+        self.manoeuvre_done.clear()
+        self.motion_queue.put(command)
+        self.manoeuvre_done.wait()
+
+    def pop_timings(self):
+        """
+        Returns the measured turns, pickups and dropoffs since the last call as (kind, angle, duration) tuples
+        """
+        timings, self.timings = self.timings, []
+        return timings
 
-    def handle_line_detection(self, img_with_line, centroid):
+    def handle_line_detection(self, img_with_line, centroid, bands=None):
         """
-        Handles the event of a line detection and calculates the turn_angle 
-        and passes it to the drive_controller for execution
+        Handles the event of a line detection. The LineController calculates the speed and the turn_angle from the
+        geometry of the line in the bands, or from the centroid alone, and passes them to the drive_controller for
+        execution. Once the marker of the next stop was seen ahead, the LineController brakes to the marker speed.
         """
-        img_center = img_with_line.shape[1] // 2
-        error = centroid[0] - img_center
-        turn_angle = error * 0.05
-        self.drive_controller.drive(speed=0.2, turn_angle=turn_angle)
+        height, width = img_with_line.shape[:2]
+        geometry = get_line_geometry(bands, width, height) if bands else None
+        if geometry is None:
+            geometry = ((centroid[0] - width / 2) / (width / 2), 0.0, 0.0)
+        error, heading, curvature = geometry
+        speed, turn_angle = self.line_controller.update(error, heading, curvature, self.get_remaining_distance(),
+                                                        marker_ahead=self.stop_ahead)
+        self.drive_controller.drive(speed=speed, turn_angle=turn_angle)
 
     def handle_marker_detection(self, ids, corners, img):
         """"
@@ -95,61 +285,162 @@ class Robot:
         """
         id = ids.flatten()[0]
         marker_letter = chr(64 + id)
-        if self.pickup_parcel:
-            self.drive_controller.pick_up_freight(corners, self.turns[marker_letter])
+        index = self.get_route_index(marker_letter)
+        if self.pickup_parcel and marker_letter == self.target:
+            start = time.time()
+            self.log_handling(self.drive_controller.pick_up_freight(corners, self.turns[marker_letter]))
+            self.timings.append(("pickup", None, time.time() - start))
             self.pickup_parcel = False
-            self.mission_completed = True
+            self.reach_node(index)
+            self.set_state(State.COMPLETED)
             return
-        if self.dropoff_parcel:
-            self.drive_controller.drop_off_freight(corners, self.turns[marker_letter])
+        if self.dropoff_parcel and marker_letter == self.target:
+            start = time.time()
+            self.log_handling(self.drive_controller.drop_off_freight(corners, self.turns[marker_letter]))
+            self.timings.append(("dropoff", None, time.time() - start))
             self.dropoff_parcel = False
-            self.mission_completed = True
+            self.reach_node(index)
+            self.set_state(State.COMPLETED)
             return
         elif id >= 1 and id <= 12:
             if marker_letter in self.turns:
                 self.drive_controller.navigate_to_marker(corners,self.turns[marker_letter])
+        self.reach_node(index)
         if marker_letter == self.target:
-            self.mission_completed = True
+            self.set_state(State.COMPLETED)
             return
-        self.state = State.FOLLOWING_LINE
-    
+        self.set_state(State.FOLLOWING_LINE)
+
+    def update_stop_distance(self):
+        """
+        Sets the distance to the next node of the route where the robot stops, measured like the distance of the
+        LineController since its last reset. Without a node_spacing the distance is unknown.
+        """
+        if not self.node_spacing:
+            self.stop_distance = None
+            return
+        pos = self.route_navigator.pos
+        length = 0
+        for index in range(self.route_index, len(self.route) - 1):
+            (x1, y1), (x2, y2) = pos[self.route[index]], pos[self.route[index + 1]]
+            length += math.hypot(x2 - x1, y2 - y1) * self.node_spacing
+            if self.requires_manoeuvre(index + 1):
+                break
+        self.stop_distance = self.line_controller.distance + length
+
+    def get_remaining_distance(self):
+        """
+        Returns the estimated distance to the next node where the robot stops or None when it is unknown
+        """
+        if self.stop_distance is None:
+            return None
+        return self.stop_distance - self.line_controller.distance
+
+    def requires_manoeuvre(self, index):
+        """
+        Returns whether the robot has to stop on the node with the given index of the route. This is the case for the
+        last node and for nodes where the robot turns, on all other nodes it follows the line straight through.
+        """
+        node = self.route[index]
+        return node == self.target or self.turns.get(node, 0) != 0
+
+    def log_handling(self, report):
+        """
+        Logs the duration of an overlapped pickup or dropoff and the time saved compared to running the actions one
+        after another on the sequential path
+        """
+        if report is None:
+            return
+        self.log(f"{report['name']} took {report['duration']:.1f}s, {report['saved']:.1f}s saved by overlapping motions")
 
     def execute(self):
         """
         The function processes the camera images from the robot and based on the state either followes the detected line
-        or follows a marker when detected.
+        or follows a marker when detected. Markers of straight nodes are passed while following the line, the markers
+        of nodes which were passed already are ignored. Markers are detected in the whole middle third of the image,
+        but only the markers in the lower half are reached, the markers above let the robot brake in time. While the
+        motion worker executes a manoeuvre no images are processed.
         """
-        self.drive_controller.turn(self.initial_turn)
+        self.run_manoeuvre("turn", self.initial_turn)
+        self.line_controller.reset()
+        self.update_stop_distance()
+        self.stop_ahead = False
         img_counter=0
         try:
             while True:
-                img = self.ep_camera.read_cv2_image(strategy='newest')
-                marker_image = img[img.shape[0]//2:,img.shape[1]//3:img.shape[1]*2//3]
-
+                with self.metrics.timer("robot.frame.camera_read"):
+                    img = self.ep_camera.read_cv2_image(strategy='newest')
+                self.metrics.increment("robot.frames")
                 line_img = img[:, img.shape[1]//3:img.shape[1]*2//3]
 
-                line_detected, centroid, img_with_line = self.line_detector.detect(line_img)
-                ids, corners, img_with_markers = self.marker_detector.detect(marker_image)
-
-                threads = []
-
-                if ids is not None and self.state == State.FOLLOWING_LINE:
-                    self.state = State.MOVING_ON_NODE
-                    marker_thread = threading.Thread(target=self.handle_marker_detection, args=(ids, corners, img_with_markers))
-                    threads.append(marker_thread)
-
-                elif line_detected and self.state == State.FOLLOWING_LINE:
+                if self.vision_workers is not None:
+                    with self.metrics.timer("robot.frame.vision_workers"):
+                        line_detected, centroid, ids, corners, bands = self.vision_workers.detect(img)
+                    img_with_line = line_img
+                else:
+                    with self.metrics.timer("robot.frame.line_detection"):
+                        line_detected, centroid, img_with_line, bands = self.line_detector.detect_with_bands(line_img)
+                    with self.metrics.timer("robot.frame.marker_detection"):
+                        ids, corners, img_with_markers = self.marker_detector.detect(line_img)
 
-                    self.handle_line_detection(img_with_line, centroid)
+                if self.frame_recorder is not None:
+                    with self.metrics.timer("robot.frame.recording"):
+                        self.record_frame(img, img_counter, ids is not None, line_detected)
+                img_counter += 1
 
-                for thread in threads:
-                    thread.start()
+                ids, corners, ahead = self.split_markers(ids, corners, img.shape[0])
+                self.stop_ahead = self.stop_ahead or self.is_stop_ahead(ahead)
 
-                cv2.imwrite(f"images/image_{self.target}_{img_counter}.jpg", img)
-                img_counter += 1
+                index, position = self.get_route_marker(ids)
+                if index is not None and self.requires_manoeuvre(index):
+                    self.set_state(State.MOVING_ON_NODE)
+                    with self.metrics.timer("robot.manoeuvre"):
+                        self.run_manoeuvre("marker", ids[position:position + 1], (corners[position],))
+                    self.line_controller.reset()
+                    self.update_stop_distance()
+                    self.stop_ahead = False
+                else:
+                    if index is not None:
+                        self.metrics.increment("robot.markers_passed")
+                        self.reach_node(index)
+                        self.update_stop_distance()
+                    if line_detected:
+                        with self.metrics.timer("robot.frame.line_control"):
+                            self.handle_line_detection(img_with_line, centroid, bands)
+                    elif index is not None:
+                        self.drive_controller.drive(speed=self.line_controller.speed, turn_angle=0)
 
                 #cv2.imshow("RoboMaster Camera Feed", img)
-                if self.mission_completed:
+                if self.get_state() == State.COMPLETED:
+                    self.set_state(State.IDLE)
                     break
         except KeyboardInterrupt:
-            print("Stopping the application...")
\ No newline at end of file
+            print("Stopping the application...")
+            if self.frame_recorder is not None:
+                self.frame_recorder.trigger_incident()
+            self.close()
+
+    def close(self):
+        """
+        Stops the motion worker after the queued manoeuvres, the vision workers and the FrameRecorder
+        """
+        if self.motion_worker.is_alive():
+            self.motion_queue.put(None)
+            self.motion_worker.join()
+        if self.vision_workers is not None:
+            self.vision_workers.close()
+        if self.frame_recorder is not None:
+            self.frame_recorder.close()
+
+    def record_frame(self, img, img_counter, marker_detected, line_detected):
+        """
+        Passes the frame to the FrameRecorder and triggers an incident when the line got lost for too many frames
+        """
+        self.frame_recorder.record(img, self.target, img_counter, marker_detected)
+        if line_detected or marker_detected:
+            self.lost_line_frames = 0
+            return
+        self.lost_line_frames += 1
+        if self.lost_line_frames == self.LOST_LINE_INCIDENT_FRAMES:
+            self.log("Line lost, recording incident")
+            self.frame_recorder.trigger_incident()
@@ -1,23 +1,52 @@
 import networkx as nx
 
+def get_edge_direction(pos, from_node, to_node, default=None):
+    """
+    Returns the direction the robot faces after driving along the edge, or the default for edges that are not parallel
+    to an axis
+    """
+    delta_x = pos[to_node][0] - pos[from_node][0]
+    delta_y = pos[to_node][1] - pos[from_node][1]
+    if delta_y == 0 and delta_x != 0:
+        return 0 if delta_x > 0 else 180
+    if delta_x == 0 and delta_y != 0:
+        return 90 if delta_y > 0 else 270
+    return default
+
+
 class RouteNavigator:
-    def __init__(self, edges, pos, location, robot_facing_direction):
+    def __init__(self, edges, pos, location, robot_facing_direction, graph=None):
         """
-        Initializes the positions of the nodes and the connection actions
+        Initializes the positions of the nodes and the connection actions. A graph of the edges can be shared between
+        navigators, otherwise it is built when a path has to be searched.
         """
         self.edges = edges
         self.pos = pos
         self.location = location
         self.robot_facing_direction = robot_facing_direction
-        self.G = nx.Graph()
-        self.G.add_edges_from(self.edges)
+        self.G = graph
+
+    def get_graph(self):
+        """
+        Returns the graph of the edges, which is built on first use
+        """
+        if self.G is None:
+            self.G = nx.Graph()
+            self.G.add_edges_from(self.edges)
+        return self.G
     
+    def get_path(self, target, source=None):
+        """
+        Returns the shortest path from the source to the target, by default from the current location
+        """
+        return nx.shortest_path(self.get_graph(), source=source or self.location, target=target)
+
     def get_turns(self, target, path=None):
         """
         Calculates the turns the robot as to do at every node to reach the target
         """
         if path is None:
-            path = nx.shortest_path(self.G, source=self.location, target=target)
+            path = self.get_path(target)
         directions = {}
 
         for i in range(len(path) - 1):
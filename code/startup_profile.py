@@ -0,0 +1,36 @@
+import time
+
+
+class StartupProfile:
+    """
+    The StartupProfile measures the durations of the startup phases of an agent, like the imports, the robot and the
+    communication, so slow phases can be spotted when many agents are started
+    """
+    def __init__(self):
+        """
+        Starts the first phase
+        """
+        self.start = time.perf_counter()
+        self.last = self.start
+        self.phases = []
+
+    def mark(self, phase):
+        """
+        Ends the current phase and stores its duration under the given name
+        """
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def get_total(self):
+        """
+        Returns the duration from the start to the end of the last marked phase
+        """
+        return self.last - self.start
+
+    def get_report(self):
+        """
+        Returns a log line with the total duration and the duration of every phase in milliseconds
+        """
+        phases = ", ".join(f"{phase} {duration * 1000:.0f} ms" for phase, duration in self.phases)
+        return f"Startup took {self.get_total() * 1000:.0f} ms: {phases}"
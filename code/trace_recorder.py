@@ -0,0 +1,99 @@
+import gzip
+import json
+import time
+from event_log import EventLog
+
+
+class NullTraceRecorder:
+    """
+    The NullTraceRecorder has the same interface as TraceRecorder but does nothing
+    """
+    enabled = False
+
+    def record(self, type, message, ip):
+        """
+        Does nothing
+        """
+        pass
+
+    def close(self):
+        """
+        Does nothing
+        """
+        pass
+
+
+class TraceRecorder(EventLog):
+    """
+    The TraceRecorder writes the inbound messages of an agent into a trace, so a real stream of requests from the WMS
+    can be replayed on the bench with evaluation/trace_replay.py. Every line holds the wall clock time, the type, the
+    sender and the message as compact JSON, traces ending with .gz are compressed. Like the EventLog the messages are
+    written in batches by a background thread.
+    """
+    enabled = True
+
+    def __init__(self, path, types=None, max_pending=10000):
+        """
+        Only the message types in types are recorded, all types when it is empty
+        """
+        self.types = set(types or [])
+        super().__init__(path, max_pending)
+
+    def open_file(self, path):
+        """
+        Opens the trace for appending, compressed when the path ends with .gz
+        """
+        if path.endswith(".gz"):
+            return gzip.open(path, "at")
+        return open(path, "a")
+
+    def serialize(self, fields):
+        """
+        Returns the message as compact JSON
+        """
+        return json.dumps(fields, separators=(',', ':'))
+
+    def record(self, type, message, ip):
+        """
+        Queues an inbound message with the current wall clock time unless its type is not recorded
+        """
+        if self.types and type not in self.types:
+            return
+        self.enqueue({"ts": round(time.time(), 3), "type": type, "ip": ip, "message": message})
+
+
+def read_trace(path):
+    """
+    Returns the recorded messages of a trace in the order of their arrival. The trace of an agent that is still running
+    or was killed ends without the end of the compressed stream, the messages up to there are returned.
+    """
+    messages = []
+    with (gzip.open(path, "rt") if path.endswith(".gz") else open(path)) as f:
+        try:
+            for line in f:
+                if line.strip():
+                    messages.append(json.loads(line))
+        except (EOFError, json.JSONDecodeError):
+            pass
+    return sorted(messages, key=lambda message: message["ts"])
+
+
+trace_recorder = NullTraceRecorder()
+
+
+def get_trace_recorder():
+    """
+    Returns the trace recorder of the process. The CommunicationHandler fetches it once on initialization.
+    """
+    return trace_recorder
+
+
+def configure(options):
+    """
+    Enables the trace recorder based on the options loaded by the EnvironmentLoader
+    """
+    global trace_recorder
+    if (options or {}).get("mode", "off") == "off":
+        return trace_recorder
+    trace_recorder = TraceRecorder(options.get("path", "trace.jsonl.gz"), options.get("types"))
+    return trace_recorder
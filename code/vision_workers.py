@@ -0,0 +1,148 @@
+import multiprocessing
+import queue
+import time
+from multiprocessing import shared_memory
+import numpy as np
+from line_detector import LineDetector
+from marker_detector import MarkerDetector
+
+
+def get_region(frame):
+    """
+    Returns the middle third of the frame, where the line and the markers are detected
+    """
+    return frame[:, frame.shape[1]//3:frame.shape[1]*2//3]
+
+
+def run_vision_worker(kind, shm_name, ring_shape, vision, marker_ids, tasks, results):
+    """
+    Runs a detector in a worker process. The worker reads the region of the frame directly from the shared memory ring
+    and only sends the detection result back.
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    ring = np.ndarray(ring_shape, dtype=np.uint8, buffer=shm.buf)
+    if kind == "line":
+        detector = LineDetector(fast=vision.get("fast_line_detection", False), headless=True)
+    else:
+        detector = MarkerDetector(fast=vision.get("fast_marker_detection", False), marker_ids=marker_ids, debug=False)
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            slot, counter, height, width = task
+            region = get_region(ring[slot, :height, :width])
+            if kind == "line":
+                detected, centroid, _, bands = detector.detect_with_bands(region)
+                results.put((kind, counter, detected, centroid, bands))
+            else:
+                ids, corners, _ = detector.detect(region)
+                results.put((kind, counter, ids, corners))
+    finally:
+        del ring
+        shm.close()
+
+
+class VisionWorkers:
+    """
+    The VisionWorkers run the line and the marker detection in separate processes, so the detectors run in parallel
+    and do not compete with the networking threads for the GIL. Every frame is written once into a ring of frames in
+    shared memory and the workers detect on views of their region of the frame. Only the centroids of the line, the
+    ids and the corners are sent back to the control loop.
+    """
+    RESULT_TIMEOUT = 2
+    STARTUP_TIMEOUT = 30
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, vision=None, marker_ids=None, slots=4):
+        """
+        The vision options select the fast detectors. The ring holds slots frames, the workers are started with the
+        first frame.
+        """
+        self.vision = vision or {}
+        self.marker_ids = marker_ids
+        self.slots = slots
+        self.shm = None
+        self.processes = {}
+        self.counter = 0
+
+    def start(self, frame_shape):
+        """
+        Creates the ring for frames of the given shape and starts the workers. It is called with the first frame.
+        """
+        context = multiprocessing.get_context("spawn")
+        self.ring_shape = (self.slots,) + tuple(frame_shape)
+        self.shm = shared_memory.SharedMemory(create=True, size=int(np.prod(self.ring_shape)))
+        self.ring = np.ndarray(self.ring_shape, dtype=np.uint8, buffer=self.shm.buf)
+        self.results = context.Queue()
+        self.tasks = {}
+        for kind in ("line", "marker"):
+            self.tasks[kind] = context.Queue()
+            process = context.Process(target=run_vision_worker, daemon=True,
+                                      args=(kind, self.shm.name, self.ring_shape, self.vision, self.marker_ids,
+                                            self.tasks[kind], self.results))
+            process.start()
+            self.processes[kind] = process
+
+    def detect(self, img):
+        """
+        Writes the frame into the next slot of the ring and waits for the results of both workers. It returns whether a
+        line was detected, its centroid, the ids and corners of the detected markers and the centroids of the line in
+        the bands. An exception is raised when a worker died or did not answer within the RESULT_TIMEOUT, for the first
+        frame within the STARTUP_TIMEOUT of the workers.
+        """
+        if self.shm is None:
+            self.start(img.shape)
+        height, width = img.shape[:2]
+        if height > self.ring_shape[1] or width > self.ring_shape[2]:
+            raise Exception(f"Frame of {width}x{height} does not fit into the frame ring")
+        counter = self.counter
+        self.counter += 1
+        slot = counter % self.slots
+        self.ring[slot, :height, :width] = img
+        for tasks in self.tasks.values():
+            tasks.put((slot, counter, height, width))
+        line_detected, centroid, ids, corners, bands = False, (0, 0), None, None, None
+        pending = set(self.tasks)
+        timeout = self.STARTUP_TIMEOUT if counter == 0 else self.RESULT_TIMEOUT
+        deadline = time.monotonic() + timeout
+        while pending:
+            try:
+                result = self.results.get(timeout=self.POLL_INTERVAL)
+            except queue.Empty:
+                self.check_workers()
+                if time.monotonic() > deadline:
+                    raise Exception(f"Vision workers {sorted(pending)} did not answer within {timeout}s")
+                continue
+            if result[1] != counter:
+                continue
+            pending.discard(result[0])
+            if result[0] == "line":
+                _, _, line_detected, centroid, bands = result
+            else:
+                _, _, ids, corners = result
+        return line_detected, centroid, ids, corners, bands
+
+    def check_workers(self):
+        """
+        Raises an exception when a worker process is not running anymore
+        """
+        for kind, process in self.processes.items():
+            if not process.is_alive():
+                raise Exception(f"The {kind} vision worker exited with code {process.exitcode}")
+
+    def close(self):
+        """
+        Stops the workers and releases the shared memory
+        """
+        if self.shm is None:
+            return
+        for tasks in self.tasks.values():
+            tasks.put(None)
+        for process in self.processes.values():
+            process.join(timeout=2)
+        del self.ring
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
+        self.processes = {}